@@ -0,0 +1,94 @@
+"""asyncio facade of the client, used by load_test.py to simulate concurrent updates"""
+
+import asyncio
+import functools
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, List, Callable, Tuple, Any
+
+from qbt.snapshot import Aggregation
+from qbt.snapshot import AggregationResult
+
+logger = logging.getLogger(__name__)
+
+# max number of client calls running at the same time for the asyncio callers. It's a separate pool from the
+# client's one, because some client methods use the client's pool themselves (eg. the generic properties)
+ASYNC_WORKERS = 8
+
+
+class AsyncClient:
+    """asyncio facade of CustomClient: same methods (torrents, torrent, filter, preferences, tags and trackers...),
+    but they are coroutines. The client is blocking (requests), so every call runs on a thread pool and the event
+    loop keeps serving the other callers in the meantime, eg.
+
+        aqb = AsyncClient(qb)
+        torrent, preferences = await asyncio.gather(aqb.torrent(torrent_hash), aqb.preferences())
+
+    qbt can be a ReconnectingClient: its methods are looked up at every call"""
+
+    def __init__(self, qbt, max_workers: int = ASYNC_WORKERS):
+        self._qbt = qbt
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='qbt_async')
+
+    async def run(self, func: Callable, *args, **kwargs) -> Any:
+        """Run any blocking callable on the facade's pool"""
+
+        loop = asyncio.get_event_loop()  # the running loop, also on python 3.6
+        return await loop.run_in_executor(self._executor, functools.partial(func, *args, **kwargs))
+
+    async def _call(self, method_name: str, *args, **kwargs) -> Any:
+        return await self.run(lambda: getattr(self._qbt, method_name)(*args, **kwargs))
+
+    async def torrents(self, get_torrent_generic_properties=True, max_age: Optional[float] = 0, **kwargs) -> list:
+        return await self._call('torrents', get_torrent_generic_properties=get_torrent_generic_properties,
+                                max_age=max_age, **kwargs)
+
+    async def torrent(self, torrent_hash, get_torrent_generic_properties=True, max_age: Optional[float] = 0):
+        return await self._call('torrent', torrent_hash, get_torrent_generic_properties=get_torrent_generic_properties,
+                                max_age=max_age)
+
+    async def torrents_page(self, page: int, page_size: int, **kwargs) -> Tuple[list, int]:
+        return await self._call('torrents_page', page, page_size, **kwargs)
+
+    async def aggregate(self, aggregation: Aggregation, max_age: float = 0, **kwargs) -> AggregationResult:
+        return await self._call('aggregate', aggregation, max_age=max_age, **kwargs)
+
+    async def filter(self, query, max_age: Optional[float] = 0, limit: Optional[int] = None) -> list:
+        return await self._call('filter', query, max_age=max_age, limit=limit)
+
+    async def select_hashes(self, hashes: Optional[List[str]] = None, query: Optional[str] = None,
+                            **kwargs) -> List[str]:
+        return await self._call('select_hashes', hashes=hashes, query=query, **kwargs)
+
+    async def bulk_action(self, action: str, hashes: List[str], **data) -> int:
+        return await self._call('bulk_action', action, hashes, **data)
+
+    async def preferences(self, **kwargs) -> dict:
+        return await self._call('preferences', **kwargs)
+
+    async def set_preferences(self, **kwargs):
+        return await self._call('set_preferences', **kwargs)
+
+    async def get_alternative_speed_status(self, **kwargs):
+        return await self._call('get_alternative_speed_status', **kwargs)
+
+    async def toggle_alternative_speed(self):
+        return await self._call('toggle_alternative_speed')
+
+    async def global_transfer_info(self) -> dict:
+        return await self.run(lambda: self._qbt.global_transfer_info)
+
+    async def create_tags(self, tags: [str, List]):
+        return await self._call('create_tags', tags)
+
+    async def add_tags(self, torrent_hash, tags: [str, List]):
+        return await self._call('add_tags', torrent_hash, tags)
+
+    async def remove_tags(self, torrent_hash, tags: [str, List] = None):
+        return await self._call('remove_tags', torrent_hash, tags)
+
+    async def trackers(self, torrent_hash: str, max_age: Optional[float] = 0) -> List[dict]:
+        return await self.run(lambda: self._qbt.trackers_index.get(torrent_hash, max_age=max_age))
+
+    async def remove_trackers(self, torrent_hash: str, urls: List[str]):
+        return await self.run(lambda: self._qbt.trackers_index.remove_trackers(torrent_hash, urls))
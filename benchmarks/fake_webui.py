@@ -0,0 +1,213 @@
+import json
+import random
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit, parse_qs
+
+STATES = ('downloading', 'stalledDL', 'uploading', 'stalledUP', 'pausedUP', 'pausedDL', 'queuedDL')
+CATEGORIES = ('', 'movies', 'tv', 'music', 'software', 'books')
+TAGS = ('', '', 'hd', 'hd,remux', 'private', 'ratio')
+TRACKERS = ('udp://tracker.opentrackr.org:1337/announce', 'https://tracker.example.org/announce', 'udp://open.demonii.com:1337')
+WORDS = ('ubuntu', 'debian', 'linux', 'server', 'desktop', 'amd64', 'arm64', 'live', 'iso', 'the', 'big', 'buck',
+         'bunny', 'sintel', 'tears', 'of', 'steel', '1080p', '2160p', 'x264', 'hevc', 'web', 'dl', 'season', 'complete',
+         'album', 'flac', 'mp3', 'collection', 'remastered', 'documentary', 'nature', 'ocean', 'planet', 'earth')
+
+
+def make_torrent(index: int, rnd: random.Random) -> dict:
+    """A torrents/info torrent dict with the same keys (and value types) qbittorrent 4.4 returns"""
+
+    size = rnd.randint(50, 50_000) * 1024 * 1024
+    progress = rnd.choice((1.0, 1.0, 1.0, rnd.random()))
+    name = '.'.join(rnd.choice(WORDS) for _ in range(rnd.randint(3, 8))) + f'.{index}'
+
+    return dict(
+        added_on=1_600_000_000 + index, amount_left=int(size * (1 - progress)), auto_tmm=False, availability=-1,
+        category=rnd.choice(CATEGORIES), completed=int(size * progress), completion_on=1_600_100_000 + index,
+        content_path=f'/downloads/{name}', dl_limit=-1, dlspeed=rnd.choice((0, 0, rnd.randint(1, 10_000_000))),
+        downloaded=int(size * progress), downloaded_session=0, eta=8640000, f_l_piece_prio=False, force_start=False,
+        hash=f'{index:040x}', last_activity=1_600_200_000, magnet_uri=f'magnet:?xt=urn:btih:{index:040x}&dn={name}',
+        max_ratio=-1, max_seeding_time=-1, name=name, num_complete=rnd.randint(0, 500),
+        num_incomplete=rnd.randint(0, 50), num_leechs=rnd.randint(0, 10), num_seeds=rnd.randint(0, 20), priority=0,
+        progress=progress, ratio=rnd.random() * 3, ratio_limit=-2, save_path='/downloads/', seeding_time=0,
+        seeding_time_limit=-2, seen_complete=1_600_300_000, seq_dl=False, size=size, state=rnd.choice(STATES),
+        super_seeding=False, tags=rnd.choice(TAGS), time_active=rnd.randint(0, 10_000_000), total_size=size,
+        tracker=rnd.choice(TRACKERS), trackers_count=rnd.randint(1, 5), up_limit=-1,
+        uploaded=rnd.randint(0, size * 3), uploaded_session=0, upspeed=rnd.choice((0, 0, rnd.randint(1, 5_000_000)))
+    )
+
+
+def make_torrents(count: int, seed: int = 0) -> dict:
+    """hash -> torrent dict"""
+
+    rnd = random.Random(seed)
+    torrents = [make_torrent(i, rnd) for i in range(count)]
+
+    return {t['hash']: t for t in torrents}
+
+
+class FakeWebUI:
+    """A fake qbittorrent WebUI serving count synthetic torrents on localhost, enough to run the client against it.
+    It implements the torrents/info (hashes parameter only), torrents/properties, torrents/trackers and sync/maindata
+    (with rid deltas) endpoints, and counts the bytes sent for every endpoint. POST requests are accepted and ignored.
+
+    latency: seconds every response is delayed by, to simulate a remote qbittorrent"""
+
+    def __init__(self, count: int, latency: float = 0.0, seed: int = 0):
+        self.torrents = make_torrents(count, seed=seed)
+        self.latency = latency
+        self.bytes_sent = Counter()  # endpoint -> bytes
+        self.requests = Counter()  # endpoint -> number of requests
+
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._rid = 1
+        self._changes = dict()  # rid -> {hash: set of changed keys}
+
+        self._server = ThreadingHTTPServer(('127.0.0.1', 0), self._handler_class())
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    @property
+    def url(self) -> str:
+        return 'http://127.0.0.1:{}/'.format(self._server.server_address[1])
+
+    def start(self) -> 'FakeWebUI':
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def reset_counters(self):
+        self.bytes_sent.clear()
+        self.requests.clear()
+
+    def tick(self, changed_count: int):
+        """Change the volatile keys of changed_count random torrents (the ones qbittorrent would update every second)"""
+
+        with self._lock:
+            self._rid += 1
+            changes = self._changes[self._rid] = dict()
+            for torrent_hash in self._random.sample(list(self.torrents), min(changed_count, len(self.torrents))):
+                torrent = self.torrents[torrent_hash]
+                torrent.update(dlspeed=self._random.randint(0, 10_000_000), upspeed=self._random.randint(0, 5_000_000),
+                               last_activity=torrent['last_activity'] + 1, time_active=torrent['time_active'] + 1)
+                changes[torrent_hash] = {'dlspeed', 'upspeed', 'last_activity', 'time_active'}
+
+    def _maindata(self, rid: int) -> dict:
+        with self._lock:
+            if not rid or rid > self._rid:
+                return dict(rid=self._rid, full_update=True, torrents={h: {k: v for k, v in t.items() if k != 'hash'}
+                                                                       for h, t in self.torrents.items()},
+                            server_state=dict(dl_info_speed=0, up_info_speed=0))
+
+            changed = dict()
+            for change_rid in range(rid + 1, self._rid + 1):
+                for torrent_hash, keys in self._changes.get(change_rid, {}).items():
+                    changed.setdefault(torrent_hash, set()).update(keys)
+
+            return dict(rid=self._rid, torrents={h: {k: self.torrents[h][k] for k in keys} for h, keys in changed.items()})
+
+    def _torrents_info(self, params: dict) -> list:
+        torrents = list(self.torrents.values())
+        if 'hashes' in params:
+            hashes = set(params['hashes'][0].lower().split('|'))
+            torrents = [t for t in torrents if t['hash'] in hashes]
+
+        return torrents
+
+    def _properties(self, params: dict) -> dict:
+        torrent = self.torrents[params['hash'][0]]
+
+        return dict(save_path=torrent['save_path'], creation_date=torrent['added_on'], piece_size=4194304,
+                    comment='', total_wasted=0, total_uploaded=torrent['uploaded'], total_downloaded=torrent['downloaded'],
+                    up_limit=-1, dl_limit=-1, time_elapsed=torrent['time_active'], seeding_time=0,
+                    nb_connections=0, nb_connections_limit=100, share_ratio=torrent['ratio'], addition_date=torrent['added_on'],
+                    completion_date=torrent['completion_on'], created_by='', dl_speed_avg=0, dl_speed=torrent['dlspeed'],
+                    eta=torrent['eta'], last_seen=torrent['seen_complete'], peers=0, peers_total=0, pieces_have=0,
+                    pieces_num=100, reannounce=0, seeds=0, seeds_total=0, total_size=torrent['total_size'],
+                    up_speed_avg=0, up_speed=torrent['upspeed'])
+
+    def _trackers(self, params: dict) -> list:
+        torrent = self.torrents[params['hash'][0]]
+
+        return [dict(url=url, status=2 if i else 4, tier=i, num_peers=0, num_seeds=0, num_leeches=0, num_downloaded=0,
+                     msg='') for i, url in enumerate([torrent['tracker']] + list(TRACKERS[:torrent['trackers_count'] - 1]))]
+
+    def _respond(self, endpoint: str, params: dict):
+        if endpoint == 'app/preferences':
+            return dict(save_path='/downloads/', queueing_enabled=False)
+        if endpoint == 'torrents/info':
+            return self._torrents_info(params)
+        if endpoint == 'torrents/properties':
+            return self._properties(params)
+        if endpoint == 'torrents/trackers':
+            return self._trackers(params)
+        if endpoint == 'sync/maindata':
+            return self._maindata(int(params.get('rid', ['0'])[0]))
+
+        return None
+
+    def _handler_class(self):
+        webui = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'  # keep-alive, same as qbittorrent
+            disable_nagle_algorithm = True  # headers and body are written separately
+
+            def do_GET(self):
+                url = urlsplit(self.path)
+                endpoint = url.path.replace('/api/v2/', '', 1)
+                response = webui._respond(endpoint, parse_qs(url.query))
+
+                if webui.latency:
+                    time.sleep(webui.latency)
+
+                if response is None:
+                    self.send_response(404)
+                    self.send_header('Content-Length', '0')
+                    self.end_headers()
+                    return
+
+                body = json.dumps(response).encode()
+                with webui._lock:
+                    webui.bytes_sent[endpoint] += len(body)
+                    webui.requests[endpoint] += 1
+
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_POST(self):
+                endpoint = urlsplit(self.path).path.replace('/api/v2/', '', 1)
+                self.rfile.read(int(self.headers.get('Content-Length', 0)))
+
+                if webui.latency:
+                    time.sleep(webui.latency)
+
+                with webui._lock:
+                    webui.requests[endpoint] += 1
+
+                self.send_response(200)
+                self.send_header('Content-Length', '0')
+                self.end_headers()
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
+
+
+def timed(func, repeat: int) -> float:
+    """Average milliseconds func() takes"""
+
+    start = time.perf_counter()
+    for _ in range(repeat):
+        func()
+
+    return (time.perf_counter() - start) * 1000 / repeat
@@ -0,0 +1,119 @@
+"""Load test of the asyncio facade of the client (asyncclient.AsyncClient): fires simulated concurrent updates at it, a mix of
+cheap ones (a torrent's buttons, preferences, /filter, tags, trackers) and expensive ones (lists with the generic
+properties of every torrent, bulk actions), and reports the latency of every kind of update from its arrival.
+
+The same updates are then handled one at a time, as a dispatcher with a single worker would, to compare.
+
+Runs against a fake WebUI on localhost (see fake_webui.py). Run it from the repository's root, where config.toml is
+(a copy of config.example.toml is enough):
+
+    python -m benchmarks.load_test [--updates 300] [--rate 50] [--torrents 1000] [--latency 0.02]
+"""
+
+import argparse
+import asyncio
+import random
+import statistics
+import time
+from collections import defaultdict
+
+from qbt.custom import CustomClient
+from .asyncclient import AsyncClient
+from .fake_webui import FakeWebUI
+from .fake_webui import WORDS
+
+# update kind: (cost class, weight, handler)
+UPDATES = {
+    'torrent button': ('cheap', 40, lambda aqb, h: aqb.torrent(h)),
+    'preferences': ('cheap', 15, lambda aqb, h: aqb.preferences(max_age=0)),
+    'filter': ('cheap', 15, lambda aqb, h: aqb.filter(random.choice(WORDS), limit=100)),
+    'add tags': ('cheap', 10, lambda aqb, h: aqb.add_tags(h, 'load test')),
+    'trackers': ('cheap', 10, lambda aqb, h: aqb.trackers(h)),
+    'list with properties': ('expensive', 5, lambda aqb, h: aqb.torrents(filter='downloading')),
+    'bulk pause': ('expensive', 5, lambda aqb, h: aqb.bulk_action('pause', random.sample(HASHES, 500))),
+}
+
+HASHES = []
+
+
+def make_updates(count: int, rate: float, seed: int = 0) -> list:
+    """(arrival second, update kind, torrent hash): Poisson arrivals, rate updates per second on average"""
+
+    rnd = random.Random(seed)
+    kinds = list(UPDATES)
+    weights = [UPDATES[kind][1] for kind in kinds]
+
+    updates = []
+    arrival = 0.0
+    for _ in range(count):
+        arrival += rnd.expovariate(rate)
+        updates.append((arrival, rnd.choices(kinds, weights)[0], rnd.choice(HASHES)))
+
+    return updates
+
+
+async def fire(aqb: AsyncClient, updates: list, one_at_a_time: bool) -> dict:
+    """Handle the updates as they arrive and return the latencies (seconds) of every update kind"""
+
+    latencies = defaultdict(list)
+    dispatcher_lock = asyncio.Lock() if one_at_a_time else None
+    start = time.perf_counter()
+
+    async def handle(arrival, kind, torrent_hash):
+        await asyncio.sleep(arrival - (time.perf_counter() - start))
+        arrived_at = time.perf_counter()
+
+        if dispatcher_lock:
+            async with dispatcher_lock:
+                await UPDATES[kind][2](aqb, torrent_hash)
+        else:
+            await UPDATES[kind][2](aqb, torrent_hash)
+
+        latencies[kind].append(time.perf_counter() - arrived_at)
+
+    await asyncio.gather(*[handle(*update) for update in updates])
+
+    return latencies
+
+
+def report(title: str, latencies: dict):
+    print(f'\n{title}')
+
+    for cost in ('cheap', 'expensive'):
+        values = sorted([v for kind, values in latencies.items() if UPDATES[kind][0] == cost for v in values])
+        if not values:
+            continue
+
+        p95 = values[min(len(values) - 1, int(len(values) * 0.95))]
+        print(f'  {cost:>9} ({len(values):>3} updates): p50 {statistics.median(values) * 1000:>7.0f} ms, '
+              f'p95 {p95 * 1000:>7.0f} ms, max {values[-1] * 1000:>7.0f} ms')
+
+    for kind, values in latencies.items():
+        print(f'    {kind:>20}: p50 {statistics.median(values) * 1000:>7.0f} ms')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--updates', type=int, default=300, help='number of simulated updates')
+    parser.add_argument('--rate', type=float, default=50, help='updates per second, on average')
+    parser.add_argument('--torrents', type=int, default=1000, help='number of torrents of the fake WebUI')
+    parser.add_argument('--latency', type=float, default=0.02, help='seconds added to every response')
+    args = parser.parse_args()
+
+    webui = FakeWebUI(args.torrents, latency=args.latency).start()
+    try:
+        HASHES.extend(webui.torrents)
+        aqb = AsyncClient(CustomClient(webui.url, bot_username='benchmark'))
+        updates = make_updates(args.updates, args.rate)
+
+        print(f'{args.updates} updates at {args.rate:.0f}/s, {args.torrents} torrents, '
+              f'{args.latency * 1000:.0f} ms of added latency')
+
+        report('AsyncClient, concurrent updates:', asyncio.run(fire(aqb, updates, one_at_a_time=False)))
+        report('one update at a time (a dispatcher with one worker):', asyncio.run(fire(aqb, updates, one_at_a_time=True)))
+    finally:
+        webui.stop()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,60 @@
+"""Bytes transferred and latency of a torrents list served by the maindata cache (TorrentsCache), compared to
+downloading the full torrents/info list every time.
+
+Runs against a fake WebUI on localhost (see fake_webui.py). Run it from the repository's root, where config.toml is
+(a copy of config.example.toml is enough):
+
+    python -m benchmarks.maindata_sync [--latency 0.02] [--changed 50]
+"""
+
+import argparse
+
+from qbt.custom import CustomClient
+from .fake_webui import FakeWebUI
+from .fake_webui import timed
+
+COUNTS = (100, 1000, 4000, 10000)
+REPEAT = 20
+
+
+def run(count: int, changed: int, latency: float):
+    webui = FakeWebUI(count, latency=latency).start()
+    try:
+        qb = CustomClient(webui.url, bot_username='benchmark')
+
+        full_ms = timed(lambda: qb.torrents(max_age=None, get_torrent_generic_properties=False), REPEAT)
+        full_bytes = webui.bytes_sent['torrents/info'] / REPEAT
+
+        webui.reset_counters()
+        qb.cache.sync()
+        first_sync_bytes = webui.bytes_sent['sync/maindata']
+
+        def cached_list():
+            webui.tick(changed)
+            qb.torrents(max_age=0, get_torrent_generic_properties=False)
+
+        webui.reset_counters()
+        cached_ms = timed(cached_list, REPEAT)
+        cached_bytes = webui.bytes_sent['sync/maindata'] / REPEAT
+    finally:
+        webui.stop()
+
+    print(f'{count:>6} torrents | torrents/info: {full_bytes / 1024:>9.1f} KiB {full_ms:>8.1f} ms | '
+          f'maindata delta: {cached_bytes / 1024:>7.1f} KiB {cached_ms:>7.1f} ms | '
+          f'first sync: {first_sync_bytes / 1024:.1f} KiB')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--latency', type=float, default=0.0, help='seconds added to every response')
+    parser.add_argument('--changed', type=int, default=50, help='torrents changed between two requests')
+    args = parser.parse_args()
+
+    print(f'{args.changed} torrents changed between two requests, {args.latency * 1000:.0f} ms of added latency, '
+          f'average of {REPEAT} requests')
+    for count in COUNTS:
+        run(count, args.changed, args.latency)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,97 @@
+"""Resident memory (RSS) of the bot's torrents data: the maindata cache with and without its columns
+(qbt.columns.TorrentColumns), and a qb.torrents() list held while it's being used (eg. /json).
+
+Every measurement runs in a new process, so the numbers don't depend on what was allocated before. The fake WebUI
+(see fake_webui.py) runs in this process and is not counted. Run it from the repository's root, where config.toml
+is (a copy of config.example.toml is enough):
+
+    python -m benchmarks.memory [--counts 1000 10000]
+"""
+
+import argparse
+import gc
+import subprocess
+import sys
+
+import psutil
+
+from .fake_webui import FakeWebUI
+
+MODES = ('client', 'cache without columns', 'cache', 'cache + torrents list')
+
+
+def rss_mib() -> float:
+    gc.collect()
+    return psutil.Process().memory_info().rss / 1024 / 1024
+
+
+def child(url: str, mode: str):
+    """Runs in the measuring process: prints the RSS after building the data of the mode"""
+
+    import qbt.cache
+    from qbt.columns import TorrentColumns
+    from qbt.custom import CustomClient
+
+    if mode == 'cache without columns':
+        class NoColumns(TorrentColumns):
+            def update(self, *args, **kwargs):
+                pass
+
+            def remove(self, *args, **kwargs):
+                pass
+
+        qbt.cache.TorrentColumns = NoColumns
+
+    qb = CustomClient(url, bot_username='benchmark')
+    data = None
+    if mode != 'client':
+        qb.cache.sync()
+    if mode == 'cache + torrents list':
+        data = qb.torrents(get_torrent_generic_properties=False, max_age=3600)
+
+    print(rss_mib(), len(data or []))
+
+
+def measure(url: str, mode: str) -> float:
+    output = subprocess.run(
+        [sys.executable, '-m', 'benchmarks.memory', '--child', url, mode],
+        check=True,
+        stdout=subprocess.PIPE,
+        universal_newlines=True
+    ).stdout
+
+    return float(output.split()[0])
+
+
+def run(count: int):
+    webui = FakeWebUI(count).start()
+    try:
+        results = {mode: measure(webui.url, mode) for mode in MODES}
+    finally:
+        webui.stop()
+
+    client_mib = results['client']
+    print(f'\n{count} torrents (RSS of the client alone: {client_mib:.1f} MiB)')
+    for mode in MODES[1:]:
+        print(f'  {mode:>22}: {results[mode]:>6.1f} MiB RSS, +{results[mode] - client_mib:>5.1f} MiB over the client')
+
+    columns_mib = results['cache'] - results['cache without columns']
+    print(f'  {"columns":>22}: {columns_mib:>+6.1f} MiB')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--counts', type=int, nargs='+', default=[1000, 10000], help='numbers of torrents')
+    parser.add_argument('--child', nargs=2, metavar=('URL', 'MODE'), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        child(*args.child)
+        return
+
+    for count in args.counts:
+        run(count)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,82 @@
+"""Latency of a /filter query served by the search index (qbt.search.SearchIndex) and by the scan of the torrents'
+names CustomClient.filter() used to do, plus the time and memory it takes to build the index.
+
+The index ranks the matches and returns the best LIMIT ones, the scan returns all of them unranked.
+Runs on generated torrents, without a WebUI: the scan's time doesn't include downloading the torrents list. Run it
+from the repository's root, where config.toml is (a copy of config.example.toml is enough):
+
+    python -m benchmarks.search [--counts 1000 10000 50000]
+"""
+
+import argparse
+import time
+import tracemalloc
+
+from qbt.search import SearchIndex
+from .fake_webui import make_torrents
+from .fake_webui import timed
+
+# description: query
+QUERIES = {
+    'one word': 'sintel',
+    'two words': 'ubuntu amd64',
+    'prefix': 'remas',
+    'infix': 'maste',
+    'short prefix': 'fl',
+    'no results': 'windows',
+}
+REPEAT = 20
+
+# /filter lists the best FILTER_MAX_RESULTS matches
+LIMIT = 100
+
+
+def scan(torrents: dict, query: str) -> list:
+    # what CustomClient.filter() did before the index: look for the query in every torrent's name
+    query = query.lower()
+    return [torrent_hash for torrent_hash, t in torrents.items() if query in t['name'].lower()]
+
+
+def build_index(torrents: dict) -> SearchIndex:
+    index = SearchIndex()
+    for torrent_hash, torrent_dict in torrents.items():
+        index.update(torrent_hash, torrent_dict)
+
+    return index
+
+
+def run(count: int):
+    torrents = make_torrents(count)
+
+    start = time.perf_counter()
+    index = build_index(torrents)
+    build_ms = (time.perf_counter() - start) * 1000
+
+    # measured again with tracemalloc on: it slows the allocations down
+    tracemalloc.start()
+    measured_index = build_index(torrents)
+    index_mib = tracemalloc.get_traced_memory()[0] / 1024 / 1024
+    tracemalloc.stop()
+    del measured_index
+
+    print(f'\n{count} torrents | index built in {build_ms:.0f} ms, {index_mib:.1f} MiB')
+    for description, query in QUERIES.items():
+        results = index.search(query, limit=LIMIT) or []
+        index_ms = timed(lambda: index.search(query, limit=LIMIT), REPEAT)
+        scan_ms = timed(lambda: scan(torrents, query), REPEAT)
+
+        print(f'  {description:>12} ({query!r:>15}, {len(results):>3} results): '
+              f'index {index_ms:>7.2f} ms | scan {scan_ms:>7.2f} ms')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--counts', type=int, nargs='+', default=[1000, 10000, 50000], help='numbers of torrents')
+    args = parser.parse_args()
+
+    for count in args.counts:
+        run(count)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,63 @@
+"""Latency of the single torrent lookup every inline button of the torrent keyboard does (CustomClient.torrent()):
+the cached path (maindata delta + hash lookup), the torrents/info?hashes= path, and the full list scan
+CustomClient.torrent() used to do.
+
+Runs against a fake WebUI on localhost (see fake_webui.py). Run it from the repository's root, where config.toml is
+(a copy of config.example.toml is enough):
+
+    python -m benchmarks.torrent_lookup [--latency 0.02] [--changed 50]
+"""
+
+import argparse
+import random
+
+from qbittorrent import Client
+
+from qbt.custom import CustomClient
+from .fake_webui import FakeWebUI
+from .fake_webui import timed
+
+COUNTS = (100, 1000, 10000)
+REPEAT = 50
+
+
+def scan_lookup(qb: CustomClient, torrent_hash: str):
+    # what CustomClient.torrent() did before the cache: download the whole list and look for the hash
+    for torrent_dict in Client.torrents(qb, filter='all'):
+        if torrent_dict['hash'].lower() == torrent_hash.lower():
+            return torrent_dict
+
+
+def run(count: int, changed: int, latency: float):
+    webui = FakeWebUI(count, latency=latency).start()
+    try:
+        qb = CustomClient(webui.url, bot_username='benchmark')
+        hashes = list(webui.torrents)
+        qb.cache.sync()
+
+        def cached_lookup():
+            webui.tick(changed)  # a button press some seconds after the previous one: the sync has a delta to apply
+            qb.torrent(random.choice(hashes), get_torrent_generic_properties=False, max_age=0)
+
+        cached_ms = timed(cached_lookup, REPEAT)
+        hashes_ms = timed(lambda: qb.torrent(random.choice(hashes), get_torrent_generic_properties=False, max_age=None), REPEAT)
+        scan_ms = timed(lambda: scan_lookup(qb, random.choice(hashes)), max(REPEAT // 10, 3))
+    finally:
+        webui.stop()
+
+    print(f'{count:>6} torrents | cached: {cached_ms:>6.1f} ms | hashes=: {hashes_ms:>6.1f} ms | full scan: {scan_ms:>7.1f} ms')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--latency', type=float, default=0.0, help='seconds added to every response')
+    parser.add_argument('--changed', type=int, default=50, help='torrents changed between two button presses')
+    args = parser.parse_args()
+
+    print(f'{args.changed} torrents changed between two button presses, {args.latency * 1000:.0f} ms of added latency')
+    for count in COUNTS:
+        run(count, args.changed, args.latency)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,70 @@
+"""Cost of building the Torrent objects of CustomClient.torrents() from the maindata cache, with the presentation
+keys (NEW_ATTRS) computed lazily, and with all of them computed for every torrent as the eager enrichment used to do.
+Also times rendering a list page, which only computes the keys its template uses.
+
+Runs against a fake WebUI on localhost (see fake_webui.py), but the cache is synced before timing: only the
+construction is measured. Run it from the repository's root, where config.toml is (a copy of config.example.toml
+is enough):
+
+    python -m benchmarks.torrents_construction [--counts 1000 5000]
+"""
+
+import argparse
+
+from qbt.custom import CustomClient
+from .fake_webui import FakeWebUI
+from .fake_webui import timed
+
+REPEAT = 10
+
+# same as bot.plugins.lists: the plugins can't be imported without a bot
+TORRENT_STRING_COMPACT = """• <code>{short_name_escaped}</code> ({progress_pretty}% of {size_pretty}, {state_pretty}, <b>{generic_speed_pretty}/s</b>) \
+[<a href="{info_deeplink}">info</a>]"""
+LIST_PAGE_SIZE = 15
+
+
+def lazy(qb: CustomClient):
+    return qb.torrents(get_torrent_generic_properties=False, max_age=3600)
+
+
+def eager(qb: CustomClient):
+    # what the construction cost before the lazy keys: every NEW_ATTRS key computed for every torrent
+    torrents = qb.torrents(get_torrent_generic_properties=False, max_age=3600)
+    for torrent in torrents:
+        torrent.dict(materialize=True)
+
+    return torrents
+
+
+def list_page(qb: CustomClient):
+    torrents, _ = qb.torrents_page(0, LIST_PAGE_SIZE, max_age=3600, filter='all', sort='dlspeed', reverse=False)
+    return '\n'.join([torrent.string(base_string=TORRENT_STRING_COMPACT) for torrent in torrents])
+
+
+def run(count: int):
+    webui = FakeWebUI(count).start()
+    try:
+        qb = CustomClient(webui.url, bot_username='benchmark')
+        qb.cache.sync()
+
+        lazy_ms = timed(lambda: lazy(qb), REPEAT)
+        eager_ms = timed(lambda: eager(qb), REPEAT)
+        page_ms = timed(lambda: list_page(qb), REPEAT)
+    finally:
+        webui.stop()
+
+    print(f'{count:>6} torrents | lazy: {lazy_ms:>7.1f} ms | eager: {eager_ms:>7.1f} ms | '
+          f'list page: {page_ms:>6.1f} ms')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--counts', type=int, nargs='+', default=[1000, 5000], help='numbers of torrents')
+    args = parser.parse_args()
+
+    for count in args.counts:
+        run(count)
+
+
+if __name__ == '__main__':
+    main()
@@ -4,9 +4,17 @@ import logging.config
 import json
 
 from requests import HTTPError
+# noinspection PyPackageRequirements
+from telegram.ext import CallbackContext
 
 from .updater import updater
 from .jobs import notify_completed
+from .jobs import COMPLETED_JOB_INTERVAL_ACTIVE
+from .jobs import load_completed_torrents
+from .jobs import sample_transfer_info
+from .jobs import TRANSFER_SAMPLE_INTERVAL
+from .jobs import refresh_trackers_index
+from .jobs import TRACKERS_REFRESH_INTERVAL
 from .qbtinstance import qb
 from utils import utils
 from config import config
@@ -21,6 +29,37 @@ def load_logging_config(file_path='logging.json'):
 
 logger = logging.getLogger(__name__)
 
+# seconds between two connection attempts, when qbittorrent is not reachable
+RECONNECT_INTERVAL = 30
+
+
+def on_qbittorrent_online():
+    logger.info('registering jobs')
+    load_completed_torrents()
+    updater.job_queue.run_repeating(notify_completed, interval=COMPLETED_JOB_INTERVAL_ACTIVE, first=60)
+    updater.job_queue.run_repeating(sample_transfer_info, interval=TRANSFER_SAMPLE_INTERVAL, first=TRANSFER_SAMPLE_INTERVAL, context=dict(samples=0))
+    updater.job_queue.run_repeating(refresh_trackers_index, interval=TRACKERS_REFRESH_INTERVAL, first=30)
+
+    # create the category on startup
+    if config.qbittorrent.added_torrents_category:
+        logger.debug("creating category: %s", config.qbittorrent.added_torrents_category)
+        try:
+            qb.create_category(config.qbittorrent.added_torrents_category)
+        except HTTPError as e:
+            if "409" in str(e):
+                logger.debug("category already exists (%s)", str(e))
+            else:
+                raise e
+
+
+def reconnect_job(context: CallbackContext):
+    # runs while we are not connected to qbittorrent
+    if not qb.connect():
+        return
+
+    context.job.schedule_removal()
+    on_qbittorrent_online()
+
 
 def main():
     load_logging_config()
@@ -28,19 +67,10 @@ def main():
     updater.import_handlers(r'bot/plugins/')
 
     if qb.online:
-        logger.info('registering jobs')
-        updater.job_queue.run_repeating(notify_completed, interval=120, first=60)
-
-        # create the category on startup
-        if config.qbittorrent.added_torrents_category:
-            logger.debug("creating category: %s", config.qbittorrent.added_torrents_category)
-            try:
-                qb.create_category(config.qbittorrent.added_torrents_category)
-            except HTTPError as e:
-                if "409" in str(e):
-                    logger.debug("category already exists (%s)", str(e))
-                else:
-                    raise e
+        on_qbittorrent_online()
+    else:
+        logger.warning('qbittorrent is not online: trying to connect every %d seconds', RECONNECT_INTERVAL)
+        updater.job_queue.run_repeating(reconnect_job, interval=RECONNECT_INTERVAL, first=RECONNECT_INTERVAL)
 
     updater.set_bot_commands(show_first=["overview", "active"])
     updater.run(drop_pending_updates=True)
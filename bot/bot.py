@@ -2,6 +2,10 @@ import logging
 import os
 import importlib
 import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import wraps
 from pathlib import Path
 
 # noinspection PyPackageRequirements
@@ -12,11 +16,80 @@ from telegram import BotCommand
 logger = logging.getLogger(__name__)
 
 
+# cost classes of the handlers: each class has its own executor, so cheap callbacks (eg. inline buttons)
+# never wait for the expensive ones (eg. long torrents lists) to complete
+COST_CHEAP = 'cheap'
+COST_EXPENSIVE = 'expensive'
+
+
+class CostLane:
+    """Bounded thread pool that runs the callbacks of the handlers of a cost class, and keeps track of
+    how many callbacks are waiting for a free worker.
+    The exceptions raised by the callbacks are passed to the dispatcher's error handlers, as the dispatcher
+    does for the callbacks it runs itself"""
+
+    def __init__(self, name, max_workers, dispatcher):
+        self.name = name
+        self._dispatcher = dispatcher
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=f'lane_{name}')
+        self._lock = threading.Lock()
+
+        self.queued = 0
+        self.running = 0
+        self.max_queued = 0
+        self.completed = 0
+        self.total_wait = 0.0  # seconds spent in the queue by all the completed callbacks
+
+    def _run(self, callback, submitted_at, *args, **kwargs):
+        with self._lock:
+            self.queued -= 1
+            self.running += 1
+            self.total_wait += time.monotonic() - submitted_at
+
+        try:
+            return callback(*args, **kwargs)
+        except Exception as e:
+            logger.debug('exception in %s lane, callback %s(): %s', self.name, callback.__name__, str(e))
+            # callbacks receive (update, context): logged by the dispatcher if there are no error handlers
+            self._dispatcher.dispatch_error(args[0] if args else None, e)
+        finally:
+            with self._lock:
+                self.running -= 1
+                self.completed += 1
+
+    def wrap(self, callback):
+        @wraps(callback)
+        def wrapped(*args, **kwargs):
+            with self._lock:
+                self.queued += 1
+                self.max_queued = max(self.max_queued, self.queued)
+                logger.debug('%s lane: %d queued, %d running', self.name, self.queued, self.running)
+
+            self._executor.submit(self._run, callback, time.monotonic(), *args, **kwargs)
+
+        return wrapped
+
+    def stats(self) -> dict:
+        with self._lock:
+            return dict(
+                queued=self.queued,
+                running=self.running,
+                max_queued=self.max_queued,
+                completed=self.completed,
+                avg_wait=self.total_wait / self.completed if self.completed else 0.0
+            )
+
+
 class CustomUpdater(Updater):
-    def __init__(self, *args, **kwargs):
+    def __init__(self, *args, lanes: [dict, None] = None, **kwargs):
+        """lanes: dict cost class -> max number of workers of its executor"""
+
         super().__init__(*args, **kwargs)
         self.bot_commands = []
 
+        lanes = lanes or {COST_CHEAP: 4, COST_EXPENSIVE: 1}
+        self.lanes = {cost: CostLane(cost, max_workers, self.dispatcher) for cost, max_workers in lanes.items()}
+
     @staticmethod
     def _load_manifest(manifest_path):
         if not manifest_path:
@@ -110,12 +183,14 @@ class CustomUpdater(Updater):
         self.start_polling(*args, **kwargs)
         self.idle()
 
-    def add_handler(self, *args, bot_command=None, **kwargs):
+    def add_handler(self, *args, bot_command=None, cost=COST_CHEAP, **kwargs):
         if isinstance(args[0], ConversationHandler):
             # ConverstaionHandler.name or the name of the first entry_point function
+            # conversation handlers always run in the dispatcher: they need the callbacks' return values
             logger.info('adding conversation handler <%s>', args[0].name or args[0].entry_points[0].callback.__name__)
         else:
-            logger.info('adding handler <%s>', args[0].callback.__name__)
+            logger.info('adding handler <%s> (cost: %s)', args[0].callback.__name__, cost)
+            args[0].callback = self.lanes[cost].wrap(args[0].callback)
 
         self.dispatcher.add_handler(*args, **kwargs)
 
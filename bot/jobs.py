@@ -1,25 +1,68 @@
 import logging
 import json
+import os
+import time
+from typing import List
 
 from telegram import ParseMode
 from telegram.ext import CallbackContext
 
+from qbt.cache import PAUSED_STATES
+from utils.timeseries import TieredSeries
 from .qbtinstance import qb
+from .sender import sender
 from utils import u
 from config import config
 
 logger = logging.getLogger("jobs")
 
+# the completed job runs every COMPLETED_JOB_INTERVAL_ACTIVE seconds, but it actually checks the torrents
+# every COMPLETED_JOB_INTERVAL_IDLE seconds when nothing is downloading
+COMPLETED_JOB_INTERVAL_ACTIVE = 15
+COMPLETED_JOB_INTERVAL_IDLE = 120
+
+# seconds between two incremental refreshes of the trackers index
+TRACKERS_REFRESH_INTERVAL = 15
+
+# seconds between two samples of the transfer history, and number of samples between two saves on disk
+TRANSFER_SAMPLE_INTERVAL = 15
+TRANSFER_SAVE_EVERY = 20
+
+TRANSFER_METRICS = ('dl_speed', 'up_speed', 'dl_data', 'up_data', 'active_torrents')
+# tier: (seconds per bucket, number of buckets)
+TRANSFER_TIERS = {
+    'minute': (60, 24 * 60),  # last day
+    'hour': (60 * 60, 24 * 30),  # last month
+    'day': (60 * 60 * 24, 365),  # last year
+}
+
 
 class HashesStorage:
+    """A set of hashes, persisted as a json list (the snapshot) plus an append-only journal file with one hash
+    per line. New hashes are appended to the journal, which is merged into the snapshot when it grows
+    longer than JOURNAL_MAX_LINES lines"""
+
+    JOURNAL_MAX_LINES = 1000
+
     def __init__(self, file_path):
         self._file_path = file_path
+        self._journal_path = file_path + '.journal'
+        self._journal_lines = 0
 
         try:
             with open(self._file_path, 'r') as f:
-                self._data = json.load(f)
+                self._data = set(json.load(f))
         except FileNotFoundError:
-            self._data = list()
+            self._data = set()
+
+        try:
+            with open(self._journal_path, 'r') as f:
+                for line in f:
+                    if line.strip():
+                        self._data.add(line.strip())
+                        self._journal_lines += 1
+        except FileNotFoundError:
+            pass
 
     @staticmethod
     def to_list(string):
@@ -28,18 +71,50 @@ class HashesStorage:
 
         return string
 
+    def __contains__(self, torrent_hash):
+        return torrent_hash in self._data
+
+    def __len__(self):
+        return len(self._data)
+
     def save(self):
-        with open(self._file_path, 'w+') as f:
-            json.dump(self._data, f)
+        """Write the full snapshot and empty the journal"""
+
+        tmp_file_path = self._file_path + '.tmp'
+        with open(tmp_file_path, 'w+') as f:
+            json.dump(list(self._data), f)
+
+        os.replace(tmp_file_path, self._file_path)  # atomic: we never end up with a truncated snapshot
+
+        with open(self._journal_path, 'w+'):
+            pass
+        self._journal_lines = 0
+
+    def _append(self, hashes_list: list):
+        with open(self._journal_path, 'a+') as f:
+            f.write(''.join([f'{h}\n' for h in hashes_list]))
+
+        self._journal_lines += len(hashes_list)
+        if self._journal_lines > self.JOURNAL_MAX_LINES:
+            logger.debug('compacting %s (%d journal lines)', self._file_path, self._journal_lines)
+            self.save()
 
     def insert(self, hashes_list: [str, list]):
-        hashes_list = self.to_list(hashes_list)
+        new_hashes = set(self.to_list(hashes_list)) - self._data
+        if not new_hashes:
+            return
 
-        for h in hashes_list:
-            if h in self._data:
-                continue
+        self._data.update(new_hashes)
+        self._append(list(new_hashes))
+
+    def prune(self, existing_hashes: list):
+        """Forget the hashes that are not in existing_hashes (eg. torrents that are no longer in qbittorrent)"""
 
-            self._data.append(h)
+        pruned_count = len(self._data)
+        self._data.intersection_update(existing_hashes)
+        pruned_count -= len(self._data)
+
+        logger.info('%s: %d hashes pruned, %d left', self._file_path, pruned_count, len(self._data))
 
         self.save()
 
@@ -48,30 +123,75 @@ class Completed(HashesStorage):
     def is_new(self, torrent_hash, append=True):
         if torrent_hash not in self._data:
             if append:
-                self._data.append(torrent_hash)
-                self.save()
+                self._data.add(torrent_hash)
+                self._append([torrent_hash])
 
             return True
         else:
             return False
 
 
+class CompletionDetector:
+    """Detect the torrents that completed between two checks, by comparing their progress with the
+    one they had during the previous check"""
+
+    def __init__(self):
+        self._progress = dict()  # hash -> progress during the last check
+        self.downloading = False
+        self.next_check = 0.0  # time.monotonic() of the next check
+
+    def check(self, torrents: List) -> List:
+        """Return the torrents that reached 100% since the last check. Torrents we have never seen before
+        (first check, or torrents added since the last one) are returned if they are completed: it's up to
+        the caller to tell whether they were already known as completed"""
+
+        completed = list()
+        progress = dict()
+        downloading = False
+
+        for torrent in torrents:
+            progress[torrent.hash] = torrent.progress
+            previous_progress = self._progress.get(torrent.hash, None)
+
+            if torrent.progress == 1:
+                if previous_progress is None or previous_progress < 1:
+                    completed.append(torrent)
+            elif torrent.state not in PAUSED_STATES:
+                downloading = True
+
+        self._progress = progress
+        self.downloading = downloading
+
+        interval = COMPLETED_JOB_INTERVAL_ACTIVE if downloading else COMPLETED_JOB_INTERVAL_IDLE
+        self.next_check = time.monotonic() + interval
+
+        return completed
+
+
 completed_torrents = Completed('completed.json')
+completion_detector = CompletionDetector()
+transfer_history = TieredSeries('transfer_history.bin', TRANSFER_METRICS, TRANSFER_TIERS)
+
 
-try:
-    completed_torrents.insert([t.hash for t in qb.torrents(filter='completed')])
-except ConnectionError:
-    # catch the connection error raised by the OffilneClient, in case we are offline
-    logger.warning('cannot register the completed torrents job: qbittorrent is not online')
+def load_completed_torrents():
+    """Register the torrents that are already completed, so we will not notify them. Must be called
+    as soon as we are connected to qbittorrent"""
+
+    completed_torrents.insert(qb.select_hashes(filter='completed'))
+    completed_torrents.prune(qb.select_hashes(filter='all'))
 
 
 @u.failwithmessage_job
 def notify_completed(context: CallbackContext):
+    if time.monotonic() < completion_detector.next_check:
+        # nothing is downloading: no need to check at every run
+        return
+
     logger.info('executing completed job...')
 
-    completed = qb.torrents(filter='completed', get_torrent_generic_properties=False)
+    torrents = qb.torrents(filter='all', get_torrent_generic_properties=False)
 
-    for torrent in completed:
+    for torrent in completion_detector.check(torrents):
         if not completed_torrents.is_new(torrent.hash):
             continue
 
@@ -90,13 +210,50 @@ def notify_completed(context: CallbackContext):
         drive_free_space = u.free_space(qb.save_path)
         text = f'<code>{torrent.name_escaped}</code> completed ({torrent.size_pretty}, free space: {drive_free_space})'
 
-        logger.debug("sending message")
-        context.bot.send_message(
-            chat_id=config.notifications.completed_torrents,
-            text=text,
+        logger.debug("queueing message")
+        # torrents completed at the same time are notified with a single message
+        sender.send_digest(
+            config.notifications.completed_torrents,
+            text,
+            key='completed',
+            header='<b>{count} torrents completed</b>',
             parse_mode=ParseMode.HTML,
             disable_web_page_preview=True,
             disable_notification=True
         )
 
-    logger.info('...completed job executed')
+    logger.info('...completed job executed (downloading: %s)', completion_detector.downloading)
+
+
+def sample_transfer_info(context: CallbackContext):
+    # the maindata sync also returns the server state (global speeds and session totals)
+    try:
+        qb.cache.sync(max_age=TRANSFER_SAMPLE_INTERVAL / 2)
+    except Exception as e:
+        # no need to notify the admins every TRANSFER_SAMPLE_INTERVAL seconds: we will have a gap in the history
+        logger.warning('could not sample the transfer info: %s', str(e))
+        return
+
+    server_state = qb.cache.server_state
+
+    transfer_history.add(time.time(), dict(
+        dl_speed=server_state.get('dl_info_speed', 0),
+        up_speed=server_state.get('up_info_speed', 0),
+        dl_data=server_state.get('dl_info_data', 0),
+        up_data=server_state.get('up_info_data', 0),
+        active_torrents=len(qb.cache.select(filter='active')),
+    ))
+
+    context.job.context['samples'] += 1
+    if context.job.context['samples'] % TRANSFER_SAVE_EVERY == 0:
+        logger.debug('saving the transfer history')
+        transfer_history.save()
+
+
+def refresh_trackers_index(context: CallbackContext):
+    try:
+        qb.cache.sync(max_age=TRACKERS_REFRESH_INTERVAL)
+        qb.trackers_index.refresh(qb.cache.snapshot())
+    except Exception as e:
+        # the torrents that could not be refreshed will be tried again at the next run
+        logger.warning('could not refresh the trackers index: %s', str(e))
@@ -13,6 +13,7 @@ import bencoding
 
 from bot.qbtinstance import qb
 from bot.updater import updater
+from bot.sender import sender
 from utils import u
 from utils import kb
 from utils import Permissions
@@ -31,7 +32,7 @@ def notify_addition(current_chat_id: int, bot: Bot, user: User, torrent_descript
 
     text = f"User {escape(user.full_name)} [<code>{user.id}</code>] added a torrent: " \
            f"<code>{escape(torrent_description)}</code>"
-    bot.send_message(
+    sender.send_message(
         target_chat_id,
         text,
         parse_mode=ParseMode.HTML,
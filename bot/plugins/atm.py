@@ -1,16 +1,25 @@
 import logging
 
 # noinspection PyPackageRequirements
-from telegram import Update, BotCommand
+from telegram import Update, BotCommand, ParseMode
 from telegram.ext import CommandHandler, CallbackContext
 
+from qbt.snapshot import Aggregation
 from bot.qbtinstance import qb
 from bot.updater import updater
+from bot.sender import sender
+from bot.updater import COST_EXPENSIVE
 from utils import u
 from utils import Permissions
 
 logger = logging.getLogger(__name__)
 
+# auto_tmm value -> selection of the torrents with that value
+ATM_AGGREGATIONS = {
+    True: Aggregation().select('atm', lambda t: t['auto_tmm'] is True),
+    False: Aggregation().select('atm', lambda t: t['auto_tmm'] is False),
+}
+
 
 @u.check_permissions(required_permission=Permissions.READ)
 @u.failwithmessage
@@ -32,15 +41,16 @@ def on_atm_command(update: Update, context: CallbackContext):
 def on_atm_list_command(update: Update, context: CallbackContext):
     logger.info('/atmyes or /atmno command used by %s', update.effective_user.first_name)
 
-    torrents = qb.torrents()
-
     atm_enabled = update.message.text.lower().endswith("atmyes")
 
+    # only the selected torrents are built, the generic properties are not needed
+    aggregation = qb.aggregate(ATM_AGGREGATIONS[atm_enabled])
+
     base_string = "• <code>{short_name}</code> ({size_pretty}, {state_pretty}) [<a href=\"{info_deeplink}\">info</a>]"
-    strings_list = [torrent.string(base_string=base_string) for torrent in torrents if torrent['auto_tmm'] is atm_enabled]
+    strings_list = [torrent.string(base_string=base_string) for torrent in aggregation['atm']]
 
     update.message.reply_html(
-        f"There are <b>{len(strings_list)}/{len(torrents)}</b> torrents with "
+        f"There are <b>{len(strings_list)}/{aggregation.total}</b> torrents with "
         f"Automatic Torrent Management {'enabled' if atm_enabled else 'disabled'}:"
     )
 
@@ -49,9 +59,9 @@ def on_atm_list_command(update: Update, context: CallbackContext):
         return
 
     for strings_chunk in u.split_text(strings_list):
-        update.message.reply_html('\n'.join(strings_chunk))
+        sender.send_message(update.effective_chat.id, '\n'.join(strings_chunk), parse_mode=ParseMode.HTML)
 
 
 updater.add_handler(CommandHandler(['atm'], on_atm_command), bot_command=BotCommand("atm", "info about auto torrent management"))
-updater.add_handler(CommandHandler(['atmyes'], on_atm_list_command), bot_command=BotCommand("atmyes", "list torrents which have ATM enabled"))
-updater.add_handler(CommandHandler(['atmno'], on_atm_list_command), bot_command=BotCommand("atmno", "list torrents which have ATM disabled"))
+updater.add_handler(CommandHandler(['atmyes'], on_atm_list_command), bot_command=BotCommand("atmyes", "list torrents which have ATM enabled"), cost=COST_EXPENSIVE)
+updater.add_handler(CommandHandler(['atmno'], on_atm_list_command), bot_command=BotCommand("atmno", "list torrents which have ATM disabled"), cost=COST_EXPENSIVE)
@@ -1,16 +1,22 @@
 import logging
 
 # noinspection PyPackageRequirements
-from telegram import Update, BotCommand
-from telegram.ext import CommandHandler, CallbackContext
+from telegram import Update, BotCommand, ParseMode
+from telegram.ext import CommandHandler, CallbackQueryHandler, CallbackContext
 
 from bot.qbtinstance import qb
 from bot.updater import updater
+from bot.sender import sender
+from bot.updater import COST_EXPENSIVE
 from utils import u
+from utils import kb
 from utils import Permissions
 
 logger = logging.getLogger(__name__)
 
+# max number of /filter results to list: they are ranked, so the best matches are listed first
+FILTER_MAX_RESULTS = 100
+
 
 @u.check_permissions(required_permission=Permissions.READ)
 @u.failwithmessage
@@ -23,17 +29,116 @@ def on_filter_command(update: Update, context: CallbackContext):
 
     query = ' '.join(context.args[0:])
 
-    torrents = qb.filter(query)
+    torrents = qb.filter(query, limit=FILTER_MAX_RESULTS + 1)
 
     if not torrents:
         update.message.reply_text('No results for "{}"'.format(query))
         return
 
+    if len(torrents) > FILTER_MAX_RESULTS:
+        torrents = torrents[:FILTER_MAX_RESULTS]
+        update.message.reply_text(f'Too many results: only the best {FILTER_MAX_RESULTS} matches are listed')
+
     base_string = "• <code>{short_name_escaped}</code> ({progress_pretty}% of {size_pretty}, {share_ratio_rounded}, {state_pretty}) [<a href=\"{info_deeplink}\">info</a>]"
-    strings_list = [torrent.string(base_string=base_string) for torrent in torrents]
+    strings = (torrent.string(base_string=base_string) for torrent in torrents)
+
+    for strings_chunk in u.split_text(strings):
+        sender.send_message(update.effective_chat.id, '\n'.join(strings_chunk), parse_mode=ParseMode.HTML)
+
+
+# actions that can be applied to the /filter results: the destructive ones are not allowed
+FILTER_BULK_ACTIONS = ('pause', 'resume', 'forcestart', 'unforcestart', 'recheck', 'reannounce', 'atmon', 'atmoff')
+
+# number of torrents listed in the /bulk confirmation message
+BULK_PREVIEW_COUNT = 10
+
+
+@u.check_permissions(required_permission=Permissions.EDIT)
+@u.failwithmessage
+def on_bulk_command(update: Update, context: CallbackContext):
+    logger.info('/bulk command used by %s (args: %s)', update.effective_user.first_name, context.args)
+
+    if len(context.args) < 2 or context.args[0].lower() not in FILTER_BULK_ACTIONS:
+        update.message.reply_html(
+            'Usage: /bulk <code>[action] [substring]</code>\n'
+            'Available actions: {}'.format(', '.join([f'<code>{a}</code>' for a in FILTER_BULK_ACTIONS]))
+        )
+        return
+
+    action = context.args[0].lower()
+    query = ' '.join(context.args[1:])
+
+    hashes = qb.select_hashes(query=query)
+    if not hashes:
+        update.message.reply_text('No results for "{}"'.format(query))
+        return
+
+    # the query also matches the tags, categories and trackers, and /filter lists only the best matches:
+    # the action is applied only after the user has seen how many torrents (and which ones) it will affect
+    torrents = [qb.torrent(torrent_hash, get_torrent_generic_properties=False) for torrent_hash in hashes[:BULK_PREVIEW_COUNT]]
+    names = ['• <code>{}</code>'.format(t.short_name_escaped) for t in torrents if t]
+    if len(hashes) > BULK_PREVIEW_COUNT:
+        names.append('• ...and {} more'.format(len(hashes) - BULK_PREVIEW_COUNT))
+
+    sent_message = update.message.reply_html(
+        '<code>{}</code> will be applied to <b>{}</b> torrents matching "{}":\n\n{}'.format(
+            action,
+            len(hashes),
+            u.html_escape(query),
+            '\n'.join(names)
+        ),
+        reply_markup=kb.confirm_bulk_action(action)
+    )
+
+    context.user_data['pending_bulk_action'] = dict(
+        message_id=sent_message.message_id,
+        action=action,
+        query=query,
+        hashes=hashes
+    )
+
+
+@u.check_permissions(required_permission=Permissions.EDIT)
+@u.failwithmessage
+def on_bulk_confirm_button(update: Update, context: CallbackContext):
+    logger.info('/bulk confirm button from %s', update.effective_user.first_name)
+
+    # popped right away: when the button is tapped twice, the action is applied only once
+    pending = context.user_data.pop('pending_bulk_action', None)
+    if pending and pending['message_id'] != update.callback_query.message.message_id:
+        # button of an older /bulk message: keep the action of the latest one
+        context.user_data.setdefault('pending_bulk_action', pending)
+        pending = None
+
+    if not pending:
+        update.callback_query.answer('This action has expired, please use /bulk again')
+        update.callback_query.edit_message_reply_markup(reply_markup=None)
+        return
+
+    affected_torrents = qb.bulk_action(pending['action'], pending['hashes'])
+
+    update.callback_query.edit_message_text('<code>{}</code> applied to {} torrents matching "{}"'.format(
+        pending['action'],
+        affected_torrents,
+        u.html_escape(pending['query'])
+    ), parse_mode=ParseMode.HTML)
+    update.callback_query.answer('Done')
+
+
+@u.check_permissions(required_permission=Permissions.EDIT)
+@u.failwithmessage
+def on_bulk_cancel_button(update: Update, context: CallbackContext):
+    logger.info('/bulk cancel button from %s', update.effective_user.first_name)
+
+    pending = context.user_data.get('pending_bulk_action', None)
+    if pending and pending['message_id'] == update.callback_query.message.message_id:
+        context.user_data.pop('pending_bulk_action', None)
 
-    for strings_chunk in u.split_text(strings_list):
-        update.message.reply_html('\n'.join(strings_chunk))
+    update.callback_query.edit_message_reply_markup(reply_markup=None)
+    update.callback_query.answer('Cancelled')
 
 
 updater.add_handler(CommandHandler(['filter', 'f'], on_filter_command), bot_command=BotCommand("filter", "filter torrents by substring"))
+updater.add_handler(CommandHandler(['bulk'], on_bulk_command), bot_command=BotCommand("bulk", "apply an action to all the torrents matching a substring"), cost=COST_EXPENSIVE)
+updater.add_handler(CallbackQueryHandler(on_bulk_confirm_button, pattern=r'^bulkconfirm$'), cost=COST_EXPENSIVE)
+updater.add_handler(CallbackQueryHandler(on_bulk_cancel_button, pattern=r'^bulkcancel$'))
@@ -15,14 +15,17 @@ HELP_MESSAGE = """<b>Commands</b>:
 
 <i>READ commands</i>
 • /start or /help: show this message
-• /available_filters: show a list of commands that can be used to list torrents by status
+• /available_filters: show a list of commands that can be used to list torrents by status (one page at a time, use the buttons to change page and sorting)
 • /overview: overview of what we're downloading/uploading
-• /filter or /f <code>[substring]</code>: filter by substring (filters from the full list)
+• /filter or /f <code>[words]</code>: search the torrents containing all the words (or their beginning) in their name, tags, category or tracker
 • /settings or /s: get current settings list
 • /transferinfo: overview of the current speed, queueing and share rateo settings
 • /atm: overview of the current Automatic Torrent Management settings
 • /atmyes or /atmno: list torrents with Automatic Torrent Management enabled/disabled
-• /json: get a json file containing a list of all the torrents
+• /json <code>[ndjson] [gz]</code>: get a json file containing a list of all the torrents (optionally \
+as NDJSON and/or gzipped)
+• /stats: transfer speed history of the last hour, day and month
+• /trackers: tracker hosts used by the torrents, with the number of torrents and the trackers status
 • /version: get qbittorrent and API version
 
 <i>WRITE commands</i>
@@ -34,7 +37,9 @@ HELP_MESSAGE = """<b>Commands</b>:
 • /altdown <code>[kb/s]</code>: change the alternative max download speed
 • /altup <code>[kb/s]</code>: change the alternative max upload speed
 • /pauseall: pause all torrents
+• /bulk <code>[action] [substring]</code>: pause/resume/force start/recheck... all the torrents matching a /filter search, after a confirmation
 • /resumeall: resume all torrents
+• /removedeadtrackers or /rdt: remove the trackers that are not working from all the torrents
 • /set <code>[setting] [new value]</code>: change a setting
 • <code>+tag</code> or <code>-tag</code>: reply to a torrent info message with "<code>+some tags</code>" or \
 "<code>-some tags</code>" to add/remove tags. Multiple tags can be passed, separated by a comma \
@@ -44,6 +49,7 @@ HELP_MESSAGE = """<b>Commands</b>:
 • /permissions: get the current permissions configuration
 • /pset <code>[key] [val]</code>: change the value of a permission key
 • /freespace: get the current free space from qbittorrent's download drive
+• /metrics: see the queue depths of the handlers and of the outgoing messages, and the caches hit rates
 
 <i>FREE commands</i>
 • /rmkb: remove the keyboard, if any"""
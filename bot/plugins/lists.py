@@ -1,16 +1,19 @@
 import logging
+import math
 import re
 
 # noinspection PyPackageRequirements
 from telegram.ext import CallbackQueryHandler, CallbackContext, MessageHandler, Filters, CommandHandler
 # noinspection PyPackageRequirements
-from telegram import ParseMode, Update, BotCommand
+from telegram import ParseMode, Update, BotCommand, MAX_MESSAGE_LENGTH
 
 from qbt.custom import TORRENTS_CATEGORIES
 from bot.qbtinstance import qb
 from bot.updater import updater
 from utils import u
+from utils import kb
 from utils import Permissions
+from utils import refreshes
 
 logger = logging.getLogger(__name__)
 
@@ -18,38 +21,120 @@ logger = logging.getLogger(__name__)
 TORRENT_STRING_COMPACT = """• <code>{short_name_escaped}</code> ({progress_pretty}% of {size_pretty}, {state_pretty}, <b>{generic_speed_pretty}/s</b>) \
 [<a href="{info_deeplink}">info</a>]"""
 
-TORRENT_STRING_COMPLETED = '• <code>{name_escaped}</code> ({size_pretty})'
+# short names: a page of full names can be longer than a message
+TORRENT_STRING_COMPLETED = '• <code>{short_name_escaped}</code> ({size_pretty})'
+
+# number of torrents listed in each page. Pages are built from the cached torrents list, so they are cheap.
+# A page that would be longer than a message lists less torrents: the next page starts from the first one left out
+LIST_PAGE_SIZE = 15
+
+# sorting key used when the list is requested, the other available keys are kb.SORTING_KEYS
+DEFAULT_SORT = 'dlspeed'
 
 TORRENT_CATEG_REGEX_PATTERN = r'^\/({})$'.format(r'|'.join(TORRENTS_CATEGORIES))
 TORRENT_CATEG_REGEX = re.compile(TORRENT_CATEG_REGEX_PATTERN, re.I)
 
 
+def get_list_page(qbfilter, sort, reverse, offset):
+    """The text and markup of the page of the list starting from the torrent at offset"""
+
+    torrents, torrents_count = qb.torrents_page(
+        0,
+        LIST_PAGE_SIZE,
+        filter=qbfilter,
+        sort=sort,
+        reverse=reverse,
+        offset=offset
+    )
+    logger.info('page of %s from %d: %d/%d torrents', qbfilter, offset, len(torrents), torrents_count)
+
+    if not torrents_count:
+        return 'There is no torrent to be listed for <i>{}</i>'.format(qbfilter), None
+
+    if not torrents:
+        # the list got shorter since the page was requested: show the last one
+        offset = (math.ceil(torrents_count / LIST_PAGE_SIZE) - 1) * LIST_PAGE_SIZE
+        torrents, torrents_count = qb.torrents_page(0, LIST_PAGE_SIZE, filter=qbfilter, sort=sort, reverse=reverse, offset=offset)
+
+    if qbfilter == 'completed':
+        base_string = TORRENT_STRING_COMPLETED  # use a shorter string with less info for completed torrents
+    else:
+        base_string = TORRENT_STRING_COMPACT
+
+    header = f"<b>{torrents_count}</b> torrents with status <code>{qbfilter}</code>, " \
+             f"sorted by {sort}{' (reversed)' if reverse else ''}:\n\n"
+
+    # a page must fit in a single message: stop where the next torrent would exceed the limit. The torrents left out
+    # are the first ones of the next page
+    text_length = u.telegram_length(header)
+    strings_list = []
+    for torrent in torrents:
+        string = torrent.string(base_string=base_string)
+        string_length = u.telegram_length(string) + (1 if strings_list else 0)  # the newline
+        if strings_list and text_length + string_length > MAX_MESSAGE_LENGTH:
+            logger.info('page of %s from %d cut after %d torrents', qbfilter, offset, len(strings_list))
+            break
+
+        strings_list.append(string)
+        text_length += string_length
+
+    text = header + '\n'.join(strings_list)
+
+    # pages are LIST_PAGE_SIZE torrents long, unless they have been cut
+    page = math.ceil(offset / LIST_PAGE_SIZE)
+    next_offset = offset + len(strings_list)
+    pages_count = page + 1 + math.ceil((torrents_count - next_offset) / LIST_PAGE_SIZE)
+
+    reply_markup = kb.list_page_markup(
+        qbfilter,
+        sort,
+        reverse,
+        page,
+        pages_count,
+        offset,
+        previous_offset=max(offset - LIST_PAGE_SIZE, 0) if offset > 0 else None,
+        next_offset=next_offset if next_offset < torrents_count else None
+    )
+
+    return text, reply_markup
+
+
 @u.check_permissions(required_permission=Permissions.READ)
 @u.failwithmessage
 def on_torrents_list_selection(update: Update, context: CallbackContext):
     logger.info('torrents list menu button from %s: %s', update.message.from_user.first_name, context.match[0])
 
-    qbfilter = context.match[0].replace("/", "")
+    qbfilter = context.match[0].replace("/", "").lower()
     logger.info('torrents status: %s', qbfilter)
 
-    update.message.reply_html(f"Listing torrents with status <code>{qbfilter}</code> (migth take some seconds):")
+    text, reply_markup = get_list_page(qbfilter, DEFAULT_SORT, False, 0)
 
-    torrents = qb.torrents(filter=qbfilter, sort='dlspeed', reverse=False, get_torrent_generic_properties=False) or []
-    logger.info('qbittirrent request returned %d torrents', len(torrents))
+    update.message.reply_html(text, reply_markup=reply_markup)
 
-    if not torrents:
-        update.message.reply_html('There is no torrent to be listed for <i>{}</i>'.format(qbfilter))
+
+@u.check_permissions(required_permission=Permissions.READ)
+@u.failwithmessage
+@u.ignore_not_modified_exception
+def on_list_page_button(update: Update, context: CallbackContext):
+    logger.info('torrents list page button from %s: %s', update.effective_user.first_name, context.match[0])
+
+    qbfilter = context.match[1]
+    sort = context.match[2]
+    reverse = context.match[3] == '1'
+    offset = int(context.match[4])
+
+    if qbfilter not in TORRENTS_CATEGORIES or (sort not in kb.SORTING_KEYS and sort != DEFAULT_SORT):
+        update.callback_query.answer('Invalid list')
         return
 
-    if qbfilter == 'completed':
-        base_string = TORRENT_STRING_COMPLETED  # use a shorter string with less info for completed torrents
-    else:
-        base_string = TORRENT_STRING_COMPACT
+    text, reply_markup = get_list_page(qbfilter, sort, reverse, offset)
 
-    strings_list = [base_string.format(**torrent.dict()) for torrent in torrents]
+    if refreshes.is_unchanged(update.callback_query.message, text, reply_markup):
+        update.callback_query.answer('Nothing to refresh')
+        return
 
-    for strings_chunk in u.split_text(strings_list):
-        update.message.reply_html('\n'.join(strings_chunk))
+    update.callback_query.edit_message_text(text, parse_mode=ParseMode.HTML, reply_markup=reply_markup)
+    update.callback_query.answer(f'Page {math.ceil(offset / LIST_PAGE_SIZE) + 1}')
 
 
 @u.check_permissions(required_permission=Permissions.READ)
@@ -64,6 +149,7 @@ updater.add_handler(
     MessageHandler(Filters.regex(TORRENT_CATEG_REGEX), on_torrents_list_selection),
     bot_command=[BotCommand(c, f"filter only {c} torrents") for c in TORRENTS_CATEGORIES],
 )
+updater.add_handler(CallbackQueryHandler(on_list_page_button, pattern=r'^list:(\w+):(\w+):([01]):(\d+)$'))
 updater.add_handler(
     CommandHandler(["available_filters", "af"], on_available_filters_command),
     bot_command=[BotCommand("available_filters", "show commands to filter the torrents list by status")],
@@ -8,15 +8,20 @@ from telegram import ParseMode, MAX_MESSAGE_LENGTH, Update
 # noinspection PyPackageRequirements
 from telegram.error import BadRequest
 
+from qbt.trackers import TRACKER_STATUSES
 from bot.qbtinstance import qb
 from bot.updater import updater
 from utils import u
 from utils import kb
 from utils import Permissions
+from utils import refreshes
 from config import config
 
 logger = logging.getLogger(__name__)
 
+# the trackers view reuses the trackers fetched by the trackers index in the last TRACKERS_VIEW_MAX_AGE seconds
+TRACKERS_VIEW_MAX_AGE = 60
+
 
 @u.check_permissions(required_permission=Permissions.READ)
 @u.failwithmessage
@@ -42,7 +47,7 @@ def manage_torrent_cb(update: Update, context: CallbackContext):
     torrent = qb.torrent(torrent_hash)
 
     update.callback_query.edit_message_text(
-        torrent.string(refresh=True),
+        torrent.string(),
         reply_markup=torrent.actions_keyboard,
         parse_mode=ParseMode.HTML
     )
@@ -58,10 +63,13 @@ def see_trackers_cb(update: Update, context: CallbackContext):
     logger.info('torrent hash: %s', torrent_hash)
 
     torrent = qb.torrent(torrent_hash)
-    trackers = torrent.trackers()
+    trackers = torrent.trackers(max_age=TRACKERS_VIEW_MAX_AGE)
 
     strings_list = [
-        '<b>{status}:</b> {url} <b>({num_peers} peers)</b>'.format(**{k: u.html_escape(str(v)) for k, v in tracker.items()})
+        '<b>{status}:</b> {url} <b>({num_peers} peers)</b>'.format(**{
+            **{k: u.html_escape(str(v)) for k, v in tracker.items()},
+            'status': TRACKER_STATUSES.get(tracker['status'], tracker['status'])
+        })
         for tracker in trackers]
     text = '\n'.join(strings_list)
 
@@ -77,7 +85,7 @@ def see_trackers_cb(update: Update, context: CallbackContext):
 
         lines_list = list()
         for status, status_counts in trackers_info.items():
-            lines_list.append(f"<b>{status}</b>: {status_counts['count']} trackers, {status_counts['num_peers']} peers")
+            lines_list.append(f"<b>{TRACKER_STATUSES.get(status, status)}</b>: {status_counts['count']} trackers, {status_counts['num_peers']} peers")
 
         text = '\n'.join(lines_list)
 
@@ -97,7 +105,11 @@ def refresh_torrent_cb(update: Update, context: CallbackContext):
     torrent_hash = context.match[1]
     logger.info('torrent hash: %s', torrent_hash)
 
-    torrent = qb.torrent(torrent_hash)
+    if refreshes.too_soon(update.effective_chat.id, update.callback_query.message.message_id):
+        update.callback_query.answer('Already refreshed a moment ago')
+        return
+
+    torrent = refreshes.render(('torrent', torrent_hash), lambda: qb.torrent(torrent_hash))
 
     if not torrent:
         update.callback_query.edit_message_text(
@@ -106,10 +118,16 @@ def refresh_torrent_cb(update: Update, context: CallbackContext):
         )
         return
 
+    text = torrent.string()
+    reply_markup = torrent.actions_keyboard
+    if refreshes.is_unchanged(update.callback_query.message, text, reply_markup):
+        update.callback_query.answer('Nothing to refresh')
+        return
+
     try:
         update.callback_query.edit_message_text(
-            torrent.string(),
-            reply_markup=torrent.actions_keyboard,
+            text,
+            reply_markup=reply_markup,
             parse_mode=ParseMode.HTML
         )
     except BadRequest as e:
@@ -292,7 +310,7 @@ def reduce_buttons(update: Update, context: CallbackContext):
     torrent = qb.torrent(torrent_hash)
 
     update.callback_query.edit_message_text(
-        torrent.string(refresh=True),
+        torrent.string(),
         reply_markup=torrent.short_markup(),
         parse_mode=ParseMode.HTML
     )
@@ -0,0 +1,44 @@
+import logging
+
+# noinspection PyPackageRequirements
+from telegram import Update, BotCommand
+from telegram.ext import CommandHandler, CallbackContext
+
+from bot.qbtinstance import qb
+from bot.updater import updater
+from bot.sender import sender
+from utils import u
+from utils import Permissions
+from utils import refreshes
+
+logger = logging.getLogger(__name__)
+
+
+def format_stats(title: str, stats: dict) -> str:
+    values = ', '.join([f'{k}: {round(v, 3) if isinstance(v, float) else v}' for k, v in stats.items()])
+    return f'<b>{title}</b>: <code>{values}</code>'
+
+
+@u.check_permissions(required_permission=Permissions.ADMIN)
+@u.failwithmessage
+def on_metrics_command(update: Update, context: CallbackContext):
+    logger.info('/metrics from %s', update.message.from_user.first_name)
+
+    lines = [format_stats(f'{cost} lane', lane.stats()) for cost, lane in updater.lanes.items()]
+    lines.append(format_stats('send queue', sender.stats()))
+    lines.append(format_stats('refreshes', refreshes.stats()))
+
+    if qb.online:
+        lines.append(format_stats('rendered strings cache', dict(
+            entries=len(qb.renders),
+            size=qb.renders.size,
+            hits=qb.renders.hits,
+            misses=qb.renders.misses
+        )))
+        lines.append(format_stats('trackers index', qb.trackers_index.stats()))
+        lines.append(format_stats('peers views', qb.peers_views.stats()))
+
+    update.message.reply_html('\n'.join(lines))
+
+
+updater.add_handler(CommandHandler(["metrics"], on_metrics_command), bot_command=BotCommand("metrics", "internal queues and caches metrics"))
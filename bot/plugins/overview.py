@@ -1,6 +1,7 @@
 import datetime
 import logging
-from collections import Counter
+import re
+import time
 
 # noinspection PyPackageRequirements
 from telegram.ext import CommandHandler, CallbackQueryHandler, CallbackContext, MessageHandler, Filters
@@ -8,12 +9,14 @@ from telegram.ext import CommandHandler, CallbackQueryHandler, CallbackContext,
 from telegram import ParseMode, MAX_MESSAGE_LENGTH, Bot, Update, BotCommand
 
 from qbt.custom import STATES_DICT
+from qbt.columns import ColumnsAggregation
 from bot.qbtinstance import qb
 from bot.updater import updater
 from .transfer_info import get_speed_text
 from utils import u
 from utils import kb
 from utils import Permissions
+from utils import refreshes
 
 logger = logging.getLogger(__name__)
 
@@ -33,33 +36,79 @@ QUICK_INFO_TEXT = """• <b>completed:</b> {completed_count}
 <b>Last refresh:</b> {last_refresh}"""
 
 TORRENT_STRING_COMPACT = """• <code>{short_name_escaped}</code> ({progress_pretty}% of {size_pretty}, \
-{share_ratio_rounded}, <b>{generic_speed_pretty}/s</b>) [<a href="{info_deeplink}">info</a>]"""
+{share_ratio_rounded}, <b>{generic_speed_pretty}/s</b>, avg {avg_generic_speed_pretty}/s) [<a href="{info_deeplink}">info</a>]"""
 
+# the smoothed eta (see qbt.history) is shown for the downloading torrents
+TORRENT_STRING_COMPACT_DOWNLOADING = """• <code>{short_name_escaped}</code> ({progress_pretty}% of {size_pretty}, \
+<b>{generic_speed_pretty}/s</b>, avg {avg_generic_speed_pretty}/s, eta {smoothed_eta_pretty}) [<a href="{info_deeplink}">info</a>]"""
 
-def get_quick_info_text(sort_active_by_dl_speed=True):
-    all_torrents = qb.torrents(filter='all', get_torrent_generic_properties=False)
-    states_counter = Counter([t.state for t in all_torrents])
-    categories_counter = Counter([t.category for t in all_torrents])
+# max number of active uploading/downloading torrents listed (the fastest ones)
+OVERVIEW_MAX_ACTIVE_TORRENTS = 15
+
+
+# everything the overview shows about the torrents, computed on the cache's columns in a single pass
+OVERVIEW_AGGREGATION = (
+    ColumnsAggregation()
+    .group_by('states', 'state')
+    .group_by('categories', 'category')
+    .count('completed_count', 'progress', 1.0)
+    .top('active_up', OVERVIEW_MAX_ACTIVE_TORRENTS, 'upspeed', where=('state', 'uploading'))
+    .top('active_down', OVERVIEW_MAX_ACTIVE_TORRENTS, 'dlspeed', where=('state', 'downloading'))
+)
+
+
+# the last refresh time changes at every render: it's not taken into account when telling whether the text changed
+LAST_REFRESH_REGEX = re.compile(r'Last refresh:.*')
+
+
+def load_overview_data():
+    """Fetch everything the overview needs concurrently: the preferences, alt speed status and transfer info
+    end up in the client's cache, so the get_* methods used to build the text will not request them again"""
 
-    active_torrents_up = [torrent for torrent in all_torrents if torrent.state in ("uploading",)]
-    active_torrents_up.sort(key=lambda t: t['upspeed'])
+    start = time.perf_counter()
 
-    active_torrents_down = [torrent for torrent in all_torrents if torrent.state in ("downloading",)]
-    active_torrents_down.sort(key=lambda t: t['dlspeed'])
+    results, timings = qb.fetch_concurrently(
+        torrents=lambda: qb.read_columns(OVERVIEW_AGGREGATION.run),
+        preferences=lambda: qb.preferences(),
+        alt_speed_status=lambda: qb.get_alternative_speed_status(),
+        transfer_info=lambda: qb.global_transfer_info,
+    )
+
+    logger.debug(
+        'overview data loaded in %d ms (%s)',
+        (time.perf_counter() - start) * 1000,
+        ', '.join([f'{name}: {seconds * 1000:.0f} ms' for name, seconds in timings.items()])
+    )
+
+    return results
+
+
+def get_quick_info_text(sort_active_by_dl_speed=True):
+    overview_torrents = load_overview_data()['torrents']
+    states_counter = overview_torrents['states']
+    categories_counter = overview_torrents['categories']
+
+    # the fastest first
+    active_torrents_up = qb.cached_torrents(overview_torrents['active_up'])
+    active_torrents_down = qb.cached_torrents(overview_torrents['active_down'])
 
     active_torrents_down_strings_list = ['no active downloading torrents']
     active_torrents_up_strings_list = ['no active uploading torrents']
     states_count_string = 'none'
     categories_count_string = 'none'
 
-    active_up_count = len(active_torrents_up)
-    active_down_count = len(active_torrents_down)
-    completed_count = len([t for t in all_torrents if t.progress == 1.00])
+    active_up_count = overview_torrents.matched['active_up']
+    active_down_count = overview_torrents.matched['active_down']
+    completed_count = overview_torrents['completed_count']
 
     if active_torrents_down:
-        active_torrents_down_strings_list = [TORRENT_STRING_COMPACT.format(**t.dict()) for t in active_torrents_down]
+        active_torrents_down_strings_list = [t.string(base_string=TORRENT_STRING_COMPACT_DOWNLOADING) for t in active_torrents_down]
+        if active_down_count > len(active_torrents_down):
+            active_torrents_down_strings_list.append(f'• ...and {active_down_count - len(active_torrents_down)} more')
     if active_torrents_up:
-        active_torrents_up_strings_list = [TORRENT_STRING_COMPACT.format(**t.dict()) for t in active_torrents_up]
+        active_torrents_up_strings_list = [t.string(base_string=TORRENT_STRING_COMPACT) for t in active_torrents_up]
+        if active_up_count > len(active_torrents_up):
+            active_torrents_up_strings_list.append(f'• ...and {active_up_count - len(active_torrents_up)} more')
 
     states_count_list = list()
     for state, count in states_counter.most_common():
@@ -119,9 +168,11 @@ def on_overview_command(update: Update, context: CallbackContext):
     logger.info('/overview command from %s', update.message.from_user.first_name)
 
     text = get_quick_info_text()
-    sent_message = update.message.reply_html(text, reply_markup=kb.get_overview_base_markup())
+    reply_markup = kb.get_overview_base_markup()
+    sent_message = update.message.reply_html(text, reply_markup=reply_markup)
 
     context.user_data['last_overview_message_id'] = sent_message.message_id
+    refreshes.save_edit(update.effective_chat.id, sent_message.message_id, text, reply_markup, ignore=LAST_REFRESH_REGEX)
 
 
 @u.check_permissions(required_permission=Permissions.READ)
@@ -136,14 +187,26 @@ def on_overview_refresh(update: Update, context: CallbackContext):
 
     context.bot.delete_message(update.effective_chat.id, update.message.message_id)
 
-    text = get_quick_info_text()
+    if refreshes.too_soon(update.effective_chat.id, message_id):
+        logger.debug('overview message refreshed a moment ago: ignoring')
+        return
+
+    text = refreshes.render(('overview', True), get_quick_info_text)
+    reply_markup = kb.get_overview_base_markup()
+
+    # we don't receive the overview message here: compare with the text of its last edit
+    if refreshes.is_last_edit(update.effective_chat.id, message_id, text, reply_markup, ignore=LAST_REFRESH_REGEX):
+        logger.debug('overview message unchanged: not editing it')
+        return
+
     context.bot.edit_message_text(
         chat_id=update.effective_chat.id,
         message_id=message_id,
         text=text,
         parse_mode=ParseMode.HTML,
-        reply_markup=kb.get_overview_base_markup()
+        reply_markup=reply_markup
     )
+    refreshes.save_edit(update.effective_chat.id, message_id, text, reply_markup, ignore=LAST_REFRESH_REGEX)
 
 
 @u.check_permissions(required_permission=Permissions.READ)
@@ -156,9 +219,23 @@ def on_refresh_button_overview(update: Update, context: CallbackContext):
     if context.match[0] == 'percentage':
         sort_active_by_dl_speed = False
 
-    text = get_quick_info_text(sort_active_by_dl_speed=sort_active_by_dl_speed)
+    if refreshes.too_soon(update.effective_chat.id, update.callback_query.message.message_id):
+        update.callback_query.answer('Already refreshed a moment ago')
+        return
 
-    update.callback_query.edit_message_text(text, parse_mode=ParseMode.HTML, reply_markup=kb.get_overview_base_markup())
+    text = refreshes.render(
+        ('overview', sort_active_by_dl_speed),
+        lambda: get_quick_info_text(sort_active_by_dl_speed=sort_active_by_dl_speed)
+    )
+    reply_markup = kb.get_overview_base_markup()
+
+    if refreshes.is_unchanged(update.callback_query.message, text, reply_markup, ignore=LAST_REFRESH_REGEX):
+        update.callback_query.answer('Nothing to refresh')
+        return
+
+    message_id = update.callback_query.message.message_id
+    update.callback_query.edit_message_text(text, parse_mode=ParseMode.HTML, reply_markup=reply_markup)
+    refreshes.save_edit(update.effective_chat.id, message_id, text, reply_markup, ignore=LAST_REFRESH_REGEX)
     update.callback_query.answer('Refreshed')
 
 
@@ -168,11 +245,12 @@ def on_refresh_button_overview(update: Update, context: CallbackContext):
 def on_alton_button_overview(update: Update, context: CallbackContext):
     logger.info('overview: alton button')
 
-    if not bool(qb.get_alternative_speed_status()):
+    if not bool(qb.get_alternative_speed_status(max_age=0)):
         qb.toggle_alternative_speed()
 
     text = get_quick_info_text()
     update.callback_query.edit_message_text(text, parse_mode=ParseMode.HTML, reply_markup=kb.get_overview_altspeed_markup())
+    refreshes.forget_edit(update.effective_chat.id, update.callback_query.message.message_id)
     update.callback_query.answer('Alternative speed enabled')
 
 
@@ -182,11 +260,12 @@ def on_alton_button_overview(update: Update, context: CallbackContext):
 def on_altoff_button_overview(update: Update, context: CallbackContext):
     logger.info('overview: altoff button')
 
-    if bool(qb.get_alternative_speed_status()):
+    if bool(qb.get_alternative_speed_status(max_age=0)):
         qb.toggle_alternative_speed()
 
     text = get_quick_info_text()
     update.callback_query.edit_message_text(text, parse_mode=ParseMode.HTML, reply_markup=kb.get_overview_altspeed_markup())
+    refreshes.forget_edit(update.effective_chat.id, update.callback_query.message.message_id)
     update.callback_query.answer('Alternative speed disabled')
 
 
@@ -215,6 +294,7 @@ def on_transfer_info_button_overview(update: Update, context: CallbackContext):
 
     update.callback_query.answer("showing transfer info data...")
     update.callback_query.edit_message_text(text, parse_mode=ParseMode.HTML, reply_markup=kb.get_overview_base_markup())
+    refreshes.forget_edit(update.effective_chat.id, update.callback_query.message.message_id)
 
 
 @u.check_permissions(required_permission=Permissions.READ)
@@ -224,6 +304,7 @@ def on_manage_alt_speed_button_overview(update: Update, context: CallbackContext
     logger.info('overview: manage alt speed')
 
     update.callback_query.edit_message_reply_markup(reply_markup=kb.get_overview_altspeed_markup())
+    refreshes.forget_edit(update.effective_chat.id, update.callback_query.message.message_id)
     update.callback_query.answer("use these buttons to configure your alt speed settings")
 
 
@@ -234,6 +315,7 @@ def on_manage_schedule_button_overview(update: Update, context: CallbackContext)
     logger.info('overview: manage schedule')
 
     update.callback_query.edit_message_reply_markup(reply_markup=kb.get_overview_schedule_markup())
+    refreshes.forget_edit(update.effective_chat.id, update.callback_query.message.message_id)
     update.callback_query.answer("use these buttons to configure your schedule settings")
 
 
@@ -247,6 +329,7 @@ def on_schedon_button_overview(update: Update, context: CallbackContext):
 
     text = get_quick_info_text()
     update.callback_query.edit_message_text(text, parse_mode=ParseMode.HTML, reply_markup=kb.get_overview_schedule_markup())
+    refreshes.forget_edit(update.effective_chat.id, update.callback_query.message.message_id)
     update.callback_query.answer('Scheduled altenrative speed on')
 
 
@@ -260,6 +343,7 @@ def on_schedoff_button_overview(update: Update, context: CallbackContext):
 
     text = get_quick_info_text()
     update.callback_query.edit_message_text(text, parse_mode=ParseMode.HTML, reply_markup=kb.get_overview_schedule_markup())
+    refreshes.forget_edit(update.effective_chat.id, update.callback_query.message.message_id)
     update.callback_query.answer('Scheduled altenrative speed off')
 
 
@@ -0,0 +1,217 @@
+import logging
+import threading
+import time
+
+# noinspection PyPackageRequirements
+from telegram import Update, ParseMode
+from telegram.ext import CallbackQueryHandler, CallbackContext, Job
+
+from qbt.peers import PEER_RATE_CLASSES
+from qbt.peers import TorrentPeers
+from qbt.peers import peer_rate
+from bot.qbtinstance import qb
+from bot.updater import updater
+from bot.sender import sender
+from utils import u
+from utils import kb
+from utils import Permissions
+from utils import refreshes
+
+logger = logging.getLogger(__name__)
+
+# seconds between two refreshes of an open peers view
+PEERS_REFRESH_INTERVAL = 5
+
+# seconds after which a peers view stops refreshing if nobody pressed its buttons
+PEERS_VIEW_IDLE_TIMEOUT = 2 * 60
+
+# number of values listed for every group (clients, countries...)
+PEERS_GROUP_MAX_VALUES = 5
+
+# the buttons' callbacks run on several threads, and the jobs on the job queue's: a view's job must be looked up
+# and created (or stopped) atomically, otherwise two taps could open two views of the same message
+views_lock = threading.Lock()
+
+
+def format_counter(counter, max_values=PEERS_GROUP_MAX_VALUES) -> str:
+    if not counter:
+        return 'none'
+
+    values = [f'{count} {u.html_escape(str(value))}' for value, count in counter.most_common(max_values)]
+    if len(counter) > max_values:
+        values.append(f'{len(counter) - max_values} more')
+
+    return ', '.join(values)
+
+
+def get_peers_text(torrent_name: str, torrent_peers: TorrentPeers, refreshing: bool = True) -> str:
+    summary = torrent_peers.summary()
+
+    peers = torrent_peers.peers.values()
+    dl_speed = sum([p.get('dl_speed', 0) for p in peers])
+    up_speed = sum([p.get('up_speed', 0) for p in peers])
+
+    # the rate classes are listed from the slowest to the fastest
+    rates = [f"{summary['rates'][name]} {name}" for _, name in PEER_RATE_CLASSES if summary['rates'][name]]
+
+    lines = [
+        f'<b>Peers of</b> <code>{u.html_escape(torrent_name)}</code>: {summary.total}',
+        f'▼ {u.get_human_readable(dl_speed)}/s, ▲ {u.get_human_readable(up_speed)}/s',
+        '',
+        f"<b>clients</b>: {format_counter(summary['clients'])}",
+        f"<b>countries</b>: {format_counter(summary['countries'])}",
+        f"<b>connection</b>: {format_counter(summary['connections'])}",
+        f"<b>transfer rate</b>: {', '.join(rates) or 'none'}",
+    ]
+
+    if summary['fastest']:
+        lines.extend(['', '<b>Fastest peers</b>:'])
+        for peer in summary['fastest']:
+            lines.append(
+                f"• {u.html_escape(peer.get('client', '') or 'unknown')} ({peer.get('country_code', '') or '?'}, "
+                f"{peer.get('connection', '')}): ▼ {u.get_human_readable(peer.get('dl_speed', 0))}/s, "
+                f"▲ {u.get_human_readable(peer.get('up_speed', 0))}/s, {u.get_human_readable(peer_rate(peer))}/s total"
+            )
+
+    if refreshing:
+        lines.extend(['', f'<i>refreshed every {PEERS_REFRESH_INTERVAL} seconds</i>'])
+    else:
+        lines.extend(['', '<i>not refreshed anymore, use the refresh button to see the current peers</i>'])
+
+    return '\n'.join(lines)
+
+
+def get_view_job_name(chat_id: int, message_id: int) -> str:
+    return f'peers:{chat_id}:{message_id}'
+
+
+def stop_peers_view(job: Job):
+    view = job.context
+    with views_lock:
+        if view['stopped']:
+            return
+
+        view['stopped'] = True
+
+    job.schedule_removal()
+    qb.peers_views.close(view['torrent_peers'].torrent_hash)
+
+
+def peers_view_job(context: CallbackContext):
+    view = context.job.context
+
+    if time.monotonic() - view['last_activity'] > PEERS_VIEW_IDLE_TIMEOUT:
+        logger.info('peers view of %s idle: stopping the refresh', view['torrent_peers'].torrent_hash)
+        stop_peers_view(context.job)
+        refreshing = False
+    else:
+        try:
+            view['torrent_peers'].sync(max_age=PEERS_REFRESH_INTERVAL / 2)
+        except Exception as e:
+            # eg. the torrent has been removed
+            logger.warning('could not sync the peers of %s: %s', view['torrent_peers'].torrent_hash, str(e))
+            stop_peers_view(context.job)
+            return
+
+        refreshing = True
+
+    text = get_peers_text(view['torrent_name'], view['torrent_peers'], refreshing=refreshing)
+    if text == view['text']:
+        return
+
+    view['text'] = text
+    sender.send(
+        'edit_message_text',
+        view['chat_id'],
+        message_id=view['message_id'],
+        text=text,
+        parse_mode=ParseMode.HTML,
+        reply_markup=kb.peers_markup(view['torrent_peers'].torrent_hash)
+    )
+
+
+@u.check_permissions(required_permission=Permissions.READ)
+@u.failwithmessage
+@u.ignore_not_modified_exception
+def on_peers_button(update: Update, context: CallbackContext):
+    logger.info('peers inline button')
+
+    torrent_hash = context.match[1]
+    logger.info('torrent hash: %s', torrent_hash)
+
+    torrent = qb.torrent(torrent_hash, get_torrent_generic_properties=False)
+    if not torrent:
+        update.callback_query.answer('Torrent not found')
+        return
+
+    chat_id = update.effective_chat.id
+    message_id = update.callback_query.message.message_id
+    job_name = get_view_job_name(chat_id, message_id)
+
+    with views_lock:
+        jobs = [job for job in context.job_queue.get_jobs_by_name(job_name) if not job.context['stopped']]
+        if jobs:
+            # the view is already open: pressing refresh keeps it alive
+            job = jobs[0]
+            job.context['last_activity'] = time.monotonic()
+        else:
+            job = context.job_queue.run_repeating(
+                peers_view_job,
+                interval=PEERS_REFRESH_INTERVAL,
+                first=PEERS_REFRESH_INTERVAL,
+                name=job_name,
+                context=dict(
+                    chat_id=chat_id,
+                    message_id=message_id,
+                    torrent_name=torrent.name,
+                    torrent_peers=qb.peers_views.open(torrent.hash),
+                    text=None,
+                    last_activity=time.monotonic(),
+                    stopped=False
+                )
+            )
+
+    view = job.context
+    try:
+        view['torrent_peers'].sync(max_age=PEERS_REFRESH_INTERVAL / 2)
+    except Exception:
+        stop_peers_view(job)
+        raise
+
+    text = get_peers_text(view['torrent_name'], view['torrent_peers'])
+    reply_markup = kb.peers_markup(torrent.hash)
+    if refreshes.is_unchanged(update.callback_query.message, text, reply_markup):
+        update.callback_query.answer('Nothing to refresh')
+        return
+
+    view['text'] = text
+    update.callback_query.edit_message_text(text, parse_mode=ParseMode.HTML, reply_markup=reply_markup)
+    update.callback_query.answer('Peers')
+
+
+@u.check_permissions(required_permission=Permissions.READ)
+@u.failwithmessage
+def on_peers_back_button(update: Update, context: CallbackContext):
+    logger.info('peers back inline button')
+
+    torrent_hash = context.match[1]
+
+    job_name = get_view_job_name(update.effective_chat.id, update.callback_query.message.message_id)
+    for job in context.job_queue.get_jobs_by_name(job_name):
+        stop_peers_view(job)
+
+    torrent = qb.torrent(torrent_hash)
+    if not torrent:
+        update.callback_query.answer('Torrent not found')
+        return
+
+    update.callback_query.edit_message_text(
+        torrent.string(),
+        reply_markup=torrent.actions_keyboard,
+        parse_mode=ParseMode.HTML
+    )
+    update.callback_query.answer('Use the keyboard to manage the torrent')
+
+
+updater.add_handler(CallbackQueryHandler(on_peers_button, pattern=r'^peers:(\w+)$'))
+updater.add_handler(CallbackQueryHandler(on_peers_back_button, pattern=r'^peersback:(\w+)$'))
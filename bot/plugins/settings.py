@@ -7,6 +7,7 @@ from telegram import ParseMode, Update, BotCommand
 
 from bot.qbtinstance import qb
 from bot.updater import updater
+from bot.sender import sender
 from utils import u
 from utils import Permissions
 
@@ -22,7 +23,7 @@ def on_settings_command(update: Update, context: CallbackContext):
     lines = sorted(['{}: <code>{}</code>'.format(k, v) for k, v in preferences.items()])
 
     for strings_chunk in u.split_text(lines):
-        update.message.reply_html('\n'.join(strings_chunk))
+        sender.send_message(update.effective_chat.id, '\n'.join(strings_chunk), parse_mode=ParseMode.HTML)
 
 
 @u.check_permissions(required_permission=Permissions.ADMIN)
@@ -0,0 +1,69 @@
+import logging
+import time
+
+# noinspection PyPackageRequirements
+from telegram import Update, BotCommand
+from telegram.ext import CommandHandler, CallbackContext
+
+from bot.updater import updater
+from bot.jobs import transfer_history
+from utils import u
+from utils import Permissions
+from utils.timeseries import sparkline
+
+logger = logging.getLogger(__name__)
+
+# title, tier, number of buckets
+STATS_PERIODS = (
+    ('Last hour', 'minute', 60),
+    ('Last day', 'hour', 24),
+    ('Last month', 'day', 30),
+)
+
+
+def get_speed_stats_text(now: float, tier: str, buckets_count: int, metric: str, icon: str) -> str:
+    summary = transfer_history.summary(tier, metric, buckets_count, now)
+    if not summary:
+        return f'{icon} no data'
+
+    min_speed, avg_speed, max_speed = summary
+    line = sparkline(transfer_history.averages(tier, metric, buckets_count, now))
+
+    return f'{icon} <code>{line}</code>\n' \
+           f'    min {u.get_human_readable(min_speed)}/s, avg {u.get_human_readable(avg_speed)}/s, ' \
+           f'max {u.get_human_readable(max_speed)}/s'
+
+
+def get_stats_text() -> str:
+    now = time.time()
+
+    sections = []
+    for title, tier, buckets_count in STATS_PERIODS:
+        lines = [f'<b>{title}</b> (one character per {tier})']
+        lines.append(get_speed_stats_text(now, tier, buckets_count, 'dl_speed', '▼'))
+        lines.append(get_speed_stats_text(now, tier, buckets_count, 'up_speed', '▲'))
+
+        active_torrents = transfer_history.summary(tier, 'active_torrents', buckets_count, now)
+        if active_torrents:
+            lines.append(f'• active torrents: avg {active_torrents[1]:.1f}, max {active_torrents[2]:.0f}')
+
+        sections.append('\n'.join(lines))
+
+    # the session totals only grow: the max of the last minutes is the latest value
+    dl_data = transfer_history.summary('minute', 'dl_data', 5, now)
+    up_data = transfer_history.summary('minute', 'up_data', 5, now)
+    if dl_data and up_data:
+        sections.append(f'<b>This session</b>\n▼ {u.get_human_readable(dl_data[2])}\n▲ {u.get_human_readable(up_data[2])}')
+
+    return '\n\n'.join(sections)
+
+
+@u.check_permissions(required_permission=Permissions.READ)
+@u.failwithmessage
+def on_stats_command(update: Update, context: CallbackContext):
+    logger.info('/stats from %s', update.effective_user.first_name)
+
+    update.message.reply_html(get_stats_text())
+
+
+updater.add_handler(CommandHandler(['stats'], on_stats_command), bot_command=BotCommand("stats", "transfer speed history"))
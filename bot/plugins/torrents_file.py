@@ -1,7 +1,8 @@
+import gzip
 import logging
 import json
 import os
-from collections import defaultdict
+import time
 
 # noinspection PyPackageRequirements
 from telegram import Update, BotCommand
@@ -9,41 +10,120 @@ from telegram.ext import CommandHandler, CallbackContext
 
 from bot.qbtinstance import qb
 from bot.updater import updater
+from bot.updater import COST_EXPENSIVE
 from utils import u
 from utils import Permissions
 
 logger = logging.getLogger(__name__)
 
+# number of torrents (and their trackers) to fetch and write at once
+EXPORT_BATCH_SIZE = 100
+
+# min interval (in seconds) between the edits of the progress message
+PROGRESS_EDIT_INTERVAL = 5
+
+
+class TorrentsWriter:
+    """Write the torrents to a file one at a time, so the full list is never kept in memory.
+    The json object maps every state to the list of its torrents: torrents must be written grouped by state.
+    NDJSON files have one torrent per line instead, with its state in the '_state' key"""
+
+    def __init__(self, f, ndjson=False):
+        self._f = f
+        self._ndjson = ndjson
+        self._current_state = None
+
+    def write(self, state: str, torrent_dict: dict):
+        if self._ndjson:
+            self._f.write(json.dumps({'_state': state, **torrent_dict}) + '\n')
+            return
+
+        if self._current_state is None:
+            self._f.write('{\n')
+            self._f.write(f'  {json.dumps(state)}: [\n    ')
+        elif state != self._current_state:
+            self._f.write('\n  ],\n')
+            self._f.write(f'  {json.dumps(state)}: [\n    ')
+        else:
+            self._f.write(',\n    ')
+
+        self._current_state = state
+        self._f.write(json.dumps(torrent_dict))
+
+    def close(self):
+        if self._ndjson:
+            return
+
+        if self._current_state is None:
+            self._f.write('{}\n')
+        else:
+            self._f.write('\n  ]\n}\n')
+
 
 @u.check_permissions(required_permission=Permissions.ADMIN)
 @u.failwithmessage
 def on_json_command(update: Update, context: CallbackContext):
-    logger.info('/json command from %s', update.message.from_user.first_name)
+    logger.info('/json command from %s (args: %s)', update.message.from_user.first_name, context.args)
+
+    args = [arg.lower() for arg in context.args]
+    ndjson = 'ndjson' in args
+    compress = 'gz' in args or 'gzip' in args
 
-    torrents = qb.torrents(filter='all', get_torrent_generic_properties=True)
+    # only the hashes and the states are kept for the whole library: the torrents are fetched in batches later
+    hashes_states = [(t.hash, t.state) for t in qb.torrents(filter='all', sort='state', get_torrent_generic_properties=False)]
 
-    logger.info('qbittirrent request returned %d torrents', len(torrents))
+    logger.info('qbittirrent request returned %d torrents', len(hashes_states))
 
-    if not torrents:
+    if not hashes_states:
         update.message.reply_html('There is no torrent')
         return
 
-    update.message.reply_text("Sending file, it might take a while...")
+    progress_message = update.message.reply_text("Sending file, it might take a while...")
+
+    file_name = f'{update.message.message_id}.{"ndjson" if ndjson else "json"}{".gz" if compress else ""}'
+    file_path = os.path.join('downloads', file_name)
+
+    if compress:
+        f = gzip.open(file_path, 'wt', encoding='utf-8')
+    else:
+        f = open(file_path, 'w+', encoding='utf-8')
+
+    with f:
+        writer = TorrentsWriter(f, ndjson=ndjson)
+
+        last_progress_edit = time.monotonic()
+        for i in range(0, len(hashes_states), EXPORT_BATCH_SIZE):
+            batch = hashes_states[i:i + EXPORT_BATCH_SIZE]
+
+            torrents = qb.torrents(hashes='|'.join([h for h, _ in batch]), get_torrent_generic_properties=True)
+            torrents_by_hash = {t.hash: t for t in torrents}
+            # served by the trackers index: only the trackers that are not indexed (or too old) are requested
+            trackers = qb.trackers_index.get_many(torrents_by_hash.keys())
+
+            for torrent in torrents:
+                torrent.dict()["_trackers"] = trackers[torrent.hash]
+
+            for torrent_hash, state in batch:
+                if torrent_hash not in torrents_by_hash:
+                    # removed while we were exporting the list
+                    continue
 
-    result_dict = defaultdict(list)
-    for torrent in torrents:
-        torrent_dict = torrent.dict()
-        torrent_dict["_trackers"] = torrent.trackers()
-        result_dict[torrent.state].append(torrent_dict)
+                # group by the state the torrent had when the export started, so each state appears only once
+                writer.write(state, torrents_by_hash[torrent_hash].dict(materialize=True))
 
-    file_path = os.path.join('downloads', f'{update.message.message_id}.json')
+            if time.monotonic() - last_progress_edit > PROGRESS_EDIT_INTERVAL:
+                last_progress_edit = time.monotonic()
+                progress_message.edit_text(
+                    f"Sending file, it might take a while... ({i + len(batch)}/{len(hashes_states)} torrents)"
+                )
 
-    with open(file_path, 'w+') as f:
-        json.dump(result_dict, f, indent=2)
+        writer.close()
 
-    update.message.reply_document(open(file_path, 'rb'), caption='#torrents_list', timeout=60 * 10)
+    progress_message.edit_text(f"Sending file, it might take a while... ({len(hashes_states)} torrents exported)")
+    with open(file_path, 'rb') as f:
+        update.message.reply_document(f, caption='#torrents_list', timeout=60 * 10)
 
     os.remove(file_path)
 
 
-updater.add_handler(CommandHandler('json', on_json_command), bot_command=BotCommand("json", "backup the torrents list"))
+updater.add_handler(CommandHandler('json', on_json_command), bot_command=BotCommand("json", "backup the torrents list"), cost=COST_EXPENSIVE)
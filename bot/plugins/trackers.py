@@ -1,43 +1,69 @@
 import logging
 
 # noinspection PyPackageRequirements
-from telegram import Update, BotCommand
+from telegram import Update, BotCommand, ParseMode
 from telegram.ext import CommandHandler, CallbackContext
 
+from qbt.trackers import TRACKER_STATUSES
+from qbt.trackers import TRACKER_STATUS_NOT_WORKING
 from bot.qbtinstance import qb
 from bot.updater import updater
+from bot.updater import COST_EXPENSIVE
+from bot.sender import sender
 from utils import u
 from utils import Permissions
 
 logger = logging.getLogger(__name__)
 
 
+def get_index_status_text() -> str:
+    stats = qb.trackers_index.stats()
+    if not stats['pending']:
+        return f"The trackers of {stats['torrents']} torrents are indexed"
+
+    return f"The trackers of {stats['torrents']} torrents are indexed, {stats['pending']} torrents are waiting for " \
+           f"their trackers to be (re)fetched"
+
+
+@u.check_permissions(required_permission=Permissions.READ)
+@u.failwithmessage
+def on_trackers_command(update: Update, context: CallbackContext):
+    logger.info('/trackers from %s', update.message.from_user.first_name)
+
+    hosts = qb.trackers_index.hosts()
+    if not hosts:
+        update.message.reply_text(f"No tracker found. {get_index_status_text()}")
+        return
+
+    strings_list = []
+    for host, host_info in sorted(hosts.items(), key=lambda item: item[1]['torrents'], reverse=True):
+        statuses = ', '.join([f'{count} {TRACKER_STATUSES.get(status, status)}' for status, count in host_info['statuses'].most_common()])
+        strings_list.append(f"• <code>{u.html_escape(host)}</code>: <b>{host_info['torrents']}</b> torrents ({statuses})")
+
+    strings_list.append(f'\n<i>{get_index_status_text()}</i>')
+
+    for strings_chunk in u.split_text(strings_list):
+        sender.send_message(update.effective_chat.id, '\n'.join(strings_chunk), parse_mode=ParseMode.HTML)
+
+
 @u.check_permissions(required_permission=Permissions.EDIT)
 @u.failwithmessage
 def on_remove_dead_trackers_command(update: Update, context: CallbackContext):
     logger.info('remove dead trackers from %s', update.message.from_user.first_name)
 
-    torrents = qb.torrents(filter='all', get_torrent_generic_properties=False)
+    # status 4: "Tracker has been contacted, but it is not working (or doesn't send proper replies)".
+    # The index might be up to one hour old: the candidates' trackers are fetched again before removing them
+    dead_trackers = qb.trackers_index.confirmed_trackers_with_status(TRACKER_STATUS_NOT_WORKING)
 
     removed_trackers = 0
-    affected_torrents = 0
-    for torrent in torrents:
-        trackers = torrent.trackers()
-
-        urls_to_remove = []
-        for tracker in trackers:
-            if tracker["status"] != 4:
-                # status 4: "Tracker has been contacted, but it is not working (or doesn't send proper replies)"
-                continue
-
-            urls_to_remove.append(tracker["url"])
-
-        if urls_to_remove:
-            torrent.remove_trackers(urls_to_remove)
-            removed_trackers += len(urls_to_remove)
-            affected_torrents += 1
+    for torrent_hash, urls_to_remove in dead_trackers.items():
+        qb.trackers_index.remove_trackers(torrent_hash, urls_to_remove)
+        removed_trackers += len(urls_to_remove)
 
-    update.message.reply_text(f"Removed {removed_trackers} trackers from {affected_torrents} torrents")
+    update.message.reply_text(
+        f"Removed {removed_trackers} trackers from {len(dead_trackers)} torrents. {get_index_status_text()}"
+    )
 
 
-# updater.add_handler(CommandHandler(['removedeadtrackers', 'rdt'], on_remove_dead_trackers_command), bot_command=BotCommand("removedeadtrackers", "remove dead trackers from all torrents"))
+updater.add_handler(CommandHandler(['trackers'], on_trackers_command), bot_command=BotCommand("trackers", "trackers used by the torrents, and their status"))
+updater.add_handler(CommandHandler(['removedeadtrackers', 'rdt'], on_remove_dead_trackers_command), bot_command=BotCommand("removedeadtrackers", "remove dead trackers from all torrents"), cost=COST_EXPENSIVE)
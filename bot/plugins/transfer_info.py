@@ -9,6 +9,7 @@ from bot.qbtinstance import qb
 from utils import Permissions
 from utils import u
 from utils import kb
+from utils import refreshes
 
 logger = logging.getLogger(__name__)
 
@@ -102,7 +103,15 @@ def on_speed_command(update: Update, context: CallbackContext):
 def on_refresh_button_speed(update: Update, context: CallbackContext):
     logger.info('transfer info: refresh button')
 
-    text = get_speed_text()
+    if refreshes.too_soon(update.effective_chat.id, update.callback_query.message.message_id):
+        update.callback_query.answer('Already refreshed a moment ago')
+        return
+
+    text = refreshes.render('transferinfo', get_speed_text)
+
+    if refreshes.is_unchanged(update.callback_query.message, text, kb.REFRESH_TRANSFER_INFO):
+        update.callback_query.answer('Nothing to refresh')
+        return
 
     update.callback_query.edit_message_text(
         text,
@@ -0,0 +1,246 @@
+import logging
+import threading
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import Future
+from html import escape as html_escape
+from typing import Optional
+
+# noinspection PyPackageRequirements
+from telegram import Bot, ParseMode
+# noinspection PyPackageRequirements
+from telegram.error import RetryAfter
+
+from .updater import updater
+from utils import u
+
+logger = logging.getLogger(__name__)
+
+# https://core.telegram.org/bots/faq#my-bot-is-hitting-limits-how-do-i-avoid-this
+# messages per second (and burst size) we allow ourselves to send, in total and to the same chat
+GLOBAL_RATE = 25
+GLOBAL_BURST = 25
+CHAT_RATE = 1
+CHAT_BURST = 3
+
+# seconds during which the digest messages for the same chat are collected before being sent as a single message
+DIGEST_WINDOW = 10
+
+
+class TokenBucket:
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, now: float) -> float:
+        """Seconds to wait before a token is available"""
+
+        self._refill(now)
+        return 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+
+    def take(self, now: float):
+        self._refill(now)
+        self.tokens -= 1
+
+
+class SendQueue:
+    """Send the messages from a background thread, respecting a global rate limit and a per-chat one.
+
+    Messages to the same chat are sent in order, and a chat waiting for its rate limit doesn't block the
+    others. When Telegram answers with a RetryAfter error (429), the message is sent again after the time
+    requested by Telegram. Messages can also be collected into a digest: all the digest messages with the same
+    key sent to a chat within DIGEST_WINDOW seconds are merged into a single message.
+    When sending fails for any other reason, the error is reported to the chat the message was meant for, as
+    u.failwithmessage() does for the handlers (a failed report is only logged)"""
+
+    def __init__(self, bot: Bot):
+        self._bot = bot
+        self._cond = threading.Condition()
+        self._thread: Optional[threading.Thread] = None
+
+        # chat_id -> deque of (bot method, kwargs, future, time.monotonic() when queued, whether to report a failure)
+        self._queues = OrderedDict()
+        self._chat_buckets = dict()  # chat_id -> TokenBucket
+        self._global_bucket = TokenBucket(GLOBAL_RATE, GLOBAL_BURST)
+        self._blocked_until = dict()  # chat_id -> time.monotonic() until which Telegram asked us not to send
+        self._digests = OrderedDict()  # (chat_id, digest key) -> dict with the digest's texts
+
+        self.queued = 0
+        self.max_queued = 0
+        self.sent = 0
+        self.failed = 0
+        self.retry_after_count = 0
+        self.digested = 0  # messages merged into a digest
+        self.total_delay = 0.0  # seconds spent in the queue by the sent messages
+
+    def _start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name='send_queue', daemon=True)
+            self._thread.start()
+
+    def _enqueue(self, method: str, chat_id: int, kwargs: dict, future: Future, front=False,
+                 queued_at: Optional[float] = None, report_failure=True):
+        queue = self._queues.setdefault(chat_id, deque())
+        item = (method, kwargs, future, queued_at or time.monotonic(), report_failure)
+        if front:
+            queue.appendleft(item)
+        else:
+            queue.append(item)
+
+        self.queued += 1
+        self.max_queued = max(self.max_queued, self.queued)
+
+    def send(self, method: str, chat_id: int, **kwargs) -> Future:
+        """Queue a call to a Bot method that sends something to chat_id (send_message, send_document...).
+        The returned future is resolved with the method's result once it has been sent"""
+
+        future = Future()
+        with self._cond:
+            self._start()
+            self._enqueue(method, chat_id, kwargs, future)
+            self._cond.notify()
+
+        return future
+
+    def send_message(self, chat_id: int, text: str, **kwargs) -> Future:
+        return self.send('send_message', chat_id, text=text, **kwargs)
+
+    def send_digest(self, chat_id: int, text: str, key: str, header: str, **kwargs):
+        """Queue a message that will be merged with the other messages with the same key sent to the chat in
+        the next DIGEST_WINDOW seconds. header is formatted with the number of merged messages ({count}) and
+        added on top of the digest when more than one message is merged. kwargs are the send_message kwargs of
+        the first message"""
+
+        with self._cond:
+            self._start()
+
+            digest = self._digests.get((chat_id, key), None)
+            if digest is None:
+                self._digests[(chat_id, key)] = dict(
+                    deadline=time.monotonic() + DIGEST_WINDOW,
+                    texts=[text],
+                    header=header,
+                    kwargs=kwargs
+                )
+            else:
+                digest['texts'].append(text)
+                self.digested += 1
+
+            self._cond.notify()
+
+    def _flush_digests(self, now: float):
+        for digest_key in [k for k, d in self._digests.items() if d['deadline'] <= now]:
+            chat_id, _ = digest_key
+            digest = self._digests.pop(digest_key)
+
+            texts = digest['texts']
+            if len(texts) > 1:
+                texts = [digest['header'].format(count=len(texts))] + texts
+
+            for texts_chunk in u.split_text(texts):
+                self._enqueue('send_message', chat_id, dict(text='\n'.join(texts_chunk), **digest['kwargs']), Future())
+
+    def _next_chat(self, now: float):
+        """Return the chat whose next message can be sent first, and how long we have to wait for it"""
+
+        next_chat_id, min_wait = None, None
+        global_wait = self._global_bucket.wait_time(now)
+
+        for chat_id in self._queues:
+            bucket = self._chat_buckets.setdefault(chat_id, TokenBucket(CHAT_RATE, CHAT_BURST))
+            wait = max(global_wait, bucket.wait_time(now), self._blocked_until.get(chat_id, 0) - now)
+            if min_wait is None or wait < min_wait:
+                next_chat_id, min_wait = chat_id, wait
+
+        for digest in self._digests.values():
+            wait = digest['deadline'] - now
+            if min_wait is None or wait < min_wait:
+                next_chat_id, min_wait = None, wait
+
+        return next_chat_id, min_wait
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while True:
+                    now = time.monotonic()
+                    self._flush_digests(now)
+
+                    chat_id, wait = self._next_chat(now)
+                    if chat_id is not None and wait <= 0:
+                        break
+
+                    # wait for the rate limits (or the next digest), or for a new message
+                    self._cond.wait(timeout=wait if wait is None else max(wait, 0.01))
+
+                method, kwargs, future, queued_at, report_failure = self._queues[chat_id].popleft()
+                if not self._queues[chat_id]:
+                    del self._queues[chat_id]
+
+                self._global_bucket.take(now)
+                self._chat_buckets[chat_id].take(now)
+                self.queued -= 1
+
+            try:
+                result = getattr(self._bot, method)(chat_id=chat_id, **kwargs)
+            except RetryAfter as e:
+                logger.warning('flood limit reached while sending to %s: retrying in %d seconds', chat_id, e.retry_after)
+                with self._cond:
+                    self.retry_after_count += 1
+                    self._blocked_until[chat_id] = time.monotonic() + e.retry_after
+                    self._enqueue(method, chat_id, kwargs, future, front=True, queued_at=queued_at,
+                                  report_failure=report_failure)
+
+                continue
+            except Exception as e:
+                logger.error('error while sending %s to %s: %s', method, chat_id, str(e), exc_info=True)
+                with self._cond:
+                    self.failed += 1
+                    if report_failure:
+                        self._report_failure(method, chat_id, e)
+
+                future.set_exception(e)
+                continue
+
+            with self._cond:
+                self.sent += 1
+                self.total_delay += time.monotonic() - queued_at
+                self._blocked_until.pop(chat_id, None)
+
+            future.set_result(result)
+
+    def _report_failure(self, method: str, chat_id: int, error: Exception):
+        error_str = str(error)
+        if 'not modified' in error_str.lower():
+            # an edit with the same text: nothing went wrong, see u.ignore_not_modified_exception()
+            return
+
+        text = 'An error occurred while sending the message (<code>{}()</code>): <code>{}</code>'.format(
+            method,
+            html_escape(error_str)
+        )
+        # the report is the next message sent to the chat, and it's not reported again if it fails too
+        self._enqueue('send_message', chat_id, dict(text=text, parse_mode=ParseMode.HTML), Future(), front=True,
+                      report_failure=False)
+
+    def stats(self) -> dict:
+        with self._cond:
+            return dict(
+                queued=self.queued,
+                max_queued=self.max_queued,
+                pending_digests=len(self._digests),
+                sent=self.sent,
+                failed=self.failed,
+                retry_after=self.retry_after_count,
+                digested=self.digested,
+                avg_delay=self.total_delay / self.sent if self.sent else 0.0
+            )
+
+
+sender = SendQueue(updater.bot)
@@ -2,6 +2,8 @@
 from telegram.ext import Defaults
 
 from .bot import CustomUpdater
+from .bot import COST_CHEAP
+from .bot import COST_EXPENSIVE
 from config import config
 
 REQUEST_KWARGS = {}
@@ -19,4 +21,5 @@ updater = CustomUpdater(
     defaults=Defaults(timeout=config.telegram.timeout, disable_web_page_preview=True),
     workers=config.telegram.workers,
     request_kwargs=REQUEST_KWARGS,
+    lanes={COST_CHEAP: 4, COST_EXPENSIVE: config.telegram.workers},
 )
@@ -1,2 +1,3 @@
 from .custom import CustomClient
 from .custom import OfflineClient
+from .custom import ReconnectingClient
@@ -0,0 +1,276 @@
+import itertools
+import logging
+import sys
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional, List, Callable, Any, Hashable
+
+from .search import SearchIndex
+from .search import INDEXED_KEYS
+from .history import SpeedHistory
+from .columns import TorrentColumns
+
+logger = logging.getLogger(__name__)
+
+
+# https://github.com/qbittorrent/qBittorrent/wiki/WebUI-API-(qBittorrent-4.1)#get-torrent-list
+# the filters below mirror the ones applied by qbittorrent's TorrentFilter class
+DOWNLOADING_STATES = ('downloading', 'metaDL', 'forcedMetaDL', 'stalledDL', 'checkingDL', 'pausedDL', 'stoppedDL',
+                      'queuedDL', 'forcedDL')
+UPLOADING_STATES = ('uploading', 'stalledUP', 'checkingUP', 'queuedUP', 'forcedUP')
+COMPLETED_STATES = UPLOADING_STATES + ('pausedUP', 'stoppedUP')
+PAUSED_STATES = ('pausedDL', 'pausedUP', 'stoppedDL', 'stoppedUP')
+ACTIVE_STATES = ('metaDL', 'forcedMetaDL', 'downloading', 'forcedDL', 'uploading', 'forcedUP', 'moving')
+ERRORED_STATES = ('error', 'missingFiles')
+
+
+def is_active(t: dict) -> bool:
+    if t['state'] == 'stalledDL':
+        return t['upspeed'] > 0
+
+    return t['state'] in ACTIVE_STATES
+
+
+FILTERS = {
+    'all': lambda t: True,
+    'downloading': lambda t: t['state'] in DOWNLOADING_STATES,
+    'seeding': lambda t: t['state'] in UPLOADING_STATES,
+    'completed': lambda t: t['state'] in COMPLETED_STATES,
+    'paused': lambda t: t['state'] in PAUSED_STATES,
+    'stopped': lambda t: t['state'] in PAUSED_STATES,
+    'active': is_active,
+    'inactive': lambda t: not is_active(t),
+    'resumed': lambda t: t['state'] not in PAUSED_STATES,
+    'running': lambda t: t['state'] not in PAUSED_STATES,
+    'stalled': lambda t: t['state'] in ('stalledUP', 'stalledDL'),
+    'stalled_uploading': lambda t: t['state'] == 'stalledUP',
+    'stalled_downloading': lambda t: t['state'] == 'stalledDL',
+    'errored': lambda t: t['state'] in ERRORED_STATES,
+}
+
+# string keys with a small set of possible values, shared by many torrents: they are interned to save memory
+INTERNED_KEYS = ('state', 'category', 'tags', 'tracker', 'save_path')
+
+# torrents/info parameters we are able to apply to the cached list
+SUPPORTED_PARAMS = ('filter', 'category', 'tag', 'sort', 'reverse', 'limit', 'offset', 'hashes')
+
+
+class TorrentsCache:
+    """In-memory copy of qbittorrent's torrents list, kept up to date using the sync/maindata endpoint.
+
+    After the first (full) update, qbittorrent only sends the torrents (and the torrents' keys) that changed
+    since the last response id (rid), which is way lighter than downloading the whole torrents/info list
+    every time. The torrent dicts returned by this class are shared and must not be edited: copy them first"""
+
+    def __init__(self, qbt):
+        self._qbt = qbt
+        self._lock = threading.Lock()  # protects the cached data, held only while a delta is being applied
+        self._sync_lock = threading.Lock()  # one sync at a time, held during the whole maindata request
+        self._torrents = dict()  # hash -> torrent dict
+        self._versions = dict()  # hash -> version of the torrent dict, changes every time the torrent changes
+        self._versions_counter = itertools.count(1)  # never restarts, so a version is never reused
+        self._rid = 0
+        self.search_index = SearchIndex()  # updated with the torrents that changed at every sync
+        self._columns = TorrentColumns()  # updated with the torrents that changed at every sync, see read_columns()
+        self.speed_history = SpeedHistory()  # speed samples of the active torrents, taken at every sync
+        self.server_state = dict()
+        self.last_sync = 0.0  # time.monotonic() of the last successful sync
+        self._last_sync_start = 0.0  # time.monotonic() of the request of the last successful sync
+
+    @property
+    def age(self) -> float:
+        """Seconds passed since the last sync"""
+
+        if not self._rid:
+            return float('inf')
+
+        return time.monotonic() - self.last_sync
+
+    def invalidate(self):
+        """Force a full update on the next sync. Waits for the sync in progress, if any"""
+
+        with self._sync_lock:
+            self._rid = 0
+
+    def sync(self, max_age: float = 0.0):
+        """Fetch the changes since the last sync, but only if the cached data is older than max_age seconds.
+
+        The maindata request (with its retries) is made without holding the data lock, so get(), version() and
+        snapshot() keep returning the current data in the meantime. Callers that had to wait for another sync
+        to complete use its result, as long as its request has been made after they called this method"""
+
+        called_at = time.monotonic()
+
+        with self._sync_lock:
+            if self._rid and (time.monotonic() - self.last_sync <= max_age or self._last_sync_start >= called_at):
+                return
+
+            sync_start = time.monotonic()
+            data = self._qbt.sync_main_data(rid=self._rid)
+
+            with self._lock:
+                self._apply(data)
+
+            self._rid = data['rid']
+            self._last_sync_start = sync_start
+            self.last_sync = time.monotonic()
+
+    def _apply(self, data: dict):
+        """Apply a maindata response to the cached data. Must be called holding the data lock"""
+
+        if data.get('full_update', False):
+            self._torrents = dict()
+            self._versions = dict()
+            self.search_index.clear()
+            self._columns.clear()
+            self.speed_history.clear()
+
+        for torrent_hash, changes in data.get('torrents', {}).items():
+            # the maindata torrents are keyed by hash, and the dict doesn't contain the hash itself.
+            # Changed torrents are replaced by a new dict instead of being updated in place, so the dicts
+            # returned by get() and select() never change while someone is reading them
+            for key in INTERNED_KEYS:
+                if isinstance(changes.get(key, None), str):
+                    changes[key] = sys.intern(changes[key])
+
+            torrent_dict = self._torrents.get(torrent_hash, None) or dict(hash=torrent_hash)
+            self._torrents[torrent_hash] = {**torrent_dict, **changes}
+            self._versions[torrent_hash] = next(self._versions_counter)
+            self._columns.update(torrent_hash, changes, self._torrents[torrent_hash])
+
+            if torrent_hash not in self.search_index or any(key in changes for key in INDEXED_KEYS):
+                self.search_index.update(torrent_hash, self._torrents[torrent_hash])
+
+        for torrent_hash in data.get('torrents_removed', []):
+            self._torrents.pop(torrent_hash, None)
+            self._versions.pop(torrent_hash, None)
+            self.search_index.remove(torrent_hash)
+            self._columns.remove(torrent_hash)
+
+        self.speed_history.sample(self._torrents, data.get('torrents', {}).keys(), time.monotonic())
+
+        self.server_state.update(data.get('server_state', {}))
+
+        logger.debug(
+            'maindata sync (rid %d -> %d): %d torrents changed, %d removed',
+            self._rid,
+            data['rid'],
+            len(data.get('torrents', {})),
+            len(data.get('torrents_removed', []))
+        )
+
+    def get(self, torrent_hash: str) -> Optional[dict]:
+        with self._lock:
+            return self._torrents.get(torrent_hash.lower(), None)
+
+    def version(self, torrent_dict: dict) -> Optional[int]:
+        """Return the version of a torrent dict returned by get() or select(), or None if the torrent changed
+        since then (or if the dict doesn't come from the cache)"""
+
+        with self._lock:
+            torrent_hash = torrent_dict.get('hash', None)
+            if torrent_hash is None or self._torrents.get(torrent_hash, None) is not torrent_dict:
+                return None
+
+            return self._versions[torrent_hash]
+
+    def read_columns(self, func: Callable[[TorrentColumns], Any]) -> Any:
+        """Run func on the columns of the cached torrents (see TorrentColumns) and return its result. func runs
+        holding the data lock, so it sees the columns as they were after a sync: it must be quick, and must not
+        keep references to the columns"""
+
+        with self._lock:
+            return func(self._columns)
+
+    @staticmethod
+    def matcher(filter='all', category=None, tag=None, hashes=None) -> Callable[[dict], bool]:
+        """Return a function that tells whether a torrent dict matches the torrents/info filtering parameters"""
+
+        filter_func = FILTERS[filter]
+        hashes_set = set(h.lower() for h in hashes.split('|')) if hashes else None
+
+        def match(torrent_dict: dict) -> bool:
+            if hashes_set is not None and torrent_dict['hash'] not in hashes_set:
+                return False
+            if category is not None and torrent_dict['category'] != category:
+                return False
+            if tag == '' and torrent_dict['tags']:
+                # same as the WebUI: an empty tag selects the untagged torrents
+                return False
+            if tag and tag not in [t.strip() for t in torrent_dict['tags'].split(',') if t.strip()]:
+                return False
+
+            return filter_func(torrent_dict)
+
+        return match
+
+    def snapshot(self) -> List[dict]:
+        """All the cached torrent dicts. The dicts are never changed in place, so the list is a consistent
+        snapshot of the torrents at the time of the call"""
+
+        with self._lock:
+            return list(self._torrents.values())
+
+    def select(self, filter='all', category=None, tag=None, sort=None, reverse=False, limit=None, offset=None,
+               hashes=None) -> List[dict]:
+        """Same as the torrents/info endpoint, but applied to the cached torrents"""
+
+        match = self.matcher(filter=filter, category=category, tag=tag, hashes=hashes)
+        torrents = [torrent_dict for torrent_dict in self.snapshot() if match(torrent_dict)]
+
+        if sort:
+            torrents.sort(key=lambda t: t[sort], reverse=str(reverse).lower() == 'true')
+
+        if offset:
+            # a negative offset counts from the end of the list, same as the WebUI
+            torrents = torrents[offset:]
+        if limit:
+            torrents = torrents[:limit]
+
+        return torrents
+
+
+class RenderCache:
+    """LRU cache of the strings rendered from the torrents, keyed by (hash, template, torrent dict version).
+    The versions come from TorrentsCache.version(), so an entry is never returned after its torrent changed.
+    For the templates that use the speed history, the version also includes the time of the torrent's last
+    speed sample (see Torrent.string()).
+    Older entries are evicted when the total length of the cached strings exceeds max_size characters"""
+
+    def __init__(self, max_size: int = 2_000_000):
+        self._max_size = max_size
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # (hash, template, version) -> rendered string
+        self.size = 0
+
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, torrent_hash: str, template: str, version: Hashable, render: Callable[[], str]) -> str:
+        key = (torrent_hash, template, version)
+
+        with self._lock:
+            rendered = self._entries.get(key, None)
+            if rendered is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return rendered
+
+            self.misses += 1
+
+        rendered = render()
+
+        with self._lock:
+            if key not in self._entries:
+                self._entries[key] = rendered
+                self.size += len(rendered)
+
+            while self.size > self._max_size and self._entries:
+                _, evicted = self._entries.popitem(last=False)
+                self.size -= len(evicted)
+
+        return rendered
+
+    def __len__(self):
+        return len(self._entries)
@@ -0,0 +1,162 @@
+import sys
+from array import array
+from collections import Counter
+from heapq import nlargest, nsmallest
+from typing import Optional, Tuple
+
+from .snapshot import AggregationResult
+
+# key: array typecode. Missing values are stored as 0
+NUMERIC_COLUMNS = {
+    'progress': 'd',
+    'dlspeed': 'q',
+    'upspeed': 'q',
+    'size': 'q',
+    'ratio': 'd',
+}
+# stored as interned strings, missing values are stored as ''
+STRING_COLUMNS = ('state', 'category')
+
+
+class TorrentColumns:
+    """Column-oriented (struct of arrays) copy of some keys of the cached torrents, kept up to date by TorrentsCache
+    with the same maindata deltas applied to the torrent dicts.
+
+    Every torrent has a row: the numeric keys are stored in typed arrays (8 bytes per torrent instead of a dict entry
+    and an int/float object), and the state/category in lists of interned strings, so aggregations (counts,
+    group-bys, top-N: see ColumnsAggregation) run over a few columns instead of going through every torrent dict.
+    A removed torrent's row is filled with the last row, so the columns have no holes, but the order of the rows
+    is not the order of the torrents.
+    The columns are an index next to the cached torrent dicts, not a replacement: the dicts are still needed by the
+    templates and /json. They cost about 130 bytes per torrent (+1.3 MiB RSS with 10k torrents, 2% of the cache,
+    see benchmarks/memory.py), in exchange for aggregations about 3 times faster than going through the dicts.
+    Not thread-safe: TorrentsCache writes and reads the columns holding its data lock"""
+
+    def __init__(self):
+        self.hashes = []  # row -> hash
+        self._rows = dict()  # hash -> row
+        self.columns = {key: array(typecode) for key, typecode in NUMERIC_COLUMNS.items()}
+        for key in STRING_COLUMNS:
+            self.columns[key] = list()
+
+    def __len__(self):
+        return len(self.hashes)
+
+    def __getitem__(self, key):
+        return self.columns[key]
+
+    @staticmethod
+    def _value(key: str, value):
+        if key in NUMERIC_COLUMNS:
+            return value or 0
+        else:
+            return sys.intern(value) if value else ''
+
+    def update(self, torrent_hash: str, changes: dict, torrent_dict: dict):
+        """Apply the maindata changes of a torrent. torrent_dict is the updated torrent dict: it's used to fill
+        the row of the torrents that don't have one yet"""
+
+        row = self._rows.get(torrent_hash, None)
+        if row is None:
+            self._rows[torrent_hash] = len(self.hashes)
+            self.hashes.append(torrent_hash)
+            for key, column in self.columns.items():
+                column.append(self._value(key, torrent_dict.get(key, None)))
+
+            return
+
+        for key, value in changes.items():
+            column = self.columns.get(key, None)
+            if column is not None:
+                column[row] = self._value(key, value)
+
+    def remove(self, torrent_hash: str):
+        row = self._rows.pop(torrent_hash, None)
+        if row is None:
+            return
+
+        last_row = len(self.hashes) - 1
+        if row != last_row:
+            moved_hash = self.hashes[row] = self.hashes[last_row]
+            self._rows[moved_hash] = row
+            for column in self.columns.values():
+                column[row] = column[last_row]
+
+        self.hashes.pop()
+        for column in self.columns.values():
+            column.pop()
+
+    def clear(self):
+        self.__init__()
+
+
+class ColumnsAggregation:
+    """Same as qbt.snapshot.Aggregation, but runs on TorrentColumns: group-bys, counts and top-N over the columns,
+    all computed in a single pass over the rows. The operations are declared once with the column keys, eg.
+        ColumnsAggregation().group_by('states', 'state').top('fastest', 10, 'dlspeed', where=('state', 'downloading'))
+    and run() returns an AggregationResult. The tops are lists of hashes"""
+
+    def __init__(self):
+        self._group_bys = []  # (name, key)
+        self._counts = []  # (name, key, value)
+        self._tops = []  # (name, limit, key, where, reverse)
+
+    def group_by(self, name: str, key: str) -> 'ColumnsAggregation':
+        """Counter of the column's values"""
+
+        self._group_bys.append((name, key))
+        return self
+
+    def count(self, name: str, key: str, value) -> 'ColumnsAggregation':
+        """Number of torrents whose key is equal to value"""
+
+        self._counts.append((name, key, value))
+        return self
+
+    def top(self, name: str, limit: int, key: str, where: Optional[Tuple[str, object]] = None,
+            reverse: bool = True) -> 'ColumnsAggregation':
+        """Hashes of the limit torrents with the largest (or smallest) key, among the ones whose where[0] key is
+        equal to where[1] (all of them if not passed)"""
+
+        self._tops.append((name, limit, key, where, reverse))
+        return self
+
+    def run(self, columns: TorrentColumns) -> AggregationResult:
+        # the pass goes through the rows of the columns the operations need, as tuples: position of every key
+        keys = [key for _, key in self._group_bys] + [key for _, key, _ in self._counts]
+        keys += [where[0] for _, _, _, where, _ in self._tops if where is not None]
+        keys = list(dict.fromkeys(keys))
+        positions = {key: i for i, key in enumerate(keys)}
+
+        group_bys = [(positions[key], dict()) for _, key in self._group_bys]
+        counts = [[positions[key], value, 0] for _, key, value in self._counts]
+        # the tops collect the matching rows during the pass, the heap selection runs on them afterwards
+        tops_rows = [(positions[where[0]], where[1], []) for _, _, _, where, _ in self._tops if where is not None]
+
+        for row, row_values in enumerate(zip(*[columns[key] for key in keys])):
+            for i, counter in group_bys:
+                value = row_values[i]
+                counter[value] = counter.get(value, 0) + 1
+            for count in counts:
+                if row_values[count[0]] == count[1]:
+                    count[2] += 1
+            for i, value, rows in tops_rows:
+                if row_values[i] == value:
+                    rows.append(row)
+
+        values = dict()
+        matched = dict()
+        for (name, _), (_, counter) in zip(self._group_bys, group_bys):
+            values[name] = Counter(counter)
+            matched[name] = len(columns)
+        for (name, _, _), count in zip(self._counts, counts):
+            values[name] = matched[name] = count[2]
+
+        tops_rows = iter(tops_rows)
+        for name, limit, key, where, reverse in self._tops:
+            rows = range(len(columns)) if where is None else next(tops_rows)[2]
+            select = nlargest if reverse else nsmallest
+            values[name] = [columns.hashes[row] for row in select(limit, rows, key=columns[key].__getitem__)]
+            matched[name] = len(rows)
+
+        return AggregationResult(total=len(columns), values=values, matched=matched)
@@ -1,11 +1,34 @@
 import datetime
 import logging
 import math
-from typing import Optional, List
+import random
+import string
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import Future, ThreadPoolExecutor
+from functools import lru_cache
+from operator import itemgetter
+from typing import Optional, List, Callable, Tuple, Any
 
 # noinspection PyPackageRequirements
 from qbittorrent import Client
-
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.exceptions import MaxRetryError, NewConnectionError
+
+from .cache import TorrentsCache
+from .cache import RenderCache
+from .cache import SUPPORTED_PARAMS
+from .columns import TorrentColumns
+from .snapshot import Aggregation
+from .snapshot import AggregationResult
+from .trackers import TrackersIndex
+from .trackers import TRACKERS_REFRESH_WORKERS
+from .trackers import TRACKERS_USER_WORKERS
+from .peers import PeersViews
+from .history import SpeedHistory
+from .history import SpeedStats
 from utils import u
 from utils import kb
 from config import config
@@ -51,8 +74,25 @@ STATES_DICT = {
     'unknown': 'unknown status'
 }
 
+# states for which the generic speed is the upload speed
+UPLOADING_ICON_STATES = ('uploading', 'forcedUP', 'stalledUP')
+
+
+def smoothed_eta(t) -> int:
+    """The eta computed from the torrent's smoothed download speed, which doesn't jump around as much as
+    qbittorrent's eta (based on the instantaneous speed). qbittorrent's eta is used for the torrents we
+    don't have the speed history of"""
+
+    speed_stats = t.speed_stats
+    if t['eta'] == 0 or not speed_stats or speed_stats.smoothed_dlspeed < 1:
+        return t['eta']
+
+    return int(t['amount_left'] / speed_stats.smoothed_dlspeed)
+
+
 # https://github.com/qbittorrent/qBittorrent/wiki/WebUI-API-(qBittorrent-4.1)#get-torrent-list
 # https://github.com/qbittorrent/qBittorrent/wiki/WebUI-API-(qBittorrent-4.1)#get-torrent-generic-properties
+# these keys are computed lazily by TorrentDict, the first time they are accessed
 NEW_ATTRS = {
     'state_pretty': lambda t: STATES_DICT.get(t['state'], t['state']),
     'size_pretty': lambda t: u.get_human_readable(t['total_size']),  # already a string apparently
@@ -64,18 +104,137 @@ NEW_ATTRS = {
     'generic_speed_pretty': lambda t: u.get_human_readable(t['generic_speed']),
     'progress_pretty': lambda t: math.floor(t['progress'] * 100),  # eg. 99.9% should be rounded to 99%
     'eta_pretty': lambda t: str(datetime.timedelta(seconds=t['eta'])),  # apparently it's already a string?
+    'smoothed_eta': lambda t: smoothed_eta(t),
+    'smoothed_eta_pretty': lambda t: str(datetime.timedelta(seconds=t['smoothed_eta'])),
+    'avg_dlspeed_pretty': lambda t: u.get_human_readable(t.speed_stats.avg_dlspeed if t.speed_stats else t['dlspeed']),
+    'avg_upspeed_pretty': lambda t: u.get_human_readable(t.speed_stats.avg_upspeed if t.speed_stats else t['upspeed']),
     'time_elapsed_pretty': lambda t: str(datetime.timedelta(seconds=t['time_elapsed'])),
     'force_start_pretty': lambda t: 'yes' if t['force_start'] else 'no',
     'share_ratio_rounded': lambda t: round(t['ratio'], 2),
     'dl_limit_pretty': lambda t: 'no limit' if t['dl_limit'] == -1 else u.get_human_readable(t['dl_limit']),
     'auto_tmm_string': lambda t: 'yes' if t['auto_tmm'] else 'no',
+    'progress_bar': lambda t: u.build_progress_bar(t['progress']),
+    'manage_deeplink': lambda t: 'https://t.me/{}?start=manage{}'.format(t.bot_username, t['hash']),
+    'info_deeplink': lambda t: 'https://t.me/{}?start=info{}'.format(t.bot_username, t['hash']),
+    'short_name': lambda t: t['name'][:51].strip() + '...' if len(t['name']) > 51 else t['name'],
+    'short_name_escaped': lambda t: u.html_escape(t['short_name']),
+    'generic_speed': lambda t: t['upspeed'] if t['state'] in UPLOADING_ICON_STATES else t['dlspeed'],
+    'avg_generic_speed_pretty': lambda t: t['avg_upspeed_pretty'] if t['state'] in UPLOADING_ICON_STATES else t['avg_dlspeed_pretty'],
+    'traffic_direction_icon': lambda t: '▲' if t['state'] in UPLOADING_ICON_STATES else '▼',
+}
+
+# NEW_ATTRS keys computed from the speed history: they change with every new speed sample, even when the torrent
+# dict (and its version) doesn't
+SPEED_HISTORY_ATTRS = ('smoothed_eta', 'smoothed_eta_pretty', 'avg_dlspeed_pretty', 'avg_upspeed_pretty',
+                       'avg_generic_speed_pretty')
+
+
+@lru_cache(maxsize=256)
+def uses_speed_history(template: str) -> bool:
+    """Tell whether a torrent string template uses any of the SPEED_HISTORY_ATTRS keys"""
+
+    for _, field_name, _, _ in string.Formatter().parse(template):
+        if field_name and field_name.split('.')[0].split('[')[0] in SPEED_HISTORY_ATTRS:
+            return True
+
+    return False
+
+# https://github.com/qbittorrent/qBittorrent/wiki/WebUI-API-(qBittorrent-4.1)#pause-torrents
+# action name: (endpoint, POST data). All these endpoints accept a list of hashes separated by "|"
+BULK_ACTIONS = {
+    'pause': ('torrents/pause', {}),
+    'resume': ('torrents/resume', {}),
+    'forcestart': ('torrents/setForceStart', {'value': 'true'}),
+    'unforcestart': ('torrents/setForceStart', {'value': 'false'}),
+    'recheck': ('torrents/recheck', {}),
+    'reannounce': ('torrents/reannounce', {}),
+    'atmon': ('torrents/setAutoManagement', {'enable': 'true'}),
+    'atmoff': ('torrents/setAutoManagement', {'enable': 'false'}),
+    'addtags': ('torrents/addTags', {}),  # requires the 'tags' POST parameter
+    'removetags': ('torrents/removeTags', {}),  # requires the 'tags' POST parameter
+    'delete': ('torrents/delete', {'deleteFiles': 'false'}),
+    'deletewithfiles': ('torrents/delete', {'deleteFiles': 'true'}),
 }
 
+# max number of hashes to send in a single bulk action request
+BULK_BATCH_SIZE = 200
+
+# max number of concurrent requests to the WebUI (size of the client's thread pool and connections pool)
+MAX_WORKERS = 8
+
+# size of the thread pool used by fetch_concurrently(). It's separate from the client's pool, so the overview's
+# requests never wait in the same queue as the bulk requests (eg. the generic properties of a /json batch)
+FAN_OUT_WORKERS = 4
+
+# for how many seconds the torrents' generic properties fetched for a torrents list can be reused
+PROPERTIES_MAX_AGE = 30
+
+# for how many seconds the preferences and the alternative speed status can be reused.
+# They are invalidated when they are changed through the client
+SETTINGS_MAX_AGE = 5
+
+# for how many seconds the global transfer info can be reused
+TRANSFER_INFO_MAX_AGE = 1
+
+# how many times a request is retried after a connection error (or a server error/timeout, for READ_ENDPOINTS),
+# waiting REQUEST_RETRY_BACKOFF * 2^attempt seconds (+/- 50% jitter) between attempts. The other requests are retried
+# only when the connection could not be established: they might not be idempotent (eg. the toggles)
+REQUEST_RETRIES = 3
+REQUEST_RETRY_BACKOFF = 0.5
+
+# endpoints that only read data, so they can be retried even if the failed request might have reached the WebUI.
+# Not all GET endpoints are read-only: eg. transfer/toggleSpeedLimitsMode, app/shutdown and auth/logout
+READ_ENDPOINTS = frozenset((
+    'app/version',
+    'app/webapiVersion',
+    'app/buildInfo',
+    'app/preferences',
+    'app/defaultSavePath',
+    'log/main',
+    'sync/maindata',
+    'sync/torrentPeers',
+    'transfer/info',
+    'transfer/speedLimitsMode',
+    'transfer/downloadLimit',
+    'transfer/uploadLimit',
+    'torrents/info',
+    'torrents/properties',
+    'torrents/trackers',
+    'torrents/webseeds',
+    'torrents/files',
+    'torrents/pieceStates',
+    'torrents/pieceHashes',
+    'torrents/categories',
+    'torrents/tags',
+))
+
+
+def is_read_endpoint(endpoint: str) -> bool:
+    # some endpoints are passed with their query string, eg. 'torrents/properties?hash=...'
+    return endpoint.split('?', 1)[0] in READ_ENDPOINTS
+
+
+def request_not_sent(error: requests.exceptions.ConnectionError) -> bool:
+    """Tell whether a request failed before the connection to the server was established, so retrying it can't
+    apply it twice. requests raises ConnectionError also when the connection is dropped after the request has been
+    sent (eg. "Connection aborted", RemoteDisconnected)"""
+
+    if isinstance(error, requests.exceptions.ConnectTimeout):
+        return True
+
+    reason = error.args[0] if error.args else None
+    if isinstance(reason, MaxRetryError):
+        reason = reason.reason
+
+    return isinstance(reason, NewConnectionError)
+
+
 TORRENT_STRING = """<code>{name_escaped}</code>
   {progress_bar} {progress_pretty}%
   <b>state</b>: {state_pretty}
   <b>size</b>: {size_pretty}
   <b>dl/up speed</b>: {dl_speed_pretty}/s, {up_speed_pretty}/s
+  <b>recent avg dl/up speed</b>: {avg_dlspeed_pretty}/s, {avg_upspeed_pretty}/s
   <b>dl speed limit</b>: {dl_limit_pretty}
   <b>peers</b>: {peers} connected ({peers_total} in the swarm)
   <b>seeds</b>: {seeds} connected ({seeds_total} in the swarm)
@@ -83,7 +242,7 @@ TORRENT_STRING = """<code>{name_escaped}</code>
   <b>leechers</b>: {num_leechs} connected ({num_incomplete} in the swarm)
   <b>connections</b>: {nb_connections}
   <b>share ratio</b>: {share_ratio_rounded} (max: {max_ratio})
-  <b>eta</b>: {eta_pretty}
+  <b>eta</b>: {smoothed_eta_pretty}
   <b>elapsed</b>: {time_elapsed_pretty}
   <b>category</b>: {category}
   <b>force start</b>: {force_start_pretty}
@@ -94,31 +253,93 @@ TORRENT_STRING = """<code>{name_escaped}</code>
   [<a href="{info_deeplink}">info</a>]"""
 
 
+class TorrentDict(dict):
+    """A torrent dict whose NEW_ATTRS keys are computed only the first time they are accessed, and then memoized.
+    Use str.format_map() to format a template with it (str.format(**d) would copy only the keys computed so far),
+    so only the keys the template actually uses are computed"""
+
+    def __init__(self, torrent_dict: dict, bot_username: str, speed_history: Optional[SpeedHistory] = None):
+        super(TorrentDict, self).__init__(torrent_dict)
+        self.bot_username = bot_username
+        self._speed_history = speed_history
+        self._speed_stats = None
+
+    @property
+    def speed_stats(self) -> Optional[SpeedStats]:
+        """The torrent's average and smoothed speeds, if its speed history is being recorded"""
+
+        if self._speed_stats is None and self._speed_history is not None:
+            self._speed_stats = self._speed_history.stats(self['hash'])
+            self._speed_history = None  # look it up only once
+
+        return self._speed_stats
+
+    def __missing__(self, key):
+        if key not in NEW_ATTRS:
+            raise KeyError(key)
+
+        # it might be that the lambda uses a key that is not available in the torrent dict, eg. when
+        # get_additional_torrent_properties is not True: the KeyError is raised and nothing is memoized
+        value = self[key] = NEW_ATTRS[key](self)
+        return value
+
+    def materialize(self):
+        """Compute all the NEW_ATTRS keys that can be computed"""
+
+        for key in NEW_ATTRS:
+            try:
+                _ = self[key]
+            except KeyError:
+                continue
+
+        return self
+
+
 class Torrent:
-    def __init__(self, qbt, torrent_dict: dict, get_torrent_generic_properties: bool = False):
+    __slots__ = ('_torrent_dict', '_qbt', 'hash', 'version')
+
+    def __init__(self, qbt, torrent_dict: dict, get_torrent_generic_properties: bool = False,
+                 properties: Optional[dict] = None, version: Optional[int] = None):
         self._torrent_dict: dict = torrent_dict
         self._qbt: CustomClient = qbt
         self.hash = self._torrent_dict['hash']
+        # version of the cached torrent dict we have been built from (see TorrentsCache.version()):
+        # the strings rendered from this torrent can be reused as long as the version doesn't change
+        self.version = version
 
         self.refresh(
-            get_torrent_generic_properties=get_torrent_generic_properties,
+            get_torrent_generic_properties=get_torrent_generic_properties and properties is None,
             refresh_torrent_dict=False
         )
 
-        self.actions_keyboard = kb.actions_markup(self.hash)
+        if properties is not None:
+            # generic properties already fetched by the caller
+            self.get_additional_torrent_properties(properties)
+
+    @property
+    def actions_keyboard(self):
+        # built on demand: most of the torrents we create are never shown with their keyboard
+        return kb.actions_markup(self.hash)
 
     def refresh(self, refresh_torrent_dict: bool = True, get_torrent_generic_properties: bool = False):
         if refresh_torrent_dict:
-            self._torrent_dict = self._qbt.torrent(self.hash, get_torrent_generic_properties=False).dict()
+            torrent = self._qbt.torrent(self.hash, get_torrent_generic_properties=False)
+            self._torrent_dict = torrent.dict()
+            self.version = torrent.version
+
+        self._enrich_torrent_dict()
 
         if get_torrent_generic_properties:
             self.get_additional_torrent_properties()
 
-        self._enrich_torrent_dict()
+    def get_additional_torrent_properties(self, additional_properties: Optional[dict] = None):
+        if additional_properties is None:
+            additional_properties = self._qbt.get_torrent(self.hash)
 
-    def get_additional_torrent_properties(self):
-        additional_properties = self._qbt.get_torrent(self.hash)
         if additional_properties:
+            # the generic properties are not versioned: the rendered strings can't be cached anymore
+            self.version = None
+
             for key, val in additional_properties.items():
                 if key in self._torrent_dict:
                     continue
@@ -126,50 +347,29 @@ class Torrent:
                 self._torrent_dict[key] = val
 
     def _enrich_torrent_dict(self):
-        if 'progress' in self._torrent_dict:
-            self._torrent_dict['eta'] = 0 if self._torrent_dict['progress'] == 1 else self._torrent_dict['eta']  # set eta = 0 for completed torrents
-            self._torrent_dict['progress_bar'] = u.build_progress_bar(self._torrent_dict['progress'])
-        if 'hash' in self._torrent_dict:
-            self._torrent_dict['manage_deeplink'] = 'https://t.me/{}?start=manage{}'.format(
-                self._qbt._bot_username,
-                self._torrent_dict['hash']
-            )
-            self._torrent_dict['info_deeplink'] = 'https://t.me/{}?start=info{}'.format(
-                self._qbt._bot_username,
-                self._torrent_dict['hash']
-            )
-
-        self._torrent_dict['short_name'] = self._torrent_dict['name']
-        if len(self._torrent_dict['name']) > 51:
-            self._torrent_dict['short_name'] = self._torrent_dict['name'][:51].strip() + '...'
-        self._torrent_dict['short_name_escaped'] = u.html_escape(self._torrent_dict['short_name'])
-
-        self._torrent_dict['generic_speed'] = self._torrent_dict['dlspeed']
-        icon = '▼'
-        if self._torrent_dict['state'] in ('uploading', 'forcedUP', 'stalledUP'):
-            self._torrent_dict['generic_speed'] = self._torrent_dict['upspeed']
-            icon = '▲'
-        generic_speed_human_readable = u.get_human_readable(self._torrent_dict['generic_speed'])
-        self._torrent_dict['traffic_direction_icon'] = f"{icon}"
-
-        for k, v in NEW_ATTRS.items():
-            try:
-                self._torrent_dict[k] = v(self._torrent_dict)
-            except KeyError:
-                # it might be that one of the lambdas uses a key that is not available in the torrent dict,
-                # eg. when get_additional_torrent_properties is not True
-                continue
+        # this also copies the torrent dict: the presentation keys are computed on first access, see TorrentDict
+        self._torrent_dict = TorrentDict(self._torrent_dict, self._qbt._bot_username, self._qbt.cache.speed_history)
+
+        if 'progress' in self._torrent_dict and self._torrent_dict['progress'] == 1:
+            self._torrent_dict['eta'] = 0  # set eta = 0 for completed torrents
 
     def short_markup(self, *args, **kwargs):
         return kb.short_markup(self.hash, *args, **kwargs)
     
-    def dict(self):
+    def dict(self, materialize=False):
+        if materialize:
+            return self._torrent_dict.materialize()
+
         return self._torrent_dict
 
     def __getitem__(self, item):
         return self._torrent_dict[item]
 
     def __getattr__(self, item):
+        if item == '_torrent_dict':
+            # __slots__ attribute not set yet: avoid infinite recursion
+            raise AttributeError(item)
+
         return self._torrent_dict[item]
 
     def tags_list(self, lower=False):
@@ -185,8 +385,22 @@ class Torrent:
             self.refresh(refresh_torrent_dict=True, get_torrent_generic_properties=True)
 
         base_string = base_string or TORRENT_STRING
-        
-        return base_string.format(**self._torrent_dict)
+
+        if self.version is None:
+            return base_string.format_map(self._torrent_dict)
+
+        version = self.version
+        if uses_speed_history(base_string):
+            # a new speed sample must invalidate the rendered string as a new torrent dict version does
+            speed_stats = self._torrent_dict.speed_stats
+            version = (version, speed_stats.last_timestamp if speed_stats else None)
+
+        return self._qbt.renders.get(
+            self.hash,
+            base_string,
+            version,
+            lambda: base_string.format_map(self._torrent_dict)
+        )
 
     def pause(self):
         return self._qbt.pause(self.hash)
@@ -204,11 +418,12 @@ class Torrent:
     def recheck(self):
         return self._qbt.recheck([self.hash])
 
-    def trackers(self) -> List:
-        return self._qbt.get_torrent_trackers(self.hash)
+    def trackers(self, max_age: Optional[float] = 0) -> List:
+        # served by the trackers index if they have been fetched less than max_age seconds ago
+        return self._qbt.trackers_index.get(self.hash, max_age=max_age)
 
     def remove_trackers(self, urls: [str, List]) -> List:
-        return self._qbt.remove_trackers(self.hash, urls)
+        return self._qbt.trackers_index.remove_trackers(self.hash, [urls] if isinstance(urls, str) else urls)
 
     def add_tags(self, tags: [str, List]):
         return self._qbt.add_tags(self.hash, tags)
@@ -228,6 +443,146 @@ class CustomClient(Client):
         self._bot_username = bot_username
         super(CustomClient, self).__init__(url=url)
         self.online = True
+        self.cache = TorrentsCache(self)
+        self.renders = RenderCache()
+        self.trackers_index = TrackersIndex(self)  # refreshed in background by a job
+        self.peers_views = PeersViews(self)  # peers of the torrents whose peers view is open
+
+        # shared by all the methods that send concurrent requests to the WebUI
+        self.executor = ThreadPoolExecutor(max_workers=MAX_WORKERS, thread_name_prefix='qbt')
+        self._fan_out_executor = ThreadPoolExecutor(max_workers=FAN_OUT_WORKERS, thread_name_prefix='qbt_fan_out')
+        self._properties_lock = threading.Lock()  # the handlers and the executor's threads fill the cache concurrently
+        self._properties_cache = dict()  # hash -> (time.monotonic(), generic properties)
+        # never held during a request: concurrent misses of the same endpoint wait for a single request (in flight),
+        # the requests to different endpoints run concurrently
+        self._endpoints_lock = threading.Lock()
+        self._endpoints_cache = dict()  # endpoint -> (time.monotonic(), response)
+        self._endpoints_in_flight = dict()  # endpoint -> Future of the running request
+        self._endpoints_generation = defaultdict(int)  # endpoint -> number of invalidations
+
+        # Client.__init__() sets the session only if the WebUI doesn't require a login: otherwise it's created
+        # (and the adapter mounted) by login()
+        if getattr(self, 'session', None) is not None:
+            self._mount_adapter()
+
+    def _mount_adapter(self):
+        # keep enough pooled connections for all the workers of the executors
+        pool_maxsize = MAX_WORKERS + FAN_OUT_WORKERS + TRACKERS_REFRESH_WORKERS + TRACKERS_USER_WORKERS
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_maxsize)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+    def login(self, username='admin', password='admin'):
+        # saved to log in again when qbittorrent doesn't recognize our session anymore (eg. after a restart)
+        self._credentials = (username, password)
+
+        # the session is re-created on login
+        result = super(CustomClient, self).login(username, password)
+        self._mount_adapter()
+
+        return result
+
+    def _request(self, endpoint, method, data=None, **kwargs):
+        relogged_in = False
+        attempt = 0
+        read_only = is_read_endpoint(endpoint)
+
+        while True:
+            try:
+                return super(CustomClient, self)._request(endpoint, method, data, **kwargs)
+            except requests.exceptions.HTTPError as e:
+                status_code = e.response.status_code if e.response is not None else None
+                if status_code == 403 and not relogged_in and getattr(self, '_credentials', None):
+                    logger.info('403 response from %s: logging in again', endpoint)
+                    self.login(*self._credentials)
+                    relogged_in = True
+                    continue
+
+                if not read_only or status_code is None or status_code < 500 or attempt >= REQUEST_RETRIES:
+                    raise e
+            except requests.exceptions.ConnectionError as e:
+                if (not read_only and not request_not_sent(e)) or attempt >= REQUEST_RETRIES:
+                    raise e
+            except requests.exceptions.Timeout as e:
+                if not read_only or attempt >= REQUEST_RETRIES:
+                    raise e
+
+            delay = REQUEST_RETRY_BACKOFF * 2 ** attempt * random.uniform(0.5, 1.5)
+            logger.info('request to %s failed (attempt %d), retrying in %.2f seconds', endpoint, attempt + 1, delay)
+
+            time.sleep(delay)
+            attempt += 1
+
+    def _get_cached(self, endpoint, max_age: float):
+        """GET an endpoint, reusing the response if it has been requested less than max_age seconds ago"""
+
+        with self._endpoints_lock:
+            now = time.monotonic()
+
+            cached = self._endpoints_cache.get(endpoint, None)
+            if cached and now - cached[0] <= max_age:
+                return cached[1]
+
+            future = self._endpoints_in_flight.get(endpoint, None)
+            owner = future is None
+            if owner:
+                future = self._endpoints_in_flight[endpoint] = Future()
+                generation = self._endpoints_generation[endpoint]
+
+        if not owner:
+            return future.result()
+
+        try:
+            response = self._get(endpoint)
+        except Exception as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._endpoints_lock:
+                if self._endpoints_in_flight.get(endpoint, None) is future:
+                    self._endpoints_in_flight.pop(endpoint)
+
+        with self._endpoints_lock:
+            # the endpoint has been invalidated while the request was running: the response might be older than
+            # the change, it's returned to the callers that were waiting for it but not cached
+            if self._endpoints_generation[endpoint] == generation:
+                self._endpoints_cache[endpoint] = (now, response)
+
+        future.set_result(response)
+
+        return response
+
+    def _invalidate_cached(self, *endpoints):
+        with self._endpoints_lock:
+            for endpoint in endpoints:
+                self._endpoints_cache.pop(endpoint, None)
+                # the callers from now on must not wait for a request sent before the change
+                self._endpoints_in_flight.pop(endpoint, None)
+                self._endpoints_generation[endpoint] += 1
+
+    def preferences(self, max_age: float = SETTINGS_MAX_AGE) -> dict:
+        # unlike python-qbittorrent's 'preferences' property, this is a method that returns the preferences dict:
+        # qb.preferences() works the same way
+        return self._get_cached('app/preferences', max_age)
+
+    def set_preferences(self, **kwargs):
+        result = super(CustomClient, self).set_preferences(**kwargs)
+        self._invalidate_cached('app/preferences')
+
+        return result
+
+    @property
+    def global_transfer_info(self):
+        return self._get_cached('transfer/info', TRANSFER_INFO_MAX_AGE)
+
+    def get_alternative_speed_status(self, max_age: float = SETTINGS_MAX_AGE):
+        return self._get_cached('transfer/speedLimitsMode', max_age)
+
+    def toggle_alternative_speed(self):
+        result = super(CustomClient, self).toggle_alternative_speed()
+        self._invalidate_cached('transfer/speedLimitsMode', 'transfer/info')
+
+        return result
 
     @property
     def save_path(self):
@@ -248,31 +603,206 @@ class CustomClient(Client):
     def torrents_queueing(self):
         return self.preferences()['queueing_enabled']
 
-    def torrents(self, get_torrent_generic_properties=True, **kwargs):
-        torrents = super(CustomClient, self).torrents(**kwargs) or []
+    def torrents(self, get_torrent_generic_properties=True, max_age: Optional[float] = 0, **kwargs):
+        """Get the torrents list. By default, the list is served by the maindata cache (which is synced before
+        returning the torrents, unless it was synced less than max_age seconds ago).
+        Pass max_age=None to always download the full list from the torrents/info endpoint"""
 
-        return [Torrent(self, torrent_dict, get_torrent_generic_properties) for torrent_dict in torrents]
+        if 'status' in kwargs:
+            # same as python-qbittorrent: make sure that old 'status' argument still works
+            kwargs['filter'] = kwargs.pop('status')
+
+        if max_age is None or any(param not in SUPPORTED_PARAMS for param in kwargs):
+            torrents = super(CustomClient, self).torrents(**kwargs) or []
+        else:
+            self.cache.sync(max_age=max_age)
+            torrents = self.cache.select(**kwargs)
+
+        if not get_torrent_generic_properties:
+            return [Torrent(self, t, version=self.cache.version(t)) for t in torrents]
+
+        properties = self.get_torrents_properties([torrent_dict['hash'] for torrent_dict in torrents])
+
+        return [Torrent(self, t, properties=properties[t['hash']]) for t in torrents]
+
+    def aggregate(self, aggregation: Aggregation, max_age: float = 0, **kwargs) -> AggregationResult:
+        """Run an Aggregation over the cached torrents, in a single pass. kwargs are the torrents/info filtering
+        parameters accepted by TorrentsCache.matcher() (filter, category, tag, hashes).
+        The torrents returned by the aggregation's selections and tops are Torrent objects"""
+
+        self.cache.sync(max_age=max_age)
+
+        return aggregation.run(
+            self.cache.snapshot(),
+            where=self.cache.matcher(**kwargs),
+            wrap=lambda t: Torrent(self, t, version=self.cache.version(t))
+        )
+
+    def read_columns(self, func: Callable[[TorrentColumns], Any], max_age: float = 0) -> Any:
+        """Run func on the columns of the cached torrents, see TorrentsCache.read_columns()"""
+
+        self.cache.sync(max_age=max_age)
+
+        return self.cache.read_columns(func)
+
+    def cached_torrents(self, hashes: List[str]) -> List[Torrent]:
+        """The cached torrents with the given hashes, in the same order, without syncing the cache. Hashes of
+        torrents that are not cached anymore are skipped"""
+
+        torrent_dicts = [self.cache.get(torrent_hash) for torrent_hash in hashes]
+
+        return [Torrent(self, t, version=self.cache.version(t)) for t in torrent_dicts if t]
+
+    def torrents_page(self, page: int, page_size: int, max_age: float = 0, sort: Optional[str] = None,
+                      reverse=False, offset: Optional[int] = None, **kwargs) -> Tuple[List[Torrent], int]:
+        """Get a page of the cached torrents list. kwargs are the same torrents/info parameters accepted by
+        TorrentsCache.select(), except limit and offset. Only the torrents up to the requested page are sorted
+        (partially, using a heap), and only the torrents of the page are built.
+        Pass offset to start the page from that torrent instead of page * page_size (page is ignored)
+
+        :return: the torrents of the page, and the number of torrents in all the pages
+        """
+
+        if offset is None:
+            offset = page * page_size
+
+        aggregation = Aggregation()
+        if sort:
+            reverse = str(reverse).lower() == 'true'
+            aggregation.top('page', page_size, key=itemgetter(sort), reverse=reverse, offset=offset)
+        else:
+            aggregation.select('page', limit=page_size, offset=offset)
+
+        result = self.aggregate(aggregation, max_age=max_age, **kwargs)
+
+        return result['page'], result.total
+
+    def get_torrent(self, infohash):
+        properties = super(CustomClient, self).get_torrent(infohash)
+        with self._properties_lock:
+            self._properties_cache[infohash.lower()] = (time.monotonic(), properties)
+
+        return properties
+
+    def get_torrents_properties(self, hashes: List[str], max_age: float = PROPERTIES_MAX_AGE) -> dict:
+        """Get the generic properties of many torrents, concurrently. Properties fetched less than max_age
+        seconds ago are not requested again. Must not be called from the executor's threads
+
+        :return: a dict hash -> generic properties
+        """
+
+        now = time.monotonic()
+
+        result = dict()
+        hashes_to_fetch = list()
+        with self._properties_lock:
+            expired = [h for h, (fetched_at, _) in self._properties_cache.items() if now - fetched_at > PROPERTIES_MAX_AGE]
+            for torrent_hash in expired:
+                del self._properties_cache[torrent_hash]
+
+            for torrent_hash in hashes:
+                cached = self._properties_cache.get(torrent_hash, None)
+                if cached and now - cached[0] <= max_age:
+                    result[torrent_hash] = cached[1]
+                else:
+                    hashes_to_fetch.append(torrent_hash)
+
+        logger.debug('generic properties: %d cached, %d to fetch', len(result), len(hashes_to_fetch))
+
+        for torrent_hash, properties in zip(hashes_to_fetch, self.executor.map(self.get_torrent, hashes_to_fetch)):
+            result[torrent_hash] = properties
+
+        return result
+
+    def torrent(self, torrent_hash, get_torrent_generic_properties=True, max_age: Optional[float] = 0):
+        """Get a single torrent: it's a hash lookup in the maindata cache, or a torrents/info request
+        for just that hash when max_age is None"""
 
-    # noinspection PyUnresolvedReferences
-    def torrent(self, torrent_hash, get_torrent_generic_properties=True):
         # always set get_additional_torrent_properties to False in the following request,
         # we will get the additional properties later, just for the correct torrent
-        torrents = super(CustomClient, self).torrents(filter='all') or []
+        if max_age is None:
+            torrents = super(CustomClient, self).torrents(hashes=torrent_hash.lower()) or []
+            torrent_dict = torrents[0] if torrents else None
+        else:
+            self.cache.sync(max_age=max_age)
+            torrent_dict = self.cache.get(torrent_hash)
 
-        for torrent_dict in torrents:
-            if torrent_dict['hash'].lower() == torrent_hash.lower():
-                return Torrent(self, torrent_dict, get_torrent_generic_properties)
+        if torrent_dict:
+            return Torrent(self, torrent_dict, get_torrent_generic_properties, version=self.cache.version(torrent_dict))
 
     # noinspection PyUnresolvedReferences
-    def filter(self, query):
+    def filter(self, query, max_age: Optional[float] = 0, limit: Optional[int] = None):
+        """Search the torrents using the cache's search index: all the words of the query must be found in the
+        torrent's name, tags, category or tracker host. Best matches first"""
+
+        if max_age is not None:
+            self.cache.sync(max_age=max_age)
+            hashes = self.cache.search_index.search(query, limit=limit)
+            if hashes is not None:
+                torrent_dicts = [self.cache.get(torrent_hash) for torrent_hash in hashes]
+                return [Torrent(self, t, version=self.cache.version(t)) for t in torrent_dicts if t]
+
+        # max_age=None, or the query doesn't contain any word (eg. only punctuation): look for it in the torrents' names
         filtered = list()
         query = query.lower()
 
-        for torrent in self.torrents(filter='all'):
+        for torrent in self.torrents(filter='all', get_torrent_generic_properties=False, max_age=max_age):
             if query in torrent.name.lower():
                 filtered.append(torrent)
 
-        return filtered
+        return filtered[:limit] if limit else filtered
+
+    def select_hashes(self, hashes: Optional[List[str]] = None, query: Optional[str] = None, **kwargs) -> List[str]:
+        """Get the hashes of a selection of torrents: either a list of hashes, a /filter query,
+        or the torrents matching the torrents/info parameters passed as kwargs (filter, category, tag...)"""
+
+        if hashes:
+            return [h.lower() for h in hashes]
+
+        if query:
+            return [t.hash for t in self.filter(query)]
+
+        return [t.hash for t in self.torrents(get_torrent_generic_properties=False, **kwargs)]
+
+    def bulk_action(self, action: str, hashes: List[str], batch_size: int = BULK_BATCH_SIZE, **data) -> int:
+        """Apply one of BULK_ACTIONS to many torrents, sending their hashes in batches of batch_size
+        instead of making one request per torrent. Additional POST data can be passed as kwargs
+        (eg. tags='some tag' for 'addtags').
+
+        :return: the number of torrents the action has been applied to
+        """
+
+        endpoint, action_data = BULK_ACTIONS[action]
+
+        for i in range(0, len(hashes), batch_size):
+            batch = hashes[i:i + batch_size]
+            logger.debug('bulk action %s: sending %d hashes', action, len(batch))
+
+            self._post(endpoint, data={**action_data, **data, 'hashes': '|'.join(batch)})
+
+        return len(hashes)
+
+    def fetch_concurrently(self, **calls: Callable) -> Tuple[dict, dict]:
+        """Run independent WebUI requests concurrently on a small dedicated pool, eg.
+        fetch_concurrently(preferences=qb.preferences, transfer_info=lambda: qb.global_transfer_info).
+        The pool is not shared with the bulk requests, so the slowest call is what the caller waits for.
+        The callables must not call fetch_concurrently() themselves
+
+        :return: a dict name -> result, and a dict name -> seconds the call took
+        """
+
+        def timed(func):
+            start = time.perf_counter()
+            result = func()
+            return result, time.perf_counter() - start
+
+        futures = {name: self._fan_out_executor.submit(timed, func) for name, func in calls.items()}
+
+        results, timings = dict(), dict()
+        for name, future in futures.items():
+            results[name], timings[name] = future.result()
+
+        return results, timings
 
     def get_schedule(self):
         p = self.preferences()
@@ -354,6 +884,48 @@ class CustomClient(Client):
         return self._get('app/buildInfo')
 
 
+class ReconnectingClient:
+    """The client used by the bot: it wraps an OfflineClient until qbittorrent can be reached, and a CustomClient
+    afterwards. Modules keep a reference to this object, so the wrapped client can be switched at any time
+    by calling connect()"""
+
+    def __init__(self, url, username, password, bot_username):
+        self._url = url
+        self._username = username
+        self._password = password
+        self._bot_username = bot_username
+
+        self._client = OfflineClient()
+
+    @property
+    def online(self):
+        return self._client.online
+
+    def connect(self) -> bool:
+        """Try to connect to qbittorrent, if we are not already connected
+
+        :return: True if we are connected
+        """
+
+        if self._client.online:
+            return True
+
+        try:
+            client = CustomClient(self._url, bot_username=self._bot_username)
+            client.login(self._username, self._password)
+        except requests.exceptions.ConnectionError as e:
+            logger.error('exception while connecting to qbittorrent: %s', str(e))
+            return False
+
+        logger.info('connected to qbittorrent (%s)', self._url)
+        self._client = client
+
+        return True
+
+    def __getattr__(self, name):
+        return getattr(self._client, name)
+
+
 class OfflineClient:
     """
     We use this calss when we can't connect to qbittorrent, so the bot would still run and let us
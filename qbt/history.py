@@ -0,0 +1,126 @@
+import math
+import threading
+from array import array
+from collections import namedtuple
+from typing import Optional, Iterable
+
+# torrents whose speed is recorded: the ones that are transferring, or that are trying to download.
+# stalledDL is included because that's exactly when qbittorrent's instantaneous eta jumps around
+TRACKED_STATES = ('downloading', 'forcedDL', 'stalledDL', 'metaDL', 'forcedMetaDL', 'uploading', 'forcedUP')
+
+# number of samples kept for every torrent, and max number of torrents tracked at the same time
+RING_SIZE = 40
+MAX_TRACKED_TORRENTS = 2000
+
+# samples closer than this number of seconds to the previous one are ignored (eg. many syncs in a row)
+MIN_SAMPLE_INTERVAL = 1.0
+
+# time constant (seconds) of the exponentially weighted moving average of the speeds
+SPEED_EWMA_TAU = 60.0
+
+# last_timestamp: time of the last sample, it changes every time the stats change
+SpeedStats = namedtuple('SpeedStats', ['avg_dlspeed', 'avg_upspeed', 'smoothed_dlspeed', 'smoothed_upspeed', 'samples',
+                                       'last_timestamp'])
+
+
+class SpeedRing:
+    """The last RING_SIZE download/upload speed samples of a torrent, plus their moving average.
+    The samples are taken at irregular intervals (every time the cache is synced), so the weight of every
+    sample in the average depends on the time passed since the previous one"""
+
+    __slots__ = ('timestamps', 'dlspeeds', 'upspeeds', 'position', 'count', 'smoothed_dlspeed', 'smoothed_upspeed')
+
+    def __init__(self, size: int):
+        self.timestamps = array('d', [0.0]) * size
+        self.dlspeeds = array('d', [0.0]) * size
+        self.upspeeds = array('d', [0.0]) * size
+        self.position = 0  # slot the next sample will be written to
+        self.count = 0
+        self.smoothed_dlspeed = 0.0
+        self.smoothed_upspeed = 0.0
+
+    @property
+    def last_timestamp(self) -> Optional[float]:
+        if not self.count:
+            return None
+
+        return self.timestamps[self.position - 1]
+
+    def add(self, timestamp: float, dlspeed: float, upspeed: float):
+        last_timestamp = self.last_timestamp
+        if last_timestamp is None:
+            self.smoothed_dlspeed, self.smoothed_upspeed = dlspeed, upspeed
+        else:
+            alpha = 1 - math.exp(-(timestamp - last_timestamp) / SPEED_EWMA_TAU)
+            self.smoothed_dlspeed += alpha * (dlspeed - self.smoothed_dlspeed)
+            self.smoothed_upspeed += alpha * (upspeed - self.smoothed_upspeed)
+
+        self.timestamps[self.position] = timestamp
+        self.dlspeeds[self.position] = dlspeed
+        self.upspeeds[self.position] = upspeed
+        self.position = (self.position + 1) % len(self.timestamps)
+        self.count = min(self.count + 1, len(self.timestamps))
+
+    def stats(self) -> SpeedStats:
+        # the unused slots are 0.0, they don't change the sums
+        return SpeedStats(
+            avg_dlspeed=sum(self.dlspeeds) / self.count,
+            avg_upspeed=sum(self.upspeeds) / self.count,
+            smoothed_dlspeed=self.smoothed_dlspeed,
+            smoothed_upspeed=self.smoothed_upspeed,
+            samples=self.count,
+            last_timestamp=self.last_timestamp
+        )
+
+
+class SpeedHistory:
+    """The recent speed samples of the active torrents, recorded by TorrentsCache at every sync.
+
+    A torrent starts being tracked when it enters one of TRACKED_STATES, and its samples are dropped as soon as it
+    leaves them (or is removed), so the memory used depends on the number of active torrents only"""
+
+    def __init__(self, ring_size: int = RING_SIZE, max_torrents: int = MAX_TRACKED_TORRENTS):
+        self._ring_size = ring_size
+        self._max_torrents = max_torrents
+        self._lock = threading.Lock()
+        self._rings = dict()  # hash -> SpeedRing
+
+    def __len__(self):
+        return len(self._rings)
+
+    def sample(self, torrents: dict, changed_hashes: Iterable[str], timestamp: float):
+        """Record the speed of the tracked torrents and of the torrents that changed since the last sample.
+        The torrents that are not in the maindata delta didn't change their speed: only these two groups can
+        start or stop being tracked, or need a new sample
+
+        :param torrents: dict hash -> torrent dict, with all the torrents
+        """
+
+        with self._lock:
+            for torrent_hash in set(changed_hashes).union(self._rings):
+                torrent_dict = torrents.get(torrent_hash, None)
+                if torrent_dict is None or torrent_dict.get('state', None) not in TRACKED_STATES:
+                    self._rings.pop(torrent_hash, None)
+                    continue
+
+                ring = self._rings.get(torrent_hash, None)
+                if ring is None:
+                    if len(self._rings) >= self._max_torrents:
+                        continue
+
+                    ring = self._rings[torrent_hash] = SpeedRing(self._ring_size)
+                elif timestamp - ring.last_timestamp < MIN_SAMPLE_INTERVAL:
+                    continue
+
+                ring.add(timestamp, torrent_dict.get('dlspeed', 0), torrent_dict.get('upspeed', 0))
+
+    def stats(self, torrent_hash: str) -> Optional[SpeedStats]:
+        """The average and smoothed speeds of a torrent, or None if it's not tracked"""
+
+        with self._lock:
+            ring = self._rings.get(torrent_hash, None)
+            return ring.stats() if ring else None
+
+    def clear(self):
+        with self._lock:
+            self._rings = dict()
@@ -0,0 +1,143 @@
+import logging
+import re
+import threading
+import time
+
+from .snapshot import Aggregation
+from .snapshot import AggregationResult
+
+logger = logging.getLogger(__name__)
+
+# upper bounds (bytes/s, download + upload) of the transfer rate classes the peers are grouped into
+PEER_RATE_CLASSES = (
+    (1, 'idle'),
+    (10 * 1024, '< 10 KiB/s'),
+    (100 * 1024, '< 100 KiB/s'),
+    (1024 * 1024, '< 1 MiB/s'),
+    (float('inf'), '≥ 1 MiB/s'),
+)
+
+# number of fastest peers returned by the summary
+FASTEST_PEERS_COUNT = 5
+
+CLIENT_VERSION_REGEX = re.compile(r'[\s/]+v?\d[\w.\-]*$')
+
+
+def peer_rate(peer: dict) -> int:
+    return peer.get('dl_speed', 0) + peer.get('up_speed', 0)
+
+
+def peer_rate_class(peer: dict) -> str:
+    rate = peer_rate(peer)
+    return next(name for upper_bound, name in PEER_RATE_CLASSES if rate < upper_bound)
+
+
+def peer_client(peer: dict) -> str:
+    # "qBittorrent 4.5.2" and "qBittorrent 4.4.0" are the same client
+    return CLIENT_VERSION_REGEX.sub('', peer.get('client', '')) or 'unknown'
+
+
+PEERS_AGGREGATION = (
+    Aggregation()
+    .group_by('clients', peer_client)
+    .group_by('countries', lambda p: p.get('country', '') or 'unknown')
+    .group_by('connections', lambda p: p.get('connection', '') or 'unknown')
+    .group_by('rates', peer_rate_class)
+    .top('fastest', FASTEST_PEERS_COUNT, key=peer_rate, predicate=lambda p: peer_rate(p) > 0)
+)
+
+
+class TorrentPeers:
+    """The peers of a torrent, kept up to date using the sync/torrentPeers endpoint: same as the maindata
+    cache, after the first (full) update qbittorrent only sends the peers (and the keys) that changed since
+    the last response id"""
+
+    def __init__(self, qbt, torrent_hash: str):
+        self._qbt = qbt
+        self._lock = threading.Lock()
+        self._rid = 0
+        self.torrent_hash = torrent_hash
+        self.peers = dict()  # "ip:port" -> peer dict
+        self.last_sync = 0.0
+        self.viewers = 0  # number of open views showing these peers
+
+    def sync(self, max_age: float = 0.0):
+        with self._lock:
+            if self._rid and time.monotonic() - self.last_sync <= max_age:
+                return
+
+            data = self._qbt.sync_peers_data(self.torrent_hash, rid=self._rid)
+
+            if data.get('full_update', False):
+                self.peers = dict()
+
+            # copy-on-write, same as TorrentsCache: a summary never sees a half-updated peer
+            peers = dict(self.peers)
+            for peer_id, changes in data.get('peers', {}).items():
+                peers[peer_id] = {**peers.get(peer_id, {}), **changes}
+            for peer_id in data.get('peers_removed', []):
+                peers.pop(peer_id, None)
+
+            logger.debug(
+                'peers sync of %s (rid %d -> %d): %d peers changed, %d removed',
+                self.torrent_hash,
+                self._rid,
+                data['rid'],
+                len(data.get('peers', {})),
+                len(data.get('peers_removed', []))
+            )
+
+            self.peers = peers
+            self._rid = data['rid']
+            self.last_sync = time.monotonic()
+
+    def summary(self) -> AggregationResult:
+        """The peers grouped by client, country, connection type and transfer rate class, plus the fastest ones"""
+
+        return PEERS_AGGREGATION.run(self.peers.values())
+
+
+class PeersViews:
+    """The TorrentPeers of the torrents someone is looking at. The peers of a torrent are synced only while
+    at least one view of the torrent is open: open() starts tracking them, close() drops them when the last
+    view is closed"""
+
+    def __init__(self, qbt):
+        self._qbt = qbt
+        self._lock = threading.Lock()
+        self._torrents = dict()  # hash -> TorrentPeers
+
+    def __len__(self):
+        return len(self._torrents)
+
+    def open(self, torrent_hash: str) -> TorrentPeers:
+        torrent_hash = torrent_hash.lower()
+
+        with self._lock:
+            torrent_peers = self._torrents.get(torrent_hash, None)
+            if torrent_peers is None:
+                torrent_peers = self._torrents[torrent_hash] = TorrentPeers(self._qbt, torrent_hash)
+
+            torrent_peers.viewers += 1
+
+        return torrent_peers
+
+    def close(self, torrent_hash: str):
+        torrent_hash = torrent_hash.lower()
+
+        with self._lock:
+            torrent_peers = self._torrents.get(torrent_hash, None)
+            if torrent_peers is None:
+                return
+
+            torrent_peers.viewers -= 1
+            if torrent_peers.viewers <= 0:
+                del self._torrents[torrent_hash]
+
+    def stats(self) -> dict:
+        with self._lock:
+            return dict(
+                torrents=len(self._torrents),
+                views=sum([t.viewers for t in self._torrents.values()]),
+                peers=sum([len(t.peers) for t in self._torrents.values()])
+            )
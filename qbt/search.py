@@ -0,0 +1,219 @@
+import heapq
+import re
+import threading
+from collections import defaultdict
+from functools import lru_cache
+from typing import List, Optional
+from urllib.parse import urlsplit
+
+TOKEN_REGEX = re.compile(r'\w+')
+
+# torrent keys that are indexed, and the weight of their matches in the results ranking
+INDEXED_KEYS = {
+    'name': 2,
+    'tags': 1,
+    'category': 1,
+    'tracker': 1,  # only the host is indexed
+}
+
+# match quality of a query term: equal to the token, prefix of the token, anywhere else in the token
+EXACT_MATCH = 3
+PREFIX_MATCH = 2
+INFIX_MATCH = 1
+
+
+def tokenize(text: str) -> List[str]:
+    return TOKEN_REGEX.findall(text.lower())
+
+
+def ngrams(token: str) -> set:
+    """The token's trigrams, and its first one and two characters"""
+
+    result = {token[i:i + 3] for i in range(len(token) - 2)}
+    result.add(token[:1])
+    result.add(token[:2])
+
+    return result
+
+
+@lru_cache(maxsize=1024)  # most of the torrents share a few trackers
+def tracker_host(tracker_url: str) -> str:
+    try:
+        return urlsplit(tracker_url).hostname or ''
+    except ValueError:
+        return ''
+
+
+class SearchIndex:
+    """Inverted index of the torrents' names, tags, categories and tracker hosts.
+
+    Every token points to the torrents that contain it. To match query terms inside the tokens, tokens are also
+    indexed by their trigrams and by their first one and two characters: a term is looked up by intersecting the
+    tokens of its trigrams, instead of going through every torrent name. Terms shorter than three characters only
+    match the beginning of the tokens
+    Torrents are added/updated/removed one at a time, as soon as they change"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._postings = dict()  # token -> {hash: weight}
+        self._ngrams = defaultdict(set)  # trigram, or first one/two characters -> tokens
+        self._documents = dict()  # hash -> (indexed values, {token: weight})
+        self._sort_names = dict()  # hash -> lowercase name, to sort the results with the same score
+
+    def __len__(self):
+        return len(self._documents)
+
+    def __contains__(self, torrent_hash):
+        return torrent_hash in self._documents
+
+    @staticmethod
+    def _indexed_values(torrent_dict: dict) -> tuple:
+        return tuple(torrent_dict.get(key, None) or '' for key in INDEXED_KEYS)
+
+    @staticmethod
+    def _document_tokens(indexed_values: tuple) -> dict:
+        tokens = dict()
+        for (key, weight), value in zip(INDEXED_KEYS.items(), indexed_values):
+            if key == 'tracker':
+                value = tracker_host(value)
+
+            for token in tokenize(value):
+                tokens[token] = max(weight, tokens.get(token, 0))
+
+        return tokens
+
+    def _add_token(self, token):
+        self._postings[token] = dict()
+        for ngram in ngrams(token):
+            self._ngrams[ngram].add(token)
+
+    def _remove_token(self, token):
+        del self._postings[token]
+        for ngram in ngrams(token):
+            self._ngrams[ngram].discard(token)
+            if not self._ngrams[ngram]:
+                del self._ngrams[ngram]
+
+    def _remove(self, torrent_hash):
+        _, tokens = self._documents.pop(torrent_hash)
+        del self._sort_names[torrent_hash]
+        for token in tokens:
+            postings = self._postings[token]
+            postings.pop(torrent_hash, None)
+            if not postings:
+                self._remove_token(token)
+
+    def update(self, torrent_hash: str, torrent_dict: dict):
+        """Add a torrent to the index, or re-index it if one of its INDEXED_KEYS changed"""
+
+        indexed_values = self._indexed_values(torrent_dict)
+
+        with self._lock:
+            document = self._documents.get(torrent_hash, None)
+            if document is not None:
+                if document[0] == indexed_values:
+                    return
+
+                self._remove(torrent_hash)
+
+            tokens = self._document_tokens(indexed_values)
+            for token, weight in tokens.items():
+                if token not in self._postings:
+                    self._add_token(token)
+                self._postings[token][torrent_hash] = weight
+
+            self._documents[torrent_hash] = (indexed_values, tokens)
+            self._sort_names[torrent_hash] = indexed_values[0].lower()
+
+    def remove(self, torrent_hash: str):
+        with self._lock:
+            if torrent_hash in self._documents:
+                self._remove(torrent_hash)
+
+    def clear(self):
+        with self._lock:
+            self._postings = dict()
+            self._ngrams = defaultdict(set)
+            self._documents = dict()
+            self._sort_names = dict()
+
+    def _matching_tokens(self, term: str) -> List[str]:
+        if len(term) < 3:
+            # the tokens starting with the term
+            return list(self._ngrams.get(term, ()))
+
+        tokens_sets = sorted([self._ngrams.get(term[i:i + 3], set()) for i in range(len(term) - 2)], key=len)
+        candidates = tokens_sets[0].intersection(*tokens_sets[1:])
+
+        return [token for token in candidates if term in token]
+
+    def _match_term(self, term: str, tokens: List[str], candidates: Optional[dict] = None) -> dict:
+        """Return a dict hash -> score of the torrents having one of the tokens matching the term.
+        If candidates (a dict hash -> score) is passed, only these torrents are returned, and the score
+        of the term is added to their score"""
+
+        scores = dict()
+        for token in tokens:
+            if token == term:
+                quality = EXACT_MATCH
+            elif token.startswith(term):
+                quality = PREFIX_MATCH
+            else:
+                quality = INFIX_MATCH
+
+            postings = self._postings[token]
+            if candidates is not None and len(candidates) < len(postings):
+                hashes_weights = [(h, postings[h]) for h in candidates if h in postings]
+            else:
+                hashes_weights = postings.items()
+
+            if not scores and candidates is None:
+                # first token: no need to compare the scores
+                scores = {torrent_hash: quality * weight for torrent_hash, weight in hashes_weights}
+                continue
+
+            for torrent_hash, weight in hashes_weights:
+                if candidates is not None and torrent_hash not in candidates:
+                    continue
+
+                score = quality * weight
+                if score > scores.get(torrent_hash, 0):
+                    scores[torrent_hash] = score
+
+        if candidates is not None:
+            return {h: candidates[h] + score for h, score in scores.items()}
+
+        return scores
+
+    def search(self, query: str, limit: Optional[int] = None) -> Optional[List[str]]:
+        """Return the hashes of the torrents that match all the terms of the query (anywhere in the indexed keys),
+        the best matches first. Only the best limit matches are returned if limit is passed.
+        Returns None if the query doesn't contain any term"""
+
+        terms = set(tokenize(query))
+        if not terms:
+            return None
+
+        with self._lock:
+            terms_tokens = [(term, self._matching_tokens(term)) for term in terms]
+            # start from the most selective term: the following ones only need to be checked against its results
+            terms_tokens.sort(key=lambda tt: sum([len(self._postings[token]) for token in tt[1]]))
+
+            results = self._match_term(*terms_tokens[0])
+            for term, tokens in terms_tokens[1:]:
+                if not results:
+                    break
+
+                results = self._match_term(term, tokens, candidates=results)
+
+            if not results:
+                return []
+
+            sort_names = self._sort_names
+            sort_key = lambda item: (-item[1], sort_names[item[0]])
+            if limit:
+                ranked = heapq.nsmallest(limit, results.items(), key=sort_key)
+            else:
+                ranked = sorted(results.items(), key=sort_key)
+
+        return [torrent_hash for torrent_hash, _ in ranked]
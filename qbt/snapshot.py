@@ -0,0 +1,178 @@
+import heapq
+from collections import Counter
+from typing import Callable, Iterable, Optional
+
+Predicate = Callable[[dict], bool]
+
+
+class _Count:
+    def __init__(self, predicate: Predicate):
+        self._predicate = predicate
+        self.matched = 0
+
+    def add(self, index, torrent):
+        if self._predicate(torrent):
+            self.matched += 1
+
+    def result(self, wrap):
+        return self.matched
+
+
+class _GroupBy:
+    def __init__(self, key: Callable, predicate: Optional[Predicate]):
+        self._key = key
+        self._predicate = predicate
+        self._counter = Counter()
+        self.matched = 0
+
+    def add(self, index, torrent):
+        if self._predicate is None or self._predicate(torrent):
+            self._counter[self._key(torrent)] += 1
+            self.matched += 1
+
+    def result(self, wrap):
+        return self._counter
+
+
+class _Select:
+    def __init__(self, predicate: Optional[Predicate], limit: Optional[int], offset: int):
+        self._predicate = predicate
+        self._stop = offset + limit if limit else None
+        self._offset = offset
+        self._torrents = []
+        self.matched = 0
+
+    def add(self, index, torrent):
+        if self._predicate is None or self._predicate(torrent):
+            if self._stop is None or self.matched < self._stop:
+                self._torrents.append(torrent)
+            self.matched += 1
+
+    def result(self, wrap):
+        return [wrap(t) for t in self._torrents[self._offset:]]
+
+
+class _LargestEntry:
+    """Heap entry of the largest keys: the root is the entry to drop first (smallest key, and the latest
+    one among the equal keys)"""
+
+    __slots__ = ('key', 'index', 'torrent')
+
+    def __init__(self, key, index, torrent):
+        self.key = key
+        self.index = index
+        self.torrent = torrent
+
+    def __lt__(self, other):
+        return self.key < other.key or (self.key == other.key and self.index > other.index)
+
+
+class _SmallestEntry(_LargestEntry):
+    __slots__ = ()
+
+    def __lt__(self, other):
+        return self.key > other.key or (self.key == other.key and self.index > other.index)
+
+
+class _Top:
+    """The limit torrents with the largest (or smallest) key, using a bounded heap instead of sorting all the
+    matching torrents. Equal keys keep the order of the torrents list, same as a stable sort"""
+
+    def __init__(self, limit: int, key: Callable, predicate: Optional[Predicate], reverse: bool, offset: int):
+        self._size = limit + offset
+        self._key = key
+        self._predicate = predicate
+        self._entry_class = _LargestEntry if reverse else _SmallestEntry
+        self._reverse = reverse
+        self._offset = offset
+        self._heap = []
+        self.matched = 0
+
+    def add(self, index, torrent):
+        if self._predicate is not None and not self._predicate(torrent):
+            return
+
+        self.matched += 1
+        key = self._key(torrent)
+
+        if len(self._heap) < self._size:
+            heapq.heappush(self._heap, self._entry_class(key, index, torrent))
+        elif self._size and (key > self._heap[0].key if self._reverse else key < self._heap[0].key):
+            # a later torrent with the same key as the root is never better than the root
+            heapq.heapreplace(self._heap, self._entry_class(key, index, torrent))
+
+    def result(self, wrap):
+        entries = sorted(self._heap, reverse=True)  # best entries first
+        return [wrap(entry.torrent) for entry in entries[self._offset:]]
+
+
+class AggregationResult:
+    def __init__(self, total: int, values: dict, matched: dict):
+        self.total = total  # number of torrents the aggregation ran on
+        self.matched = matched  # name -> number of torrents matching the operation's predicate
+        self._values = values
+
+    def __getitem__(self, name):
+        return self._values[name]
+
+
+class Aggregation:
+    """Counts, group-bys, top-N and selections over a list of torrents, all computed in a single pass.
+
+    Operations are declared once and named, eg.
+        Aggregation().group_by('states', itemgetter('state')).top('fastest', 10, key=itemgetter('dlspeed'))
+    and run() can be called as many times as needed (also concurrently): every run starts from scratch.
+    Torrents can be dicts or Torrent objects, the functions passed to the operations receive them as they are"""
+
+    def __init__(self):
+        self._operations = []  # (name, operation factory)
+
+    def _add(self, name: str, factory: Callable) -> 'Aggregation':
+        self._operations.append((name, factory))
+        return self
+
+    def count(self, name: str, predicate: Predicate) -> 'Aggregation':
+        """Number of torrents matching the predicate"""
+
+        return self._add(name, lambda: _Count(predicate))
+
+    def group_by(self, name: str, key: Callable, predicate: Optional[Predicate] = None) -> 'Aggregation':
+        """Counter of the key's values"""
+
+        return self._add(name, lambda: _GroupBy(key, predicate))
+
+    def select(self, name: str, predicate: Optional[Predicate] = None, limit: Optional[int] = None,
+               offset: int = 0) -> 'Aggregation':
+        """List of the torrents matching the predicate, in their original order"""
+
+        return self._add(name, lambda: _Select(predicate, limit, offset))
+
+    def top(self, name: str, limit: int, key: Callable, predicate: Optional[Predicate] = None, reverse: bool = True,
+            offset: int = 0) -> 'Aggregation':
+        """The same list sorted(torrents, key=key, reverse=reverse)[offset:offset + limit] would return, for the
+        torrents matching the predicate. By default, the ones with the largest key"""
+
+        return self._add(name, lambda: _Top(limit, key, predicate, reverse, offset))
+
+    def run(self, torrents: Iterable, where: Optional[Predicate] = None,
+            wrap: Callable = lambda t: t) -> AggregationResult:
+        """Run all the operations on the torrents matching where (all of them if not passed). The torrents
+        returned by select() and top() are passed through wrap (eg. to build Torrent objects from the dicts)"""
+
+        operations = [(name, factory()) for name, factory in self._operations]
+        adders = [operation.add for _, operation in operations]
+
+        total = 0
+        for index, torrent in enumerate(torrents):
+            if where is not None and not where(torrent):
+                continue
+
+            total += 1
+            for add in adders:
+                add(index, torrent)
+
+        return AggregationResult(
+            total=total,
+            values={name: operation.result(wrap) for name, operation in operations},
+            matched={name: operation.matched for name, operation in operations}
+        )
@@ -0,0 +1,289 @@
+import heapq
+import logging
+import threading
+import time
+from collections import Counter, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, List, Dict, Iterable
+
+from .cache import is_active
+from .search import tracker_host
+
+logger = logging.getLogger(__name__)
+
+# https://github.com/qbittorrent/qBittorrent/wiki/WebUI-API-(qBittorrent-4.1)#get-torrent-trackers
+TRACKER_STATUSES = {
+    0: 'disabled',
+    1: 'not contacted',
+    2: 'working',
+    3: 'updating',
+    4: 'not working',
+}
+TRACKER_STATUS_NOT_WORKING = 4
+
+# seconds after which the trackers of an active/inactive torrent are fetched again
+TRACKERS_MAX_AGE_ACTIVE = 5 * 60
+TRACKERS_MAX_AGE = 60 * 60
+
+# max number of torrents whose trackers are fetched at every refresh, and max number of concurrent requests.
+# The index has its own (small) pool, so the refreshes never take the client's workers from the users' requests
+TRACKERS_REFRESH_BATCH = 200
+TRACKERS_REFRESH_WORKERS = 3
+
+# max number of concurrent requests for the trackers the users ask for (get(), get_many()). It's a separate pool from
+# the refreshes' one, so a user request never waits in the queue of a TRACKERS_REFRESH_BATCH refresh
+TRACKERS_USER_WORKERS = 3
+
+# /rdt re-fetches the trackers of the torrents it's going to edit when they are older than this number of seconds:
+# a tracker that was not working when it was indexed might be working again
+TRACKERS_CONFIRM_MAX_AGE = 60
+
+
+def signature(torrent_dict: dict) -> tuple:
+    """maindata keys that change when the torrent's trackers change: when they change, the trackers are refreshed
+    as soon as possible. 'trackers_count' is only available since qbittorrent 4.5"""
+
+    return torrent_dict.get('tracker', None), torrent_dict.get('trackers_count', None)
+
+
+class TrackersIndex:
+    """The trackers of every torrent, fetched from the torrents/trackers endpoint and indexed by tracker host.
+
+    The index is refreshed incrementally by refresh(): every call fetches the trackers of at most
+    TRACKERS_REFRESH_BATCH torrents, in priority order: torrents never fetched (or whose trackers changed
+    according to maindata) first, then the ones whose trackers are older than their max age, the oldest first.
+    Active torrents have a shorter max age"""
+
+    def __init__(self, qbt):
+        self._qbt = qbt
+        self._lock = threading.Lock()
+        self._refresh_lock = threading.Lock()  # only one refresh at a time
+        self._executor = ThreadPoolExecutor(max_workers=TRACKERS_REFRESH_WORKERS, thread_name_prefix='trackers')
+        self._user_executor = ThreadPoolExecutor(max_workers=TRACKERS_USER_WORKERS, thread_name_prefix='trackers_user')
+        self._entries = dict()  # hash -> (time.monotonic() of the fetch, torrent signature, trackers list)
+        self._hosts = defaultdict(set)  # tracker host -> hashes of the torrents using it
+        self._statuses = defaultdict(Counter)  # tracker host -> Counter of the statuses of its trackers
+
+        self.fetched = 0
+        self.failed = 0
+        self.pending = 0  # torrents that needed a refresh at the last refresh() call
+        self.last_refresh_duration = 0.0
+
+    def __len__(self):
+        return len(self._entries)
+
+    @staticmethod
+    def _hosts_statuses(trackers: List[dict]) -> Dict[str, Counter]:
+        result = defaultdict(Counter)
+        for tracker in trackers:
+            host = tracker_host(tracker['url'])
+            if host:  # DHT, PeX and LSD don't have a host
+                result[host][tracker['status']] += 1
+
+        return result
+
+    def _unindex(self, torrent_hash: str):
+        entry = self._entries.pop(torrent_hash, None)
+        if not entry:
+            return
+
+        for host, statuses in self._hosts_statuses(entry[2]).items():
+            self._hosts[host].discard(torrent_hash)
+            self._statuses[host].subtract(statuses)
+            if not self._hosts[host]:
+                del self._hosts[host]
+                del self._statuses[host]
+
+    def _index(self, torrent_hash: str, fetched_at: float, torrent_signature: tuple, trackers: List[dict]):
+        self._unindex(torrent_hash)
+
+        self._entries[torrent_hash] = (fetched_at, torrent_signature, trackers)
+        for host, statuses in self._hosts_statuses(trackers).items():
+            self._hosts[host].add(torrent_hash)
+            self._statuses[host].update(statuses)
+
+    def _fetch(self, torrent_hash: str, torrent_signature: tuple) -> List[dict]:
+        trackers = self._qbt.get_torrent_trackers(torrent_hash)
+
+        with self._lock:
+            self._index(torrent_hash, time.monotonic(), torrent_signature, trackers)
+            self.fetched += 1
+
+        return trackers
+
+    def _refresh_one(self, torrent_hash: str, torrent_signature: tuple) -> bool:
+        try:
+            self._fetch(torrent_hash, torrent_signature)
+        except Exception as e:
+            # will be tried again at the next refresh
+            logger.warning('could not fetch the trackers of %s: %s', torrent_hash, str(e))
+            with self._lock:
+                self.failed += 1
+            return False
+
+        return True
+
+    def _due_time(self, torrent_dict: dict):
+        """time.monotonic() after which the torrent's trackers should be fetched again"""
+
+        entry = self._entries.get(torrent_dict['hash'], None)
+        if entry is None or entry[1] != signature(torrent_dict):
+            return 0.0
+
+        return entry[0] + (TRACKERS_MAX_AGE_ACTIVE if is_active(torrent_dict) else TRACKERS_MAX_AGE)
+
+    def refresh(self, torrents: List[dict], batch_size: int = TRACKERS_REFRESH_BATCH) -> int:
+        """Fetch the trackers of the batch_size torrents that need it the most, and drop the trackers of the
+        torrents that are not in the list anymore
+
+        :param torrents: all the torrents, eg. TorrentsCache.snapshot()
+        :return: the number of torrents whose trackers have been fetched
+        """
+
+        if not self._refresh_lock.acquire(blocking=False):
+            logger.debug('trackers index: refresh already in progress')
+            return 0
+
+        try:
+            return self._refresh(torrents, batch_size)
+        finally:
+            self._refresh_lock.release()
+
+    def _refresh(self, torrents: List[dict], batch_size: int) -> int:
+        start = time.monotonic()
+
+        with self._lock:
+            hashes = {t['hash'] for t in torrents}
+            for torrent_hash in [h for h in self._entries if h not in hashes]:
+                self._unindex(torrent_hash)
+
+            due = [(self._due_time(t), t['hash'], signature(t)) for t in torrents]
+            due = [d for d in due if d[0] <= start]
+            self.pending = len(due)
+
+        batch = heapq.nsmallest(batch_size, due)
+        results = list(self._executor.map(lambda d: self._refresh_one(d[1], d[2]), batch))
+
+        self.last_refresh_duration = time.monotonic() - start
+        logger.debug(
+            'trackers index: %d/%d torrents refreshed in %.2f seconds',
+            results.count(True),
+            len(due),
+            self.last_refresh_duration
+        )
+
+        return len(batch)
+
+    def get(self, torrent_hash: str, max_age: Optional[float] = TRACKERS_MAX_AGE) -> List[dict]:
+        """The trackers of a torrent. They are fetched now if they are not indexed, or if they have been
+        fetched more than max_age seconds ago (pass max_age=None to accept any age)"""
+
+        return self.get_many([torrent_hash], max_age=max_age)[torrent_hash.lower()]
+
+    def _fetch_or_none(self, torrent_hash: str, torrent_signature: tuple) -> Optional[List[dict]]:
+        try:
+            return self._fetch(torrent_hash, torrent_signature)
+        except Exception as e:
+            # eg. the torrent has been removed after it has been indexed
+            logger.warning('could not fetch the trackers of %s: %s', torrent_hash, str(e))
+            return None
+
+    def get_many(self, hashes: Iterable[str], max_age: Optional[float] = TRACKERS_MAX_AGE,
+                 ignore_errors: bool = False) -> Dict[str, List[dict]]:
+        """Same as get(), for many torrents: the missing ones are fetched concurrently.
+        With ignore_errors, the torrents whose trackers could not be fetched are left out of the result
+        instead of raising the exception"""
+
+        now = time.monotonic()
+
+        result = dict()
+        to_fetch = list()
+        with self._lock:
+            for torrent_hash in hashes:
+                torrent_hash = torrent_hash.lower()
+                entry = self._entries.get(torrent_hash, None)
+                if entry is not None and (max_age is None or now - entry[0] <= max_age):
+                    result[torrent_hash] = entry[2]
+                else:
+                    to_fetch.append(torrent_hash)
+
+        # the signature of the torrents we are going to fetch, so refresh() will not fetch them again
+        to_fetch = [(h, signature(self._qbt.cache.get(h) or {})) for h in to_fetch]
+
+        fetch = self._fetch_or_none if ignore_errors else self._fetch
+        for (torrent_hash, _), trackers in zip(to_fetch, self._user_executor.map(lambda hs: fetch(*hs), to_fetch)):
+            if trackers is not None:
+                result[torrent_hash] = trackers
+
+        return result
+
+    def remove_trackers(self, torrent_hash: str, urls: List[str]):
+        """Remove some trackers from a torrent, and from the index"""
+
+        result = self._qbt.remove_trackers(torrent_hash, urls)
+
+        with self._lock:
+            entry = self._entries.get(torrent_hash, None)
+            if entry:
+                trackers = [tracker for tracker in entry[2] if tracker['url'] not in urls]
+                self._index(torrent_hash, entry[0], entry[1], trackers)
+
+        return result
+
+    def trackers_with_status(self, status: int, max_age: float = TRACKERS_MAX_AGE) -> Dict[str, List[str]]:
+        """The urls of the trackers with the given status, for every torrent having at least one of them.
+        Only the trackers fetched in the last max_age seconds are taken into account"""
+
+        now = time.monotonic()
+
+        result = dict()
+        with self._lock:
+            for torrent_hash, (fetched_at, _, trackers) in self._entries.items():
+                if now - fetched_at > max_age:
+                    continue
+
+                urls = [tracker['url'] for tracker in trackers if tracker['status'] == status and tracker_host(tracker['url'])]
+                if urls:
+                    result[torrent_hash] = urls
+
+        return result
+
+    def confirmed_trackers_with_status(self, status: int, max_age: float = TRACKERS_CONFIRM_MAX_AGE) -> Dict[str, List[str]]:
+        """Same as trackers_with_status(), but the trackers of the torrents having at least one tracker with that
+        status are fetched again if they are older than max_age seconds, and only the trackers that still have that
+        status are returned. To be used before editing the trackers"""
+
+        candidates = self.trackers_with_status(status)
+        trackers = self.get_many(candidates, max_age=max_age, ignore_errors=True)
+
+        result = dict()
+        for torrent_hash, torrent_trackers in trackers.items():
+            urls = [tracker['url'] for tracker in torrent_trackers if tracker['status'] == status and tracker_host(tracker['url'])]
+            if urls:
+                result[torrent_hash] = urls
+
+        return result
+
+    def hosts(self) -> Dict[str, dict]:
+        """tracker host -> dict with the number of torrents using it and the Counter of its trackers' statuses"""
+
+        with self._lock:
+            return {
+                host: dict(torrents=len(hashes), statuses=+self._statuses[host])  # unary + drops the zero counts
+                for host, hashes in self._hosts.items()
+            }
+
+    def hashes(self, host: str) -> List[str]:
+        with self._lock:
+            return list(self._hosts.get(host, ()))
+
+    def stats(self) -> dict:
+        with self._lock:
+            return dict(
+                torrents=len(self._entries),
+                hosts=len(self._hosts),
+                pending=self.pending,
+                fetched=self.fetched,
+                failed=self.failed,
+                last_refresh_duration=self.last_refresh_duration
+            )
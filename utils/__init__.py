@@ -2,3 +2,4 @@ from utils import utils as u
 from utils import markups as kb
 from .permissions_storage import Permissions
 from .permissions_storage import permissions
+from .coalescing import refreshes
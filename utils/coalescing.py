@@ -0,0 +1,165 @@
+import logging
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+from typing import Any, Callable, Optional, Pattern
+
+# noinspection PyPackageRequirements
+from telegram import Message, InlineKeyboardMarkup
+
+from .utils import strip_html
+
+logger = logging.getLogger(__name__)
+
+# min interval (in seconds) between two refreshes of the same message
+REFRESH_MIN_INTERVAL = 3
+
+
+class RefreshCoalescer:
+    """Shared by the handlers that re-render a message (refresh buttons and the like):
+
+    - identical renders requested at the same time are merged into a single computation, whose result is
+      returned to all the callers (single-flight)
+    - a message can be refreshed at most once every min_interval seconds
+    - the edit can be skipped when the rendered text is the same as the message's text, or as the text of the last
+      edit of the message made by the bot (for the handlers that don't receive the message, eg. text commands)"""
+
+    def __init__(self, min_interval: float = REFRESH_MIN_INTERVAL, max_tracked_messages: int = 1000):
+        self._min_interval = min_interval
+        self._max_tracked_messages = max_tracked_messages
+        self._lock = threading.Lock()
+        self._in_flight = dict()  # render key -> Future
+        self._last_refresh = OrderedDict()  # (chat_id, message_id) -> time.monotonic() of the last refresh
+        self._last_edit = OrderedDict()  # (chat_id, message_id) -> hash of the text and markup of the last edit
+
+        self.coalesced = 0
+        self.throttled = 0
+        self.skipped_edits = 0
+
+    def render(self, key, func: Callable[[], Any]) -> Any:
+        """Run func(), unless a render with the same key is already running: in that case, wait for it
+        and return its result"""
+
+        with self._lock:
+            future = self._in_flight.get(key, None)
+            owner = future is None
+            if owner:
+                future = Future()
+                self._in_flight[key] = future
+            else:
+                self.coalesced += 1
+
+        if not owner:
+            logger.debug('render %s already in flight: waiting for its result', key)
+            return future.result()
+
+        try:
+            result = func()
+            future.set_result(result)
+            return result
+        except Exception as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                self._in_flight.pop(key, None)
+
+    def too_soon(self, chat_id: int, message_id: int) -> bool:
+        """Return True if the message has been refreshed less than min_interval seconds ago,
+        otherwise save the time of this refresh and return False"""
+
+        now = time.monotonic()
+        key = (chat_id, message_id)
+
+        with self._lock:
+            last_refresh = self._last_refresh.get(key, None)
+            if last_refresh is not None and now - last_refresh < self._min_interval:
+                self.throttled += 1
+                return True
+
+            self._last_refresh[key] = now
+            self._last_refresh.move_to_end(key)
+            while len(self._last_refresh) > self._max_tracked_messages:
+                self._last_refresh.popitem(last=False)
+
+            return False
+
+    @staticmethod
+    def _text_hash(text: str, ignore: Optional[Pattern] = None) -> int:
+        if ignore:
+            text = ignore.sub('', text)
+
+        return hash(text.strip())
+
+    def is_unchanged(self, message: Message, html_text: str, reply_markup: Optional[InlineKeyboardMarkup] = None,
+                     ignore: Optional[Pattern] = None) -> bool:
+        """Tell whether editing the message with html_text and reply_markup would leave it as it is.
+
+        The message's text we receive from Telegram has no formatting, so the tags are stripped from html_text
+        before comparing the two. ignore: regex matching the parts of the text that should not be compared
+        (eg. a timestamp)"""
+
+        if message is None or message.text is None:
+            return False
+
+        if reply_markup is not None and (message.reply_markup is None or message.reply_markup != reply_markup):
+            return False
+
+        if self._text_hash(strip_html(html_text), ignore) != self._text_hash(message.text, ignore):
+            return False
+
+        with self._lock:
+            self.skipped_edits += 1
+
+        return True
+
+    def _edit_hash(self, html_text: str, reply_markup: Optional[InlineKeyboardMarkup], ignore: Optional[Pattern]) -> int:
+        markup = reply_markup.to_json() if reply_markup is not None else None
+        return hash((self._text_hash(html_text, ignore), markup))
+
+    def is_last_edit(self, chat_id: int, message_id: int, html_text: str,
+                     reply_markup: Optional[InlineKeyboardMarkup] = None, ignore: Optional[Pattern] = None) -> bool:
+        """Tell whether html_text and reply_markup are the same of the last edit of the message saved with
+        save_edit(), so editing it again would leave it as it is"""
+
+        edit_hash = self._edit_hash(html_text, reply_markup, ignore)
+
+        with self._lock:
+            if self._last_edit.get((chat_id, message_id), None) != edit_hash:
+                return False
+
+            self.skipped_edits += 1
+
+        return True
+
+    def save_edit(self, chat_id: int, message_id: int, html_text: str,
+                  reply_markup: Optional[InlineKeyboardMarkup] = None, ignore: Optional[Pattern] = None):
+        """Remember the text and markup the message has been sent or edited with"""
+
+        key = (chat_id, message_id)
+        edit_hash = self._edit_hash(html_text, reply_markup, ignore)
+
+        with self._lock:
+            self._last_edit[key] = edit_hash
+            self._last_edit.move_to_end(key)
+            while len(self._last_edit) > self._max_tracked_messages:
+                self._last_edit.popitem(last=False)
+
+    def forget_edit(self, chat_id: int, message_id: int):
+        """To be used after an edit of the message whose text and markup have not been saved with save_edit()"""
+
+        with self._lock:
+            self._last_edit.pop((chat_id, message_id), None)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return dict(
+                in_flight=len(self._in_flight),
+                coalesced=self.coalesced,
+                throttled=self.throttled,
+                skipped_edits=self.skipped_edits
+            )
+
+
+refreshes = RefreshCoalescer()
@@ -99,6 +99,34 @@ def sort_markup(qbfilter, exclude_key='', row_width=2):
     return InlineKeyboardMarkup(markup)
 
 
+def list_page_markup(qbfilter, sort, reverse, page, pages_count, offset, previous_offset=None, next_offset=None):
+    """The pages are identified by the offset of their first torrent: pages can be shorter than the page size
+    (see bot.plugins.lists.get_list_page()). previous_offset/next_offset: None if there's no previous/next page"""
+
+    callback_data = 'list:{}:{}:{}:{}'
+
+    navigation_row = []
+    if previous_offset is not None:
+        navigation_row.append(InlineKeyboardButton('◀️', callback_data=callback_data.format(qbfilter, sort, int(reverse), previous_offset)))
+    # the current page button refreshes the page
+    navigation_row.append(InlineKeyboardButton(f'{page + 1}/{pages_count}', callback_data=callback_data.format(qbfilter, sort, int(reverse), offset)))
+    if next_offset is not None:
+        navigation_row.append(InlineKeyboardButton('▶️', callback_data=callback_data.format(qbfilter, sort, int(reverse), next_offset)))
+
+    sorting_row = []
+    for sorting_key in SORTING_KEYS:
+        if sorting_key == sort:
+            # tapping the current sorting key reverses the order
+            label = '{} {}'.format(sorting_key, '↓' if reverse else '↑')
+            button = InlineKeyboardButton(label, callback_data=callback_data.format(qbfilter, sorting_key, int(not reverse), 0))
+        else:
+            button = InlineKeyboardButton(sorting_key, callback_data=callback_data.format(qbfilter, sorting_key, 0, 0))
+
+        sorting_row.append(button)
+
+    return InlineKeyboardMarkup([navigation_row, sorting_row])
+
+
 def actions_markup(torrent_hash):
     keyboard = [
         [
@@ -112,7 +140,8 @@ def actions_markup(torrent_hash):
         ],
         [
             InlineKeyboardButton('atm on/off', callback_data='toggleatm:{}'.format(torrent_hash)),
-            InlineKeyboardButton('see trackers', callback_data='trackers:{}'.format(torrent_hash))
+            InlineKeyboardButton('see trackers', callback_data='trackers:{}'.format(torrent_hash)),
+            InlineKeyboardButton('peers', callback_data='peers:{}'.format(torrent_hash)),
         ],
         [
             InlineKeyboardButton('delete', callback_data='deletewithfiles:{}'.format(torrent_hash)),
@@ -129,6 +158,13 @@ def actions_markup(torrent_hash):
     return InlineKeyboardMarkup(keyboard)
 
 
+def peers_markup(torrent_hash):
+    return InlineKeyboardMarkup([[
+        InlineKeyboardButton('back', callback_data='peersback:{}'.format(torrent_hash)),
+        InlineKeyboardButton('refresh', callback_data='peers:{}'.format(torrent_hash)),
+    ]])
+
+
 def confirm_delete(torrent_hash):
     return InlineKeyboardMarkup([[
         InlineKeyboardButton('no, go back', callback_data='manage:{}'.format(torrent_hash)),
@@ -136,6 +172,13 @@ def confirm_delete(torrent_hash):
     ]])
 
 
+def confirm_bulk_action(action):
+    return InlineKeyboardMarkup([[
+        InlineKeyboardButton('no, cancel', callback_data='bulkcancel'),
+        InlineKeyboardButton('yes, {}'.format(action), callback_data='bulkconfirm')
+    ]])
+
+
 def short_markup(torrent_hash, do_not_notify_tag_emoji=False):
     markup = [[
         InlineKeyboardButton('pause', callback_data='pause:{}'.format(torrent_hash)),
@@ -0,0 +1,190 @@
+import math
+import os
+import struct
+import threading
+from array import array
+from typing import Dict, List, Optional, Tuple
+
+SPARKLINE_CHARS = '▁▂▃▄▅▆▇█'
+
+# aggregates kept for every bucket, and their initial value
+AGGREGATES = {
+    'min': math.inf,
+    'max': -math.inf,
+    'sum': 0.0,
+    'count': 0.0,
+}
+
+FILE_MAGIC = b'QBTS'
+FILE_VERSION = 1
+
+
+class RingSeries:
+    """Fixed-size ring buffer of buckets lasting resolution seconds each. Every bucket keeps the min, max, sum and
+    count of the samples of every metric that fell in it. Buckets are stored in typed arrays (one per metric
+    and aggregate), so the memory used and the size on disk never change"""
+
+    def __init__(self, resolution: int, size: int, metrics: Tuple[str, ...]):
+        self.resolution = resolution
+        self.size = size
+        self.metrics = metrics
+
+        self.bucket_ids = array('q', [-1]) * size  # bucket id (timestamp // resolution) stored in every slot
+        self.columns = {m: {agg: array('d', [initial]) * size for agg, initial in AGGREGATES.items()} for m in metrics}
+
+    def add(self, timestamp: float, values: Dict[str, float]):
+        bucket_id = int(timestamp // self.resolution)
+        slot = bucket_id % self.size
+
+        if self.bucket_ids[slot] != bucket_id:
+            # the slot contains an older bucket: reset it
+            self.bucket_ids[slot] = bucket_id
+            for metric_columns in self.columns.values():
+                for agg, initial in AGGREGATES.items():
+                    metric_columns[agg][slot] = initial
+
+        for metric, value in values.items():
+            metric_columns = self.columns[metric]
+            metric_columns['min'][slot] = min(metric_columns['min'][slot], value)
+            metric_columns['max'][slot] = max(metric_columns['max'][slot], value)
+            metric_columns['sum'][slot] += value
+            metric_columns['count'][slot] += 1
+
+    def averages(self, metric: str, count: int, now: float) -> List[Optional[float]]:
+        """The average of the metric in each one of the last count buckets (oldest first),
+        None for the buckets without samples"""
+
+        current_bucket_id = int(now // self.resolution)
+        metric_columns = self.columns[metric]
+
+        result = []
+        for bucket_id in range(current_bucket_id - min(count, self.size) + 1, current_bucket_id + 1):
+            slot = bucket_id % self.size
+            if self.bucket_ids[slot] != bucket_id or not metric_columns['count'][slot]:
+                result.append(None)
+            else:
+                result.append(metric_columns['sum'][slot] / metric_columns['count'][slot])
+
+        return result
+
+    def summary(self, metric: str, count: int, now: float) -> Optional[Tuple[float, float, float]]:
+        """min, average and max of the metric's samples in the last count buckets. None if there are no samples"""
+
+        current_bucket_id = int(now // self.resolution)
+        metric_columns = self.columns[metric]
+
+        min_value, max_value, total, samples = math.inf, -math.inf, 0.0, 0
+        for bucket_id in range(current_bucket_id - min(count, self.size) + 1, current_bucket_id + 1):
+            slot = bucket_id % self.size
+            if self.bucket_ids[slot] != bucket_id or not metric_columns['count'][slot]:
+                continue
+
+            min_value = min(min_value, metric_columns['min'][slot])
+            max_value = max(max_value, metric_columns['max'][slot])
+            total += metric_columns['sum'][slot]
+            samples += metric_columns['count'][slot]
+
+        if not samples:
+            return None
+
+        return min_value, total / samples, max_value
+
+    def arrays(self) -> list:
+        """All the arrays, always in the same order"""
+
+        result = [self.bucket_ids]
+        for metric in self.metrics:
+            result.extend([self.columns[metric][agg] for agg in AGGREGATES])
+
+        return result
+
+
+class TieredSeries:
+    """The same metrics recorded with different resolutions (eg. minutes, hours, days), persisted to a binary file"""
+
+    def __init__(self, file_path: str, metrics: Tuple[str, ...], tiers: Dict[str, Tuple[int, int]]):
+        """tiers: dict tier name -> (resolution in seconds, number of buckets)"""
+
+        self._file_path = file_path
+        self._lock = threading.Lock()
+        self.metrics = metrics
+        self.tiers = {name: RingSeries(resolution, size, metrics) for name, (resolution, size) in tiers.items()}
+
+        self.load()
+
+    def add(self, timestamp: float, values: Dict[str, float]):
+        with self._lock:
+            for tier in self.tiers.values():
+                tier.add(timestamp, values)
+
+    def averages(self, tier: str, metric: str, count: int, now: float) -> List[Optional[float]]:
+        with self._lock:
+            return self.tiers[tier].averages(metric, count, now)
+
+    def summary(self, tier: str, metric: str, count: int, now: float) -> Optional[Tuple[float, float, float]]:
+        with self._lock:
+            return self.tiers[tier].summary(metric, count, now)
+
+    def _header(self) -> bytes:
+        metrics_names = ','.join(self.metrics).encode()
+        header = struct.pack('<4sHHH', FILE_MAGIC, FILE_VERSION, len(self.tiers), len(metrics_names)) + metrics_names
+        for tier in self.tiers.values():
+            header += struct.pack('<qq', tier.resolution, tier.size)
+
+        return header
+
+    def save(self):
+        tmp_file_path = self._file_path + '.tmp'
+
+        with self._lock:
+            with open(tmp_file_path, 'wb') as f:
+                f.write(self._header())
+                for tier in self.tiers.values():
+                    for tier_array in tier.arrays():
+                        tier_array.tofile(f)
+
+        os.replace(tmp_file_path, self._file_path)
+
+    def load(self):
+        """Load the saved series, unless the file doesn't exist or has been saved with different tiers/metrics"""
+
+        # read into new series, so we don't end up with half-loaded series if the file is truncated
+        tiers = {name: RingSeries(t.resolution, t.size, t.metrics) for name, t in self.tiers.items()}
+
+        try:
+            with open(self._file_path, 'rb') as f:
+                header = self._header()
+                if f.read(len(header)) != header:
+                    return False
+
+                for tier in tiers.values():
+                    for tier_array in tier.arrays():
+                        items_count = len(tier_array)
+                        del tier_array[:]
+                        tier_array.fromfile(f, items_count)
+        except (FileNotFoundError, EOFError):
+            return False
+
+        with self._lock:
+            self.tiers = tiers
+
+        return True
+
+
+def sparkline(values: List[Optional[float]], max_value: Optional[float] = None) -> str:
+    """One character for each value, taller for higher values. None values are shown as a space"""
+
+    if max_value is None:
+        max_value = max([v for v in values if v is not None], default=0)
+
+    chars = []
+    for value in values:
+        if value is None:
+            chars.append(' ')
+        elif max_value <= 0:
+            chars.append(SPARKLINE_CHARS[0])
+        else:
+            index = round(value / max_value * (len(SPARKLINE_CHARS) - 1))
+            chars.append(SPARKLINE_CHARS[max(0, min(index, len(SPARKLINE_CHARS) - 1))])
+
+    return ''.join(chars)
@@ -2,6 +2,8 @@ import logging
 import re
 from functools import wraps
 from html import escape as html_escape
+from html import unescape as html_unescape
+from typing import Iterable, Iterator, List
 
 from telegram import Bot, ParseMode, Update, MAX_MESSAGE_LENGTH
 from telegram.ext import CallbackContext
@@ -14,6 +16,10 @@ from config import config
 FULL = '●'
 EMPTY = '○'
 
+HTML_TAG_REGEX = re.compile(r'<[^>]+>')
+# the smallest pieces an HTML string can be split into: tags, entities, single characters
+HTML_TOKEN_REGEX = re.compile(r'<[^>]+>|&(?:#\d+|#x[0-9a-fA-F]+|\w+);|.', re.S)
+
 logger = logging.getLogger(__name__)
 
 
@@ -135,12 +141,83 @@ def build_progress_bar(decimal_percentage, steps=10):
     return '{}{}'.format(FULL * completed_steps, EMPTY * missing_steps)
 
 
-def split_text(strings_list):
-    avg_len = sum(map(len, strings_list)) / len(strings_list)
-    elements_per_msg = int(MAX_MESSAGE_LENGTH / avg_len)
+def strip_html(html_text: str) -> str:
+    """The text of an HTML message as Telegram shows it: without the tags, and with the entities unescaped"""
+
+    return html_unescape(HTML_TAG_REGEX.sub('', html_text))
+
+
+def telegram_length(html_text: str) -> int:
+    """The length of an HTML message as Telegram counts it to enforce MAX_MESSAGE_LENGTH: after the tags and
+    entities are parsed, in UTF-16 code units (eg. emojis count as two)"""
+
+    return len(strip_html(html_text).encode('utf-16-le')) // 2
+
+
+def split_html(html_text: str, max_length: int = MAX_MESSAGE_LENGTH) -> List[str]:
+    """Hard-split an HTML string into pieces whose telegram_length() is at most max_length. Tags and entities are
+    never broken: the tags still open where a piece ends are closed at its end and opened again at the start of
+    the next piece, so every piece is valid HTML on its own"""
+
+    pieces = []
+    open_tags = []  # (name, opening tag)
+    piece = []
+    piece_length = 0
+    for token in HTML_TOKEN_REGEX.findall(html_text):
+        if token.startswith('<') and len(token) > 1:
+            if token.startswith('</'):
+                if open_tags:
+                    open_tags.pop()
+            else:
+                open_tags.append((re.match(r'<\s*(\w+)', token)[1], token))
+
+            piece.append(token)
+            continue
+
+        token_length = telegram_length(token)
+        if piece_length and piece_length + token_length > max_length:
+            pieces.append(''.join(piece + [f'</{name}>' for name, _ in reversed(open_tags)]))
+            piece = [opening_tag for _, opening_tag in open_tags]
+            piece_length = 0
+
+        piece.append(token)
+        piece_length += token_length
+
+    if piece:
+        pieces.append(''.join(piece))
+
+    return pieces
+
+
+def split_text(strings: Iterable[str], max_length: int = MAX_MESSAGE_LENGTH, separator: str = '\n') -> Iterator[List[str]]:
+    """Pack the strings into as few chunks as possible, so that every chunk joined with the separator fits
+    into a single message. strings can be a generator: every chunk is yielded as soon as it's full, so it can be
+    sent while the next strings are being formatted. A string longer than max_length is split with split_html()"""
+
+    separator_length = telegram_length(separator)
+
+    chunk = []
+    chunk_length = 0
+    for string in strings:
+        string_length = telegram_length(string)
+        if string_length > max_length:
+            pieces = split_html(string, max_length)
+        else:
+            pieces = [string]
+
+        for piece in pieces:
+            piece_length = string_length if len(pieces) == 1 else telegram_length(piece)
+
+            if chunk and chunk_length + separator_length + piece_length > max_length:
+                yield chunk
+                chunk = []
+                chunk_length = 0
+
+            chunk_length += piece_length + (separator_length if chunk else 0)
+            chunk.append(piece)
 
-    for i in range(0, len(strings_list), elements_per_msg):
-        yield strings_list[i:i + elements_per_msg]
+    if chunk:
+        yield chunk
 
 
 def free_space(dir_path, human_readable=True) -> [str, int]: